@@ -11,83 +11,200 @@ Measurements:
 
 Notes:
 - This script uses OVS in standalone mode (no controller required).
-- Traffic runs via a custom Mininet CLI command:  scenario 1
+- The network is built, shaped and torn down in bulk (fast_net.py).
+- Traffic runs via a custom Mininet CLI command:  scenario 1 (iperf3),
+  scenario 2 (web / video / rpc traffic mix, see traffic_mix.py)
+- Every run writes run_manifest.json (config, topology, tool versions,
+  checksums); --run-index adds it to a queryable index (run_index.py)
+- Headless parameter sweeps (no CLI): sweep.py
+- Larger core/distribution/access topologies: campus_topo.py
 """
 
 from mininet.net import Mininet
 from mininet.cli import CLI
-from mininet.node import OVSSwitch
 from mininet.log import lg
 from mininet.topo import Topo
-from mininet.link import TCLink
 
 import argparse
 import os
+import subprocess
+import sys
 import time
+from datetime import datetime
+
+import fast_net
+import features
+import fidelity
+import link_replay
+import queue_sampler
+import run_index
+import telemetry
+
+
+MIX_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traffic_mix.py")
+
+
+def link_params(bw: float, delay: str, queue: int) -> dict:
+    """TCLink parameters (HTB rate limit + netem delay/queue) used for every shaped link."""
+    return {"bw": bw, "delay": delay, "max_queue_size": queue, "use_htb": True}
+
+
+def switch_dpid(prefix: str, number: int) -> str:
+    """
+    Datapath ID of switch s<number> of a prefixed dumbbell: the prefix bytes
+    followed by the switch number, so it is distinct across prefixes and switches.
+    """
+    raw = prefix.encode()
+    if len(raw) > 7:
+        raise ValueError(f"prefix {prefix!r} is too long for a datapath ID (at most 7 bytes)")
+    return f"{int.from_bytes(raw, 'big') << 8 | number:016x}"
 
 
 class DumbbellTopo(Topo):
+    """
+    prefix is prepended to every node name (s1 -> w1s1, L1 -> w1L1), so several
+    dumbbells can run side by side on one machine (see parallel_sweep.py).
+    """
+
     def __init__(self, n_left=3, n_right=3, access_bw=100, access_delay="1ms",
                  access_queue=1000, bottleneck_bw=20, bottleneck_delay="10ms",
-                 bottleneck_queue=200, **kwargs):
+                 bottleneck_queue=200, prefix="", **kwargs):
         super().__init__(**kwargs)
 
-        s1 = self.addSwitch("s1", switch="ovsk")
-        s2 = self.addSwitch("s2", switch="ovsk")
+        # explicit datapath IDs with a prefix: the name based default takes the first
+        # number in the name, which would give w0s1 and w0s2 the same one
+        dpids = [{"dpid": switch_dpid(prefix, n)} if prefix else {} for n in (1, 2)]
+        s1 = self.addSwitch(f"{prefix}s1", switch="ovsk", **dpids[0])
+        s2 = self.addSwitch(f"{prefix}s2", switch="ovsk", **dpids[1])
 
         # Bottleneck link (core)
-        self.addLink(
-            s1, s2,
-            bw=bottleneck_bw,
-            delay=bottleneck_delay,
-            max_queue_size=bottleneck_queue,
-            use_htb=True
-        )
+        self.addLink(s1, s2, **link_params(bottleneck_bw, bottleneck_delay, bottleneck_queue))
 
         # Left access links
         for i in range(1, n_left + 1):
-            h = self.addHost(f"L{i}")
-            self.addLink(
-                h, s1,
-                bw=access_bw,
-                delay=access_delay,
-                max_queue_size=access_queue,
-                use_htb=True
-            )
+            h = self.addHost(f"{prefix}L{i}")
+            self.addLink(h, s1, **link_params(access_bw, access_delay, access_queue))
 
         # Right access links
         for i in range(1, n_right + 1):
-            h = self.addHost(f"R{i}")
-            self.addLink(
-                h, s2,
-                bw=access_bw,
-                delay=access_delay,
-                max_queue_size=access_queue,
-                use_htb=True
-            )
+            h = self.addHost(f"{prefix}R{i}")
+            self.addLink(h, s2, **link_params(access_bw, access_delay, access_queue))
 
 
 def configure_switches_standalone(net: Mininet) -> None:
+    """Sets fail-mode standalone on every switch that does not have it yet, in one ovs-vsctl transaction."""
+    pending = [sw.name for sw in net.switches if getattr(sw, "failMode", None) != "standalone"]
+    if not pending:
+        return
     print("[+] Setting OVS fail-mode to standalone...")
-    for sw in net.switches:
-        sw.cmd(f"ovs-vsctl set-fail-mode {sw.name} standalone")
+    subprocess.run(["ovs-vsctl"] + [arg for name in pending for arg in ("--", "set-fail-mode", name, "standalone")],
+                   check=True)
+
+
+def configure_bottleneck(net: Mininet, bw: float, delay: str, queue: int, prefix: str = "") -> None:
+    """
+    Re-applies the shaping of the s1 -- s2 link on a running network.
+    TCIntf.config replaces the existing qdiscs, so no rebuild is needed.
+    """
+    link = net.linksBetween(net[f"{prefix}s1"], net[f"{prefix}s2"])[0]
+    with fast_net.BulkConfig():
+        for intf in (link.intf1, link.intf2):
+            params = link_params(bw, delay, queue)
+            intf.config(**params)
+            # keep the recorded configuration in sync (read by fidelity.py)
+            intf.params.update(params)
+
+
+class LoggedProcess:
+    """A process started inside a Mininet host, with stdout/stderr going to a log file."""
+
+    def __init__(self, host, name: str, argv: list, log_path: str):
+        self.name = name
+        self.log = open(log_path, "w")
+        self.popen = host.popen(argv, stdout=self.log, stderr=subprocess.STDOUT)
+
+    @property
+    def pid(self) -> int:
+        return self.popen.pid
+
+    def done(self) -> bool:
+        return self.popen.poll() is not None
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Terminates the process (SIGTERM, then SIGKILL) and closes its log."""
+        if not self.done():
+            self.popen.terminate()
+            try:
+                self.popen.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.popen.kill()
+                self.popen.wait()
+        self.log.close()
+
+
+def wait_for_listen(host, port: int, timeout: float = 5.0, interval: float = 0.02) -> bool:
+    """
+    Polls the listening TCP sockets inside the host's network namespace until
+    something listens on port. Returns False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if host.cmd(f"ss -Hltn 'sport = :{port}'").strip():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+def wait_for_processes(procs: list, timeout: float, interval: float = 0.05) -> list:
+    """
+    Waits until every process has exited or the timeout expired.
+    Returns the processes that were still running at the deadline.
+    """
+    deadline = time.monotonic() + timeout
+    pending = [proc for proc in procs if not proc.done()]
+    while pending and time.monotonic() < deadline:
+        time.sleep(interval)
+        pending = [proc for proc in pending if not proc.done()]
+    return pending
 
 
-def start_iperf_servers(net: Mininet, n_right: int, base_port: int, out_dir: str) -> None:
+def start_iperf_servers(net: Mininet, n_right: int, base_port: int, out_dir: str,
+                        timeout: float = 5.0, prefix: str = "") -> list:
     """
     Starts iperf3 servers on R1..Rn_right.
     One port per server; server logs are stored in out_dir.
+    Returns once every server listens (or timeout expired).
     """
     os.makedirs(out_dir, exist_ok=True)
+    servers = []
     for i in range(1, n_right + 1):
-        host = net[f"R{i}"]
+        host = net[f"{prefix}R{i}"]
         port = base_port + (i - 1)
         log_path = os.path.join(out_dir, f"iperf3_server_R{i}_p{port}.json")
 
-        # -V verbose, --json output; redirect stdout to file
-        # Running in background
-        host.cmd(f"iperf3 -s -p {port} -V --json > {log_path} 2>&1 &")
-    print(f"[+] iperf3 servers started on ports {base_port}..{base_port + n_right - 1}")
+        # -V verbose, --json output; stdout goes to the log file
+        servers.append(LoggedProcess(host, f"iperf3 server R{i}", ["iperf3", "-s", "-p", str(port), "-V", "--json"], log_path))
+
+    for i, server in enumerate(servers, start=1):
+        if not wait_for_listen(net[f"{prefix}R{i}"], base_port + (i - 1), timeout):
+            print(f"[!] {server.name} is not listening after {timeout} s")
+    print(f"[+] iperf3 servers listening on ports {base_port}..{base_port + n_right - 1}")
+    return servers
+
+
+def client_flows(net: Mininet, n_left: int, n_right: int, base_port: int, prefix: str = "") -> list:
+    """
+    Flow plan of scenario 1, mapping used: Li -> R((i-1) mod n_right)+1.
+    Returns (flow name, client host, server IP, port) tuples, flow names look like L1_to_R1_p5201
+    (without the node name prefix).
+    """
+    flows = []
+    for i in range(1, n_left + 1):
+        server_idx = ((i - 1) % n_right) + 1
+        port = base_port + (server_idx - 1)
+        flows.append((f"L{i}_to_R{server_idx}_p{port}", net[f"{prefix}L{i}"], net[f"{prefix}R{server_idx}"].IP(), port))
+    return flows
 
 
 def run_clients_to_servers(
@@ -98,24 +215,20 @@ def run_clients_to_servers(
     duration_s: int,
     parallel_streams: int,
     offered_rate: str,
-    out_dir: str
-) -> None:
+    out_dir: str,
+    prefix: str = ""
+) -> list:
     """
-    Runs iperf3 clients from L1..Ln_left to R1..Rn_right.
-    Mapping used: Li -> R((i-1) mod n_right)+1
+    Runs iperf3 clients from L1..Ln_left to R1..Rn_right (see client_flows).
     Also runs ping in parallel for RTT logging.
+    Returns the started client and ping processes.
     """
     os.makedirs(out_dir, exist_ok=True)
+    procs = []
 
-    for i in range(1, n_left + 1):
-        client = net[f"L{i}"]
-        server_idx = ((i - 1) % n_right) + 1
-        server = net[f"R{server_idx}"]
-        server_ip = server.IP()
-        port = base_port + (server_idx - 1)
-
-        iperf_log = os.path.join(out_dir, f"iperf3_L{i}_to_R{server_idx}_p{port}.json")
-        ping_log = os.path.join(out_dir, f"ping_L{i}_to_R{server_idx}.txt")
+    for flow, client, server_ip, port in client_flows(net, n_left, n_right, base_port, prefix):
+        iperf_log = os.path.join(out_dir, f"iperf3_{flow}.json")
+        ping_log = os.path.join(out_dir, f"ping_{flow.rsplit('_p', 1)[0]}.txt")
 
         # iperf3:
         # -c <server_ip> client mode
@@ -124,16 +237,192 @@ def run_clients_to_servers(
         # -P parallel streams
         # -b offered rate (TCP: sets target; actual depends on congestion)
         # -V verbose, --json output
-        client.cmd(
-            f"iperf3 -c {server_ip} -p {port} -t {duration_s} "
-            f"-P {parallel_streams} -b {offered_rate} -V --json > {iperf_log} 2>&1 &"
-        )
+        procs.append(LoggedProcess(
+            client, f"iperf3 {flow}",
+            ["iperf3", "-c", server_ip, "-p", str(port), "-t", str(duration_s),
+             "-P", str(parallel_streams), "-b", offered_rate, "-V", "--json"],
+            iperf_log
+        ))
 
         # ping:
         # One ICMP per second; count == duration_s gives ~duration_s seconds
-        client.cmd(f"ping -i 1 -c {duration_s} {server_ip} > {ping_log} 2>&1 &")
+        procs.append(LoggedProcess(
+            client, f"ping {flow}",
+            ["ping", "-i", "1", "-c", str(duration_s), server_ip],
+            ping_log
+        ))
 
     print(f"[+] Started {n_left} client flows (each with ping RTT logging).")
+    return procs
+
+
+def start_mix_servers(net: Mininet, n_right: int, base_port: int, out_dir: str,
+                      timeout: float = 5.0, prefix: str = "") -> list:
+    """
+    Starts traffic_mix.py servers on R1..Rn_right, same ports as the iperf3
+    servers (TCP and UDP). Returns once every server listens (or timeout expired).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    servers = []
+    for i in range(1, n_right + 1):
+        port = base_port + (i - 1)
+        servers.append(LoggedProcess(net[f"{prefix}R{i}"], f"mix server R{i}",
+                                     [sys.executable, MIX_SCRIPT, "serve", "--port", str(port)],
+                                     os.path.join(out_dir, f"mix_server_R{i}_p{port}.log")))
+
+    for i, server in enumerate(servers, start=1):
+        if not wait_for_listen(net[f"{prefix}R{i}"], base_port + (i - 1), timeout):
+            print(f"[!] {server.name} is not listening after {timeout} s")
+    print(f"[+] Traffic mix servers listening on ports {base_port}..{base_port + n_right - 1}")
+    return servers
+
+
+def run_mix_clients(net: Mininet, cfg: dict, prefix: str = "") -> list:
+    """
+    Scenario 2 clients: one traffic_mix.py process per left host (same host pairs
+    as client_flows), generating the mix of cfg "mix" (a mix file, empty for
+    traffic_mix.DEFAULT_MIX) for duration_s. The per-flow records go to
+    mix_<flow>.csv. Also runs ping in parallel for RTT logging.
+    Returns the started client and ping processes.
+    """
+    out_dir = cfg["out_dir"]
+    os.makedirs(out_dir, exist_ok=True)
+    procs = []
+    # running flows may finish during the first half of the grace period
+    drain = cfg.get("grace_s", 10) / 2
+    flows = client_flows(net, cfg["n_left"], cfg["n_right"], cfg["base_port"], prefix)
+    for k, (flow, client, server_ip, port) in enumerate(flows):
+        argv = [sys.executable, MIX_SCRIPT, "client", server_ip, "--port", str(port),
+                "--duration", str(cfg["duration_s"]), "--drain", str(drain), "--seed", str(k),
+                "--flow", flow, "--out", os.path.join(out_dir, f"mix_{flow}.csv")]
+        if cfg.get("mix"):
+            argv += ["--mix", cfg["mix"]]
+        procs.append(LoggedProcess(client, f"mix {flow}", argv, os.path.join(out_dir, f"mix_{flow}.log")))
+        procs.append(LoggedProcess(
+            client, f"ping {flow}",
+            ["ping", "-i", "1", "-c", str(cfg["duration_s"]), server_ip],
+            os.path.join(out_dir, f"ping_{flow.rsplit('_p', 1)[0]}.txt")
+        ))
+
+    print(f"[+] Started {len(flows)} traffic mix clients (each with ping RTT logging).")
+    return procs
+
+
+def stop_processes(procs: list) -> None:
+    """Stops processes started by start_iperf_servers / run_clients_to_servers (logs are flushed on exit)."""
+    for proc in procs:
+        proc.stop()
+
+
+def run_scenario(net: Mininet, cfg: dict, args: dict = None) -> dict:
+    """
+    Scenario 1: L1..Lk -> R1..Rm iperf3 traffic + ping RTT logging.
+    Scenario 2 (cfg "traffic" == "mix"): the same host pairs with the traffic_mix.py
+    classes instead of iperf3.
+    With cfg "link_trace" the s1 -- s2 shaping follows the trace during the run
+    (see link_replay.py) and is restored afterwards.
+    cfg has the keys of Mininet._exp_cfg (see exp_cfg), optionally "prefix" for
+    prefixed node names (see DumbbellTopo). Returns as soon as every
+    client and ping process exited, or after duration_s + grace_s at the latest.
+    Returns a summary with the wall-clock time, the processes that had to be killed
+    and the fidelity verdict (see fidelity.py, unless cfg "fidelity" is False).
+    The run is described in a manifest next to the logs, with args (the full
+    command line options) as its config (see run_index.py).
+    """
+    out_dir = cfg["out_dir"]
+    started = datetime.now()
+    prefix = cfg.get("prefix", "")
+    mix = cfg.get("traffic", "iperf3") == "mix"
+    t0 = time.monotonic()
+
+    servers = (start_mix_servers if mix else start_iperf_servers)(
+        net,
+        n_right=cfg["n_right"],
+        base_port=cfg["base_port"],
+        out_dir=out_dir,
+        prefix=prefix
+    )
+    procs = []
+    pending = []
+    timeout = cfg["duration_s"] + cfg.get("grace_s", 10)
+    replay = None
+    if cfg.get("link_trace"):
+        replay = link_replay.LinkReplay(link_replay.replay_interfaces(net, prefix=prefix),
+                                        link_replay.load_trace(cfg["link_trace"]))
+    monitor = None
+    if cfg.get("fidelity", True):
+        # a replay changes the shaping during the run, its highest rate is the limit
+        monitor = fidelity.FidelityMonitor(net, limits=replay.peak() if replay is not None else None)
+    if monitor is not None:
+        monitor.start()
+    sampler = None
+    if cfg.get("queue_interval_ms"):
+        sampler = queue_sampler.QueueSampler(queue_sampler.bottleneck_devices(net, prefix), out_dir,
+                                             cfg["queue_interval_ms"])
+        sampler.start()
+    try:
+        if sampler is not None:
+            sampler.mark_clients_started()
+        if replay is not None:
+            replay.start()
+        if mix:
+            procs = run_mix_clients(net, cfg, prefix)
+            print(f"[!] Running traffic mix for {cfg['duration_s']} seconds (timeout {timeout} s)...")
+            pending = [proc.name for proc in wait_for_processes(procs, timeout)]
+        elif cfg.get("telemetry_port"):
+            # clients on pipes, converted and served live instead of written to files
+            flows = client_flows(net, cfg["n_left"], cfg["n_right"], cfg["base_port"], prefix)
+            live = telemetry.LiveRun(flows, cfg, port=cfg["telemetry_port"])
+            print(f"[+] Live telemetry on http://127.0.0.1:{cfg['telemetry_port']}/records")
+            pending = live.run(timeout)
+        else:
+            procs = run_clients_to_servers(
+                net,
+                n_left=cfg["n_left"],
+                n_right=cfg["n_right"],
+                base_port=cfg["base_port"],
+                duration_s=cfg["duration_s"],
+                parallel_streams=cfg["parallel_streams"],
+                offered_rate=cfg["offered_rate"],
+                out_dir=out_dir,
+                prefix=prefix
+            )
+
+            print(f"[!] Running scenario for {cfg['duration_s']} seconds (timeout {timeout} s)...")
+            pending = [proc.name for proc in wait_for_processes(procs, timeout)]
+        for name in pending:
+            print(f"[!] {name} did not finish in time, killing it")
+    finally:
+        replayed = None
+        if replay is not None:
+            replayed = replay.stop()
+            replay.write_log(out_dir)
+        if sampler is not None:
+            sampler.stop()
+        if monitor is not None:
+            monitor.stop()
+        stop_processes(procs)
+        stop_processes(servers)
+
+    elapsed = time.monotonic() - t0
+    print(f"[+] Scenario finished after {elapsed:.1f} s. Logs saved in:", out_dir)
+    summary = {"elapsed_s": elapsed, "timed_out": pending}
+    if replayed is not None:
+        summary["link_replay"] = replayed
+        skew = replayed["skew_ms"]
+        print(f"[+] Link replay: {replayed['applied']}/{replayed['steps']} steps, skew mean {skew['mean']:.2f} ms, "
+              f"p99 {skew['p99']:.2f} ms, max {skew['max']:.2f} ms")
+        for error in replayed["errors"]:
+            print(f"[!] Link replay: {error}")
+    if monitor is not None:
+        bottleneck = net.linksBetween(net[f"{prefix}s1"], net[f"{prefix}s2"])[0]
+        report = monitor.report(cfg, [bottleneck.intf1.name, bottleneck.intf2.name])
+        fidelity.write_report(out_dir, report)
+        summary["fidelity"] = {key: report[key] for key in ("ok", "flags", "warnings")}
+        for problem in report["flags"] + report["warnings"]:
+            print(f"[!] Fidelity: {problem}")
+    run_index.write_manifest(out_dir, net, cfg, args, summary, started)
+    return summary
 
 
 class CustomCLI(CLI):
@@ -142,46 +431,30 @@ class CustomCLI(CLI):
         Run experiment scenarios.
         Usage:
           scenario 1
+          scenario 2
         """
         args = arg.strip().split()
         if len(args) != 1:
-            print("[!] Usage: scenario 1")
+            print("[!] Usage: scenario 1|2")
             return
 
-        if args[0] == "1":
-            cfg = self.mn._exp_cfg
-            out_dir = cfg["out_dir"]
+        if args[0] not in ("1", "2"):
+            print("[!] Unknown scenario. Scenarios 1 and 2 are implemented.")
+            return
+        if getattr(self.mn, "_ran", False):
+            # same network as the previous run, back to a clean state
+            fast_net.reset_network(self.mn)
+        self.mn._ran = True
 
+        if args[0] == "1":
             print("[+] Scenario 1: L1..Lk -> R1..Rm traffic + ping RTT logging")
-            start_iperf_servers(
-                self.mn,
-                n_right=cfg["n_right"],
-                base_port=cfg["base_port"],
-                out_dir=out_dir
-            )
-
-            # Small pause to ensure servers are listening
-            time.sleep(1)
-
-            run_clients_to_servers(
-                self.mn,
-                n_left=cfg["n_left"],
-                n_right=cfg["n_right"],
-                base_port=cfg["base_port"],
-                duration_s=cfg["duration_s"],
-                parallel_streams=cfg["parallel_streams"],
-                offered_rate=cfg["offered_rate"],
-                out_dir=out_dir
-            )
-
-            print(f"[!] Letting scenario run for {cfg['duration_s']} seconds...")
-            time.sleep(cfg["duration_s"] + 2)
-            print("[+] Scenario finished. Logs saved in:", out_dir)
+            run_scenario(self.mn, self.mn._exp_cfg, self.mn._args)
         else:
-            print("[!] Unknown scenario. Only scenario 1 is implemented.")
+            print("[+] Scenario 2: L1..Lk -> R1..Rm traffic mix (web, video, rpc) + ping RTT logging")
+            run_scenario(self.mn, {**self.mn._exp_cfg, "traffic": "mix"}, self.mn._args)
 
 
-def parse_args():
+def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Mininet Dumbbell experiment with iperf3+ping logging")
 
     # Topology size
@@ -202,48 +475,88 @@ def parse_args():
     p.add_argument("--duration", type=int, default=60, help="seconds")
     p.add_argument("--parallel", type=int, default=3, help="iperf3 parallel streams (-P)")
     p.add_argument("--rate", type=str, default="50M", help="iperf3 offered rate (-b), e.g., 10M, 0.5G")
+    p.add_argument("--mix", type=str, default="",
+                   help="scenario 2 traffic mix file (JSON, see traffic_mix.py; default: traffic_mix.DEFAULT_MIX)")
+    p.add_argument("--link-trace", type=str, default="",
+                   help="replay bw/delay/loss/queue over time onto s1 -- s2 during the run (see link_replay.py)")
+    p.add_argument("--grace", type=int, default=10, help="seconds a run may exceed --duration before its flows are killed")
 
     # Logging
     p.add_argument("--out-dir", type=str, default="scenario_dumbbell_folder")
     p.add_argument("--base-port", type=int, default=5201)
+    p.add_argument("--run-index", type=str, default="",
+                   help="add every run manifest to this SQLite index (see run_index.py)")
+    p.add_argument("--telemetry-port", type=int, default=0,
+                   help="serve live per-interval records on this localhost port (0: log to files only)")
+    p.add_argument("--queue-interval-ms", type=float, default=queue_sampler.DEFAULT_INTERVAL_MS,
+                   help="sample the bottleneck queue every N ms into queue_samples.bin (0: off, see queue_sampler.py)")
+    p.add_argument("--no-fidelity", default=False, action="store_true",
+                   help="do not sample CPU / qdisc statistics for the fidelity check (see fidelity.py)")
+    p.add_argument("--reject-unfaithful", default=False, action="store_true",
+                   help="sweeps: reject runs whose fidelity check failed, so they are run again on resume")
+    p.add_argument("--feature-windows", type=features.parse_windows, default=(),
+                   help="with --telemetry-port: rolling feature windows in intervals, e.g. 5,20 (see features.py)")
+
+    return p
 
-    return p.parse_args()
+
+def parse_args():
+    return build_parser().parse_args()
+
+
+def topo_kwargs(args) -> dict:
+    """DumbbellTopo keyword arguments from the parsed command line."""
+    return {
+        "n_left": args.n_left,
+        "n_right": args.n_right,
+        "access_bw": args.access_bw,
+        "access_delay": args.access_delay,
+        "access_queue": args.access_queue,
+        "bottleneck_bw": args.bottleneck_bw,
+        "bottleneck_delay": args.bottleneck_delay,
+        "bottleneck_queue": args.bottleneck_queue,
+    }
+
+
+def exp_cfg(args) -> dict:
+    """Experiment config (Mininet._exp_cfg) from the parsed command line."""
+    return {
+        "n_left": args.n_left,
+        "n_right": args.n_right,
+        "duration_s": args.duration,
+        "grace_s": args.grace,
+        "parallel_streams": args.parallel,
+        "offered_rate": args.rate,
+        "mix": args.mix,
+        "link_trace": args.link_trace,
+        "out_dir": args.out_dir,
+        "base_port": args.base_port,
+        "telemetry_port": args.telemetry_port,
+        "feature_windows": args.feature_windows,
+        "fidelity": not args.no_fidelity,
+        "queue_interval_ms": args.queue_interval_ms,
+        "run_index": args.run_index,
+    }
 
 
 def main():
     args = parse_args()
     lg.setLogLevel("info")
 
-    topo = DumbbellTopo(
-        n_left=args.n_left,
-        n_right=args.n_right,
-        access_bw=args.access_bw,
-        access_delay=args.access_delay,
-        access_queue=args.access_queue,
-        bottleneck_bw=args.bottleneck_bw,
-        bottleneck_delay=args.bottleneck_delay,
-        bottleneck_queue=args.bottleneck_queue
-    )
+    topo = DumbbellTopo(**topo_kwargs(args))
 
-    net = Mininet(topo=topo, switch=OVSSwitch, controller=None, link=TCLink, autoSetMacs=True)
+    net = fast_net.FastNet(topo=topo, autoSetMacs=True)
     net.start()
 
     try:
         configure_switches_standalone(net)
 
         # Store experiment config for CLI access
-        net._exp_cfg = {
-            "n_left": args.n_left,
-            "n_right": args.n_right,
-            "duration_s": args.duration,
-            "parallel_streams": args.parallel,
-            "offered_rate": args.rate,
-            "out_dir": args.out_dir,
-            "base_port": args.base_port,
-        }
+        net._exp_cfg = exp_cfg(args)
+        net._args = vars(args)
 
         print("[+] Network is up.")
-        print("[+] Run:  scenario 1")
+        print("[+] Run:  scenario 1  (or scenario 2 for the traffic mix)")
         print("[+] Then: exit")
         CustomCLI(net)
 
@@ -0,0 +1,243 @@
+#! /usr/bin/env python3
+"""
+Campus topology generator: core / distribution / access hierarchy or k-ary fat-tree.
+
+The topology is described by a spec file (JSON). Every tier names the shaping of
+its uplinks with the same TCLink parameters DumbbellTopo uses (bw in Mbit/s,
+delay, queue in packets), so each tier can become a bottleneck:
+    {
+      "core":         {"count": 2, "bw": 1000, "delay": "1ms", "queue": 1000},
+      "distribution": {"count": 8, "uplinks": 2, "bw": 1000, "delay": "1ms", "queue": 1000},
+      "access":       {"count": 90, "uplinks": 2, "bw": 100, "delay": "1ms", "queue": 500},
+      "hosts":        {"per_switch": 6, "bw": 100, "delay": "1ms", "queue": 1000},
+      "links": [{"between": ["d1", "c1"], "bw": 50, "delay": "5ms"}]
+    }
+- core switches c1..cN are fully meshed ("core" link parameters),
+- distribution switch d<i> connects to "uplinks" core switches,
+- access switches a<j> connect to a group of "uplinks" distribution switches,
+- every access switch gets "per_switch" hosts h<k>,
+- "links" overrides the parameters of single links (extra bottlenecks).
+With {"type": "fattree", "k": 4, ...} the switch counts and wiring follow the
+k-ary fat-tree instead ("distribution" = aggregation, "access" = edge tier).
+
+Redundant uplinks create loops, so switches run STP in that case and the run
+waits until every port left the listening/learning state.
+
+The network is built with fast_net.FastNet: the veth pairs of all links are
+created with one `ip -batch` call and their shaping is applied in bulk.
+
+Usage:
+    sudo python3 campus_topo.py spec.json
+    python3 campus_topo.py --bench            # Topo build time, no root needed
+    sudo python3 campus_topo.py --bench --bench-net
+"""
+
+from mininet.net import Mininet
+from mininet.cli import CLI
+from mininet.log import lg
+from mininet.topo import Topo
+
+from Dumbbell import configure_switches_standalone, link_params
+from fast_net import FastNet
+
+import argparse
+import json
+import subprocess
+import time
+
+
+TIERS = ("core", "distribution", "access", "hosts")
+DEFAULT_LINK = {"bw": 100, "delay": "1ms", "queue": 1000}
+DEFAULT_SPEC = {
+    "core": {"count": 2, "bw": 1000, "delay": "1ms", "queue": 1000},
+    "distribution": {"count": 4, "uplinks": 2, "bw": 1000, "delay": "1ms", "queue": 1000},
+    "access": {"count": 8, "uplinks": 2, "bw": 100, "delay": "1ms", "queue": 500},
+    "hosts": {"per_switch": 4, "bw": 100, "delay": "1ms", "queue": 1000},
+}
+STP_TIMEOUT_S = 60
+
+
+def tier_link(tier: dict) -> dict:
+    """TCLink parameters of a spec tier (or "links" override)."""
+    p = dict(DEFAULT_LINK)
+    p.update({key: tier[key] for key in DEFAULT_LINK if key in tier})
+    return link_params(p["bw"], p["delay"], p["queue"])
+
+
+def load_spec(path: str) -> dict:
+    with open(path, "r") as file:
+        spec = json.load(file)
+    for tier in TIERS:
+        if tier not in spec:
+            raise ValueError(f"{path}: tier '{tier}' missing")
+    return spec
+
+
+class CampusTopo(Topo):
+    def __init__(self, spec: dict, **kwargs):
+        super().__init__(**kwargs)
+        self.loops = False
+        self._dpid = 0
+        self._overrides = {frozenset(o["between"]): tier_link(o) for o in spec.get("links", [])}
+        self._linked = set()
+
+        if spec.get("type", "hierarchy") == "fattree":
+            access = self._fattree(spec)
+        else:
+            access = self._hierarchy(spec)
+
+        hosts = spec["hosts"]
+        host_link = tier_link(hosts)
+        n = 0
+        for a in access:
+            for _ in range(hosts["per_switch"]):
+                n += 1
+                self._link(self.addHost(f"h{n}"), a, host_link)
+
+        unknown = [sorted(pair) for pair in self._overrides if pair not in self._linked]
+        if unknown:
+            raise ValueError(f"'links' overrides for unknown links: {unknown}")
+
+    def _switch(self, name: str) -> str:
+        # explicit datapath IDs: the name based default would give c1, d1 and a1 the same one
+        self._dpid += 1
+        return self.addSwitch(name, dpid=f"{self._dpid:016x}", failMode="standalone", stp=self.loops)
+
+    def _link(self, a: str, b: str, params: dict) -> None:
+        pair = frozenset((a, b))
+        self._linked.add(pair)
+        self.addLink(a, b, **self._overrides.get(pair, params))
+
+    def _hierarchy(self, spec: dict) -> list:
+        """Wires core, distribution and access switches, returns the access switches."""
+        n_core = spec["core"]["count"]
+        n_dist = spec["distribution"]["count"]
+        dist_up = min(spec["distribution"].get("uplinks", 1), n_core)
+        access_up = min(spec["access"].get("uplinks", 1), n_dist)
+        self.loops = n_core > 2 or dist_up > 1 or access_up > 1
+
+        core = [self._switch(f"c{i}") for i in range(1, n_core + 1)]
+        dist = [self._switch(f"d{i}") for i in range(1, n_dist + 1)]
+        access = [self._switch(f"a{i}") for i in range(1, spec["access"]["count"] + 1)]
+
+        core_link = tier_link(spec["core"])
+        for i, c in enumerate(core):
+            for other in core[i + 1:]:
+                self._link(c, other, core_link)
+
+        dist_link = tier_link(spec["distribution"])
+        for i, d in enumerate(dist):
+            for k in range(dist_up):
+                self._link(d, core[(i + k) % n_core], dist_link)
+
+        # distribution switches form groups of access_up; access switches are spread over the groups
+        access_link = tier_link(spec["access"])
+        n_groups = max(n_dist // access_up, 1)
+        for j, a in enumerate(access):
+            group = j % n_groups
+            for k in range(access_up):
+                self._link(a, dist[(group * access_up + k) % n_dist], access_link)
+        return access
+
+    def _fattree(self, spec: dict) -> list:
+        """Wires a k-ary fat-tree (k pods of k/2 aggregation and k/2 edge switches), returns the edge switches."""
+        k = spec["k"]
+        if k % 2:
+            raise ValueError(f"fat-tree k has to be even, got {k}")
+        half = k // 2
+        self.loops = True
+
+        core = [self._switch(f"c{i}") for i in range(1, half * half + 1)]
+        dist, access = [], []
+        dist_link = tier_link(spec["distribution"])
+        access_link = tier_link(spec["access"])
+        for pod in range(k):
+            aggs = [self._switch(f"d{pod * half + i + 1}") for i in range(half)]
+            edges = [self._switch(f"a{pod * half + i + 1}") for i in range(half)]
+            for i, agg in enumerate(aggs):
+                # aggregation switch i of every pod connects to core group i
+                for c in core[i * half:(i + 1) * half]:
+                    self._link(agg, c, dist_link)
+                for edge in edges:
+                    self._link(edge, agg, access_link)
+            dist += aggs
+            access += edges
+        return access
+
+
+def wait_for_stp(net: Mininet, timeout: float = STP_TIMEOUT_S, interval: float = 1.0) -> bool:
+    """Waits until no STP port is listening or learning any more. Returns False on timeout."""
+    print("[+] Waiting for STP to converge...")
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = subprocess.run(["ovs-appctl", "stp/show"], capture_output=True, text=True).stdout
+        if "forwarding" in state and "listening" not in state and "learning" not in state:
+            return True
+        time.sleep(interval)
+    return False
+
+
+def scaled_spec(n_access: int, hosts_per_switch: int) -> dict:
+    """DEFAULT_SPEC with n_access access switches (1 distribution pair per 20 of them)."""
+    spec = json.loads(json.dumps(DEFAULT_SPEC))
+    spec["access"]["count"] = n_access
+    spec["distribution"]["count"] = max(2, 2 * -(-n_access // 20))
+    spec["hosts"]["per_switch"] = hosts_per_switch
+    return spec
+
+
+def benchmark(with_net: bool = False) -> None:
+    """Topo (and optionally Mininet start/stop) time for growing campuses."""
+    lg.setLogLevel("warning")
+    print("switches,hosts,links,topo_s" + (",build_s,start_s,stop_s" if with_net else ""))
+    for n_access, per_switch in ((8, 5), (20, 5), (45, 5), (90, 6)):
+        spec = scaled_spec(n_access, per_switch)
+        t0 = time.perf_counter()
+        topo = CampusTopo(spec)
+        topo_s = time.perf_counter() - t0
+        row = f"{len(topo.switches())},{len(topo.hosts())},{len(topo.links())},{topo_s:.3f}"
+        if with_net:
+            t0 = time.perf_counter()
+            net = FastNet(topo=topo, autoSetMacs=True)
+            t1 = time.perf_counter()
+            net.start()
+            t2 = time.perf_counter()
+            net.stop()
+            t3 = time.perf_counter()
+            row += f",{t1 - t0:.2f},{t2 - t1:.2f},{t3 - t2:.2f}"
+        print(row, flush=True)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Mininet campus topology (core/distribution/access or fat-tree)")
+    p.add_argument("spec", nargs="?", default=None, help="topology spec (JSON), default: small built-in campus")
+    p.add_argument("--bench", action="store_true", help="measure build time for growing topologies")
+    p.add_argument("--bench-net", action="store_true", help="with --bench: also build, start and stop Mininet")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.bench:
+        benchmark(args.bench_net)
+        return
+
+    lg.setLogLevel("info")
+    spec = load_spec(args.spec) if args.spec else DEFAULT_SPEC
+    topo = CampusTopo(spec)
+    print(f"[+] {len(topo.switches())} switches, {len(topo.hosts())} hosts, {len(topo.links())} links")
+
+    net = FastNet(topo=topo, autoSetMacs=True)
+    net.start()
+    try:
+        configure_switches_standalone(net)
+        if topo.loops and not wait_for_stp(net):
+            print(f"[!] STP did not converge within {STP_TIMEOUT_S} s")
+        print("[+] Network is up.")
+        CLI(net)
+    finally:
+        net.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Typed columnar dataset files for the converted iperf3 metrics.
+
+Formats:
+- feather: Arrow IPC file, uncompressed, one record batch (memory-mapped on load)
+- parquet: compressed Parquet file (decoded on load, smallest on disk; read_chunks
+           decodes one row group at a time)
+- npz:     uncompressed NumPy archive (memory-mapped on load), used when pyarrow is missing
+- csv:     the original text format
+
+Every binary file carries a metadata block (JSON): the column schema plus
+whatever the converter knows about the run, e.g. run ID, topology parameters
+and the iperf3 test settings.
+"""
+
+import csv
+import json
+import os
+import zipfile
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, npz works without it
+    pa = None
+    pq = None
+
+
+FORMATS = ("csv", "feather", "parquet", "npz")
+META_KEY = "campus_digital_twin"  # key of the metadata block in Arrow schemas
+_NPZ_META = "__meta__"            # npz member holding the metadata block as UTF-8 bytes
+_EXTENSIONS = {".csv": "csv", ".feather": "feather", ".arrow": "feather",
+               ".parquet": "parquet", ".npz": "npz"}
+
+
+def format_for_path(path: str, default: str = "csv") -> str:
+    """Guess the dataset format from the file extension."""
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def resolve_format(fmt: str, path: str):
+    """
+    Fall back to npz if an Arrow based format is requested without pyarrow.
+    Returns (format, path), the path gets the matching extension.
+    """
+    if fmt in ("feather", "parquet") and pa is None:
+        print(f"[!] pyarrow is not installed, writing npz instead of {fmt}")
+        fmt = "npz"
+    if format_for_path(path, default="") != fmt:
+        path = os.path.splitext(path)[0] + "." + fmt
+    return fmt, path
+
+
+def schema_of(columns: dict) -> list:
+    return [{"name": name, "dtype": str(values.dtype)} for name, values in columns.items()]
+
+
+def write_csv(path: str, columns: dict) -> None:
+    names = list(columns)
+    with open(path, "w", newline="") as file:
+        file.write(",".join(names) + "\n")
+        cells = []
+        for values in columns.values():
+            if values.dtype.kind == "U":
+                cells.append([_csv_field(v) for v in values.tolist()])
+            else:
+                cells.append(map(str, values.tolist()))
+        for row in zip(*cells):
+            file.write(",".join(row) + "\n")
+
+
+def _csv_field(text: str) -> str:
+    if any(c in text for c in ',"\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def write_dataset(path: str, columns: dict, metadata: dict = None, fmt: str = None) -> str:
+    """
+    Write equally long 1-D arrays as a dataset file.
+    String columns have to be NumPy unicode arrays (dtype '<U...').
+    Returns the path actually written (the extension may change, see resolve_format).
+    """
+    fmt, path = resolve_format(fmt or format_for_path(path), path)
+    meta = dict(metadata or {})
+    meta["schema"] = schema_of(columns)
+    tmp_path = path + ".tmp"
+
+    if fmt == "csv":
+        write_csv(tmp_path, columns)
+    elif fmt == "npz":
+        arrays = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+        arrays[_NPZ_META] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+        # np.savez stores members uncompressed, which is what makes them mappable;
+        # write through a file object so numpy does not append another .npz
+        with open(tmp_path, "wb") as file:
+            np.savez(file, **arrays)
+    else:
+        table = pa.table({name: pa.array(values) for name, values in columns.items()})
+        table = table.replace_schema_metadata({META_KEY: json.dumps(meta)})
+        if fmt == "parquet":
+            pq.write_table(table, tmp_path)
+        else:
+            # a single uncompressed record batch keeps every column one contiguous buffer
+            with pa.ipc.new_file(tmp_path, table.schema) as writer:
+                writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def _npz_memmap(path: str) -> tuple:
+    """Memory-map every member of an uncompressed npz archive."""
+    columns = {}
+    meta = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as file:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {name} is compressed and can not be memory-mapped")
+            # local file header: fixed 30 bytes, then file name and extra field
+            file.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(file.read(4), dtype="<u2")
+            file.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            if np.lib.format.read_magic(file) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            if name == _NPZ_META:
+                meta = json.loads(file.read(int(np.prod(shape))).decode())
+                continue
+            columns[name] = np.memmap(path, dtype=dtype, mode="r", offset=file.tell(),
+                                      shape=shape, order="F" if fortran_order else "C")
+    return columns, meta
+
+
+def _read_csv(path: str) -> dict:
+    with open(path, "r", newline="") as file:
+        reader = csv.reader(file)
+        names = next(reader)
+        cells = list(zip(*reader)) or [()] * len(names)
+    columns = {}
+    for name, values in zip(names, cells):
+        try:
+            columns[name] = np.array(values, dtype=np.float64)
+        except ValueError:
+            columns[name] = np.array(values, dtype=str)
+    return columns
+
+
+def load_dataset(path: str) -> tuple:
+    """
+    Load a dataset file written by write_dataset.
+    Returns (columns, metadata); columns maps names to 1-D NumPy arrays.
+    feather and npz columns are memory-mapped views of the file (no copy);
+    parquet has to be decoded, csv is parsed.
+    """
+    fmt = format_for_path(path)
+    if fmt == "npz":
+        return _npz_memmap(path)
+    if fmt == "csv":
+        return _read_csv(path), {}
+    if pa is None:
+        raise ImportError(f"pyarrow is needed to read {path}")
+
+    if fmt == "parquet":
+        table = pq.read_table(path, memory_map=True)
+    else:
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    raw = (table.schema.metadata or {}).get(META_KEY.encode())
+    meta = json.loads(raw) if raw else {}
+    columns = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            columns[name] = np.array(column.to_pylist())
+        elif column.num_chunks == 1:
+            columns[name] = column.chunk(0).to_numpy(zero_copy_only=True)
+        else:
+            columns[name] = column.to_numpy()
+    return columns, meta
+
+
+def read_column_names(path: str) -> list:
+    """Column names of a dataset file, from its header or schema only (no column data is read)."""
+    fmt = format_for_path(path)
+    if fmt == "csv":
+        with open(path, "r", newline="") as file:
+            return next(csv.reader(file))
+    if fmt == "npz":
+        with zipfile.ZipFile(path) as archive:
+            return [info.filename[:-len(".npy")] for info in archive.infolist()
+                    if info.filename[:-len(".npy")] != _NPZ_META]
+    if pa is None:
+        raise ImportError(f"pyarrow is needed to read {path}")
+    if fmt == "parquet":
+        return pq.read_schema(path).names
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def read_chunks(path: str, names: list, chunk_rows: int):
+    """
+    Yields float64 blocks (rows x names) of a dataset file, chunk_rows rows each (the last
+    one may be shorter), whatever the format, without holding more than a chunk in memory:
+    npz and feather columns are memory-mapped and sliced, parquet is decoded one row group
+    at a time, csv is parsed chunk by chunk. Only the named columns are read; text cells
+    of csv files become NaN.
+    """
+    fmt = format_for_path(path)
+    if fmt == "csv":
+        yield from _csv_chunks(path, names, chunk_rows)
+        return
+    if fmt == "npz":
+        columns, _ = _npz_memmap(path)
+        n_rows = len(columns[names[0]]) if names else 0
+        for start in range(0, n_rows, chunk_rows):
+            yield np.column_stack([np.asarray(columns[name][start:start + chunk_rows], dtype=np.float64)
+                                   for name in names])
+        return
+    if pa is None:
+        raise ImportError(f"pyarrow is needed to read {path}")
+    if fmt == "parquet":
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=names)
+        yield from _rechunk(_arrow_blocks(batches, names), chunk_rows)
+        return
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        yield from _rechunk(_arrow_blocks(batches, names), chunk_rows)
+
+
+def _arrow_blocks(batches, names: list):
+    for batch in batches:
+        yield np.column_stack([np.asarray(batch.column(name).to_numpy(zero_copy_only=False), dtype=np.float64)
+                               for name in names])
+
+
+def _rechunk(blocks, chunk_rows: int):
+    """Cuts blocks of any length (record batches, row groups) into chunk_rows rows each."""
+    carry = []
+    carried = 0
+    for block in blocks:
+        while len(block):
+            take = min(chunk_rows - carried, len(block))
+            carry.append(block[:take])
+            carried += take
+            block = block[take:]
+            if carried == chunk_rows:
+                yield carry[0] if len(carry) == 1 else np.concatenate(carry)
+                carry = []
+                carried = 0
+    if carried:
+        yield np.concatenate(carry)
+
+
+def _csv_chunks(path: str, names: list, chunk_rows: int):
+    with open(path, "r", newline="") as file:
+        reader = csv.reader(file)
+        position = {name: k for k, name in enumerate(next(reader))}
+        picks = [position[name] for name in names]
+        block = []
+        for row in reader:
+            block.append([row[k] for k in picks])
+            if len(block) == chunk_rows:
+                yield _to_float(block)
+                block = []
+        if block:
+            yield _to_float(block)
+
+
+def _to_float(rows: list) -> np.ndarray:
+    try:
+        return np.array(rows, dtype=np.float64)
+    except ValueError:
+        return np.array([[_float_or_nan(cell) for cell in row] for row in rows])
+
+
+def _float_or_nan(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return float("nan")
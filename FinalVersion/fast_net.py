@@ -0,0 +1,394 @@
+#! /usr/bin/env python3
+"""
+Fast Mininet startup and teardown, and a warm network reused across runs.
+
+Where plain Mininet spends its time (see --profile) and what FastNet does instead:
+- veth pairs: one `ip link add` per link -> one `ip -batch` for all links,
+- link shaping: every TCIntf.config runs `tc qdisc show`, up to four tc
+  commands, ethtool and ifconfig one by one through the node's shell, and
+  OVSSwitch.batchStartup runs it all again for every switch port ->
+  BulkConfig collects the commands and runs them per network namespace, all
+  tc lines of a namespace through one `tc -force -batch` (tc errors of the
+  unconditional `qdisc del root` on fresh interfaces are expected and dropped),
+- OVS: bridges are created in one ovs-vsctl transaction by Mininet already;
+  FastOVSSwitch sets fail_mode=standalone in that transaction, so no
+  ovs-vsctl call per switch is needed afterwards,
+- teardown: one `ip link del` per interface -> one `ip -batch` deleting the
+  root namespace end of every veth pair (the peer goes with it).
+
+WarmNetwork keeps a started network across runs: asking for the same topology
+again returns it reset to a clean state (reset_network: MAC learning tables and
+ARP caches flushed, the configured shaping of every link re-applied, which also
+clears the qdisc counters) instead of stopping and rebuilding it. A topology
+that differs only in link parameters is reshaped in place.
+
+Usage:
+    sudo python3 fast_net.py                       # startup / reset / teardown time vs. size
+    sudo python3 fast_net.py --profile --hosts 30  # cProfile of plain Mininet start/stop
+"""
+
+from mininet.net import Mininet
+from mininet.node import OVSSwitch
+from mininet.link import TCIntf, TCLink
+from mininet.log import error, lg
+from mininet.util import errRun
+
+import argparse
+import cProfile
+import os
+import pstats
+import re
+import subprocess
+import tempfile
+import time
+
+
+_FAILED_RE = re.compile(r"Command failed \S*:(\d+)")
+
+
+def _tc_errors(output: str, lines: list) -> list:
+    """Failed lines of a `tc -force -batch` run, without the expected `qdisc del` failures."""
+    failed = []
+    for m in _FAILED_RE.finditer(output):
+        line = lines[int(m.group(1)) - 1]
+        if not line.startswith("qdisc del"):
+            failed.append(line)
+    return failed
+
+
+class BulkConfig:
+    """
+    Context in which BulkTCIntf.config does not run anything but collects its
+    shell and tc commands per node; they are run on exit, one shell command per
+    node and one tc batch per network namespace. Nested contexts join the outer one.
+    """
+
+    active = None
+
+    def __init__(self):
+        self.shell = {}  # node -> commands, in order
+        self.tc = {}     # node -> tc batch lines, in order
+        self._outer = False
+
+    def __enter__(self):
+        if BulkConfig.active is not None:
+            self._outer = True
+            return BulkConfig.active
+        BulkConfig.active = self
+        return self
+
+    def __exit__(self, kind, value, traceback) -> None:
+        if self._outer:
+            return
+        BulkConfig.active = None
+        if kind is None:
+            self.run()
+
+    def run(self) -> None:
+        # ethtool / ifconfig first, all nodes at once
+        for node, commands in self.shell.items():
+            node.sendCmd("; ".join(commands))
+        for node in self.shell:
+            node.waitOutput()
+
+        root = [line for node, lines in self.tc.items() if not node.inNamespace for line in lines]
+        hosts = {node: lines for node, lines in self.tc.items() if node.inNamespace and lines}
+        failed = []
+        with tempfile.TemporaryDirectory(prefix="bulk_tc_") as tmp:
+            for node, lines in hosts.items():
+                path = os.path.join(tmp, f"{node.name}.tc")
+                with open(path, "w") as file:
+                    file.write("\n".join(lines) + "\n")
+                node.sendCmd(f"tc -force -batch {path} 2>&1")
+            if root:
+                # switches share the root namespace: a single tc process for all of them
+                proc = subprocess.run(["tc", "-force", "-batch", "-"], input="\n".join(root) + "\n",
+                                      capture_output=True, text=True)
+                failed += _tc_errors(proc.stderr, root)
+            for node, lines in hosts.items():
+                failed += _tc_errors(node.waitOutput(), lines)
+        for line in failed:
+            error(f"*** Error: tc {line}\n")
+
+
+class BulkTCIntf(TCIntf):
+    """TCIntf whose commands are collected while a BulkConfig is active."""
+
+    def cmd(self, *args, **kwargs):
+        bulk = BulkConfig.active
+        if bulk is None:
+            return super().cmd(*args, **kwargs)
+        bulk.shell.setdefault(self.node, []).append(" ".join(str(arg) for arg in args))
+        return ""
+
+    def tc(self, cmd, tc="tc"):
+        bulk = BulkConfig.active
+        if bulk is None:
+            return super().tc(cmd, tc)
+        line = (cmd % ("", self)).strip()
+        # the current qdiscs are not known in bulk mode: an empty answer makes
+        # config delete the root qdisc unconditionally
+        if not line.startswith("qdisc show"):
+            bulk.tc.setdefault(self.node, []).append(line)
+        return ""
+
+
+class BulkTCLink(TCLink):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("cls1", BulkTCIntf)
+        kwargs.setdefault("cls2", BulkTCIntf)
+        super().__init__(*args, **kwargs)
+
+
+class FastOVSSwitch(OVSSwitch):
+    """OVSSwitch in standalone mode, re-applying the shaping of its ports in bulk after the batch startup."""
+
+    def __init__(self, name, failMode="standalone", **params):
+        super().__init__(name, failMode=failMode, **params)
+
+    @classmethod
+    def batchStartup(cls, switches, run=errRun):
+        with BulkConfig():
+            return super().batchStartup(switches, run)
+
+
+_PREBUILT = {}
+
+
+def _prebuilt(cls):
+    """Subclass of a Link class that expects its veth pair to exist already."""
+    if cls not in _PREBUILT:
+        _PREBUILT[cls] = type("Prebuilt" + cls.__name__, (cls,),
+                              {"makeIntfPair": classmethod(lambda *args, **kwargs: None)})
+    return _PREBUILT[cls]
+
+
+class FastNet(Mininet):
+    """
+    Mininet that creates the veth pairs of all topology links with one `ip -batch`
+    call, configures their shaping in bulk and deletes them in bulk on stop.
+    Defaults: FastOVSSwitch, BulkTCLink, no controller.
+    """
+
+    _pending = None
+
+    def __init__(self, topo=None, switch=FastOVSSwitch, link=BulkTCLink, controller=None, **kwargs):
+        super().__init__(topo=topo, switch=switch, link=link, controller=controller, **kwargs)
+
+    def buildFromTopo(self, topo=None):
+        self._pending = []
+        try:
+            super().buildFromTopo(topo)
+        finally:
+            pending, self._pending = self._pending, None
+        with BulkConfig():
+            self._make_links(pending)
+
+    def addLink(self, node1, node2, port1=None, port2=None, cls=None, **params):
+        if self._pending is None:
+            return super().addLink(node1, node2, port1=port1, port2=port2, cls=cls, **params)
+        self._pending.append((node1, node2, port1, port2, cls, params))
+        return None
+
+    def _make_links(self, pending: list) -> None:
+        batch = []
+        links = []
+        for node1, node2, port1, port2, cls, params in pending:
+            node1, node2 = self[node1], self[node2]
+            # same defaults as Mininet.addLink / Link.__init__
+            port1 = node1.newPort() if port1 is None else port1
+            port2 = node2.newPort() if port2 is None else port2
+            options = dict(params, port1=port1, port2=port2,
+                           intfName1=f"{node1.name}-eth{port1}", intfName2=f"{node2.name}-eth{port2}")
+            if self.intf is not None:
+                options.setdefault("intf", self.intf)
+            options.setdefault("addr1", self.randMac())
+            options.setdefault("addr2", self.randMac())
+            batch.append(f"link add name {options['intfName1']} address {options['addr1']} netns {node1.pid} "
+                         f"type veth peer name {options['intfName2']} address {options['addr2']} netns {node2.pid}")
+            links.append((_prebuilt(self.link if cls is None else cls), node1, node2, options))
+
+        if batch:
+            subprocess.run(["ip", "-batch", "-"], input="\n".join(batch) + "\n", text=True, check=True)
+        for cls, node1, node2, options in links:
+            self.links.append(cls(node1, node2, **options))
+
+    def stop(self):
+        # deleting the root namespace end of a veth pair removes both ends
+        doomed = []
+        kept = []
+        for link in self.links:
+            ends = [intf for intf in (link.intf1, link.intf2) if not intf.node.inNamespace]
+            if ends:
+                doomed.append(f"link del {ends[0].name}")
+            else:
+                kept.append(link)
+        if doomed:
+            subprocess.run(["ip", "-force", "-batch", "-"], input="\n".join(doomed) + "\n", text=True,
+                           capture_output=True)
+        links, self.links = self.links, kept
+        try:
+            super().stop()
+        finally:
+            self.links = links
+
+
+def shaped_intfs(net) -> list:
+    """TCIntfs of all links that carry shaping parameters."""
+    return [intf for link in net.links for intf in (link.intf1, link.intf2)
+            if isinstance(intf, TCIntf) and intf.params]
+
+
+def reset_network(net) -> None:
+    """
+    Clean state for the next run on a started network: MAC learning tables and
+    ARP caches flushed, the configured shaping of every link re-applied (which
+    also undoes link replays / reshaping done through tc directly and clears
+    the qdisc counters).
+    """
+    # per bridge: other networks on the same OVS (parallel_sweep.py) keep their tables
+    flushes = [subprocess.Popen(["ovs-appctl", "fdb/flush", switch.name], stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL) for switch in net.switches]
+    for host in net.hosts:
+        host.sendCmd("ip neigh flush all")
+    for host in net.hosts:
+        host.waitOutput()
+    for proc in flushes:
+        proc.wait()
+    with BulkConfig():
+        for intf in shaped_intfs(net):
+            intf.config(**intf.params)
+
+
+def _link_free(topo_kwargs: dict) -> dict:
+    # topology shape without the link parameters (bw, delay, queue)
+    return {key: value for key, value in topo_kwargs.items() if not key.endswith(("_bw", "_delay", "_queue"))}
+
+
+class WarmNetwork:
+    """
+    One started network kept across runs.
+    get(**topo_kwargs) returns it reset if the topology is the same, reshaped in
+    place if only link parameters differ, and rebuilt otherwise.
+    """
+
+    def __init__(self, topo_cls, **net_kwargs):
+        self.topo_cls = topo_cls
+        self.net_kwargs = net_kwargs
+        self.net = None
+        self.topo_kwargs = None
+        self.builds = 0
+
+    def get(self, **topo_kwargs):
+        if self.net is not None and topo_kwargs == self.topo_kwargs:
+            reset_network(self.net)
+            return self.net
+        if self.net is not None and _link_free(topo_kwargs) == _link_free(self.topo_kwargs):
+            self._reshape(topo_kwargs)
+            return self.net
+        self.close()
+        self.net = FastNet(topo=self.topo_cls(**topo_kwargs), **self.net_kwargs)
+        self.net.start()
+        self.topo_kwargs = topo_kwargs
+        self.builds += 1
+        return self.net
+
+    def _reshape(self, topo_kwargs: dict) -> None:
+        # the topology object built from the new kwargs names the new parameters of every link
+        topo = self.topo_cls(**topo_kwargs)
+        wanted = {frozenset((a, b)): info for a, b, info in topo.links(withInfo=True)}
+        self.net.topo = topo
+        for link in self.net.links:
+            info = wanted.get(frozenset((link.intf1.node.name, link.intf2.node.name)))
+            if info is None:
+                continue
+            params = {key: value for key, value in info.items() if key not in ("node1", "node2", "port1", "port2")}
+            for intf in (link.intf1, link.intf2):
+                intf.params.update(params)
+        # applies the new parameters
+        reset_network(self.net)
+        self.topo_kwargs = topo_kwargs
+
+    def close(self) -> None:
+        if self.net is not None:
+            self.net.stop()
+            self.net = None
+            self.topo_kwargs = None
+
+
+def _dumbbell(hosts: int):
+    from Dumbbell import DumbbellTopo
+    return DumbbellTopo(n_left=hosts, n_right=hosts)
+
+
+def _campus(n_access: int):
+    from campus_topo import CampusTopo, scaled_spec
+    return CampusTopo(scaled_spec(n_access, 4))
+
+
+def _plain_net(topo):
+    from Dumbbell import configure_switches_standalone
+    net = Mininet(topo=topo, switch=OVSSwitch, controller=None, link=TCLink, autoSetMacs=True)
+    net.start()
+    configure_switches_standalone(net)
+    return net
+
+
+def _fast_net(topo):
+    net = FastNet(topo=topo, autoSetMacs=True)
+    net.start()
+    return net
+
+
+def benchmark() -> None:
+    """Startup, reset and teardown time of plain Mininet and FastNet for growing dumbbells and campuses."""
+    lg.setLogLevel("warning")
+    print("topology,size,switches,hosts,links,net,start_s,reset_s,stop_s")
+    cases = [("dumbbell", n, _dumbbell) for n in (3, 10, 30, 100)] + [("campus", n, _campus) for n in (8, 20, 45)]
+    for name, size, make_topo in cases:
+        for label, start in (("mininet", _plain_net), ("fast", _fast_net)):
+            topo = make_topo(size)
+            t0 = time.perf_counter()
+            net = start(topo)
+            t1 = time.perf_counter()
+            reset_s = ""
+            if label == "fast":
+                reset_network(net)
+                reset_s = f"{time.perf_counter() - t1:.2f}"
+            t2 = time.perf_counter()
+            net.stop()
+            t3 = time.perf_counter()
+            print(f"{name},{size},{len(topo.switches())},{len(topo.hosts())},{len(topo.links())},{label},"
+                  f"{t1 - t0:.2f},{reset_s},{t3 - t2:.2f}", flush=True)
+
+
+def profile(hosts: int, fast: bool, top: int = 25) -> None:
+    """cProfile of one start / stop cycle of a dumbbell with hosts hosts per side."""
+    lg.setLogLevel("warning")
+    topo = _dumbbell(hosts)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    net = (_fast_net if fast else _plain_net)(topo)
+    net.stop()
+    profiler.disable()
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Mininet startup / teardown benchmark and profile")
+    p.add_argument("--profile", action="store_true", help="cProfile one start / stop cycle")
+    p.add_argument("--hosts", type=int, default=10, help="--profile: dumbbell hosts per side")
+    p.add_argument("--fast", action="store_true", help="--profile: FastNet instead of plain Mininet")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.profile:
+        profile(args.hosts, args.fast)
+        return
+    benchmark()
+
+
+if __name__ == "__main__":
+    main()
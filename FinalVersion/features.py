@@ -0,0 +1,110 @@
+"""
+Rolling-window features over the interval stream of a flow.
+
+json_to_csv.py produces one row per iperf3 interval (snapshot averaged over the
+streams). For every window length w this stage appends:
+- throughput_ma<w>:     moving average of the throughput,
+- retransmits_rate<w>:  retransmits per interval over the last w intervals,
+- snd_cwnd_trend<w>:    least-squares slope of snd_cwnd (bytes per interval).
+The first w - 1 intervals of a flow use the intervals seen so far.
+
+The windows are not recomputed: RollingFeatures keeps cumulative sums (of the
+values and of interval index x value) and a ring buffer of the last max(w) + 1
+cumulative sums, so each interval costs O(1) per feature whether rows arrive in
+blocks (batch conversion) or one at a time (telemetry.py). Both paths use the
+same class, so training data and live rows carry identical columns.
+
+The rtt label is deliberately not used as a source (its window would contain
+the current label).
+"""
+
+import numpy as np
+
+
+DEFAULT_WINDOWS = (5, 20)
+# (source column, kind); kinds: ma, rate (both window means), trend (slope)
+ROLLING = (("throughput", "ma"), ("retransmits", "rate"), ("snd_cwnd", "trend"))
+
+
+def feature_names(windows=DEFAULT_WINDOWS) -> list:
+    return [f"{column}_{kind}{w}" for w in windows for column, kind in ROLLING]
+
+
+def parse_windows(text: str) -> tuple:
+    """Comma separated window lengths in intervals ('' or '0': no features)."""
+    windows = tuple(int(w) for w in text.split(",") if w.strip() and int(w) != 0)
+    if any(w < 1 for w in windows):
+        raise ValueError(f"Window lengths have to be positive: {text}")
+    return windows
+
+
+class RollingFeatures:
+    """
+    Rolling-window features of one flow.
+    columns: names of the columns of the rows passed to transform (json_to_csv.column_names).
+    """
+
+    def __init__(self, columns: list, windows=DEFAULT_WINDOWS):
+        missing = {column for column, _ in ROLLING} - set(columns)
+        if missing:
+            raise ValueError(f"Rolling features need the mean columns {sorted(missing)}")
+        self.windows = tuple(windows)
+        self.names = feature_names(self.windows)
+        sources = sorted({column for column, _ in ROLLING}, key=list(columns).index)
+        self._source_index = [list(columns).index(column) for column in sources]
+        self._slot = {column: k for k, column in enumerate(sources)}
+        self._trend = [self._slot[column] for column, kind in ROLLING if kind == "trend"]
+        self._ring_size = max(self.windows, default=0) + 1
+        self.reset()
+
+    def reset(self) -> None:
+        """Starts a new flow."""
+        width = len(self._slot) + len(self._trend)
+        # cumulative sums after t rows live in slot t % ring size; after 0 rows they are 0
+        self._ring = np.zeros((self._ring_size, width))
+        self._t = 0
+
+    def transform(self, rows: np.ndarray) -> np.ndarray:
+        """Features of the next len(rows) intervals, shape (len(rows), len(names))."""
+        rows = np.asarray(rows, dtype=np.float64)
+        n = len(rows)
+        if n == 0:
+            return np.empty((0, len(self.names)))
+        t = self._t
+        values = rows[:, self._source_index]
+        k = np.arange(t, t + n, dtype=np.float64)
+        # value columns followed by index x value for the trend sources
+        terms = np.hstack([values, values[:, self._trend] * k[:, None]])
+        cum = self._ring[t % self._ring_size] + np.cumsum(terms, axis=0)
+
+        end = np.arange(t + 1, t + n + 1)  # cumulative position after each row
+        out = np.empty((n, len(self.names)))
+        col = 0
+        for w in self.windows:
+            start = np.maximum(end - w, 0)
+            before = np.empty_like(cum)
+            in_ring = start <= t
+            before[in_ring] = self._ring[start[in_ring] % self._ring_size]
+            before[~in_ring] = cum[start[~in_ring] - t - 1]
+            sums = cum - before
+            m = (end - start).astype(np.float64)
+            for column, kind in ROLLING:
+                s = self._slot[column]
+                if kind == "trend":
+                    # slope of the values over the indices start .. end - 1
+                    sk = (start + end - 1) * m / 2
+                    skk = ((end - 1) * end * (2 * end - 1) - (start - 1) * start * (2 * start - 1)) / 6
+                    sky = sums[:, len(self._slot) + self._trend.index(s)]
+                    denominator = m * skk - sk * sk
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        slope = (m * sky - sk * sums[:, s]) / denominator
+                    out[:, col] = np.where(m > 1, slope, 0.0)
+                else:
+                    out[:, col] = sums[:, s] / m
+                col += 1
+
+        # keep the cumulative sums of the last ring size positions
+        keep = min(n, self._ring_size)
+        self._ring[end[-keep:] % self._ring_size] = cum[-keep:]
+        self._t = t + n
+        return out
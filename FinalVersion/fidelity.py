@@ -0,0 +1,219 @@
+"""
+Emulation fidelity self-check for dumbbell runs.
+
+Once the host CPU saturates, HTB shaping and netem timing become jittery and a
+run measures the host rather than the emulated network. FidelityMonitor samples
+during a scenario, once per second:
+- host CPU from /proc/stat: busy and softirq share, overall and per core,
+- `tc -s qdisc show` of every shaped (TCLink) interface: bytes sent, drops and
+  backlog of the root qdisc (one tc call per network namespace).
+
+After the run the samples are checked against the link configuration:
+- flags (fidelity lost, the run should be rejected):
+  cpu_saturated      host CPU busy above CPU_BUSY_MAX in more than 10 % of the samples,
+  softirq_saturated  a core spent more than SOFTIRQ_MAX in softirq (packet processing),
+  rate_exceeded      an interface sent faster than its configured bw (access_bw or
+                     bottleneck_bw) by more than RATE_TOLERANCE, i.e. shaping failed,
+- warnings (reported, not rejected):
+  bottleneck_underused  the offered load exceeds bottleneck_bw, but the bottleneck
+                        carried less than UTILIZATION_MIN of it (iperf3 traffic only).
+
+The metrics, the per-second series and the verdict are written to fidelity.json
+next to the iperf3 logs.
+"""
+
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from units import bits_per_second
+
+
+SAMPLE_INTERVAL_S = 1.0
+CPU_BUSY_MAX = 0.9
+SOFTIRQ_MAX = 0.5
+RATE_TOLERANCE = 1.10
+UTILIZATION_MIN = 0.8
+SATURATED_SHARE = 0.1  # share of samples above a limit that counts as saturated
+EDGE_SAMPLES = 2  # samples skipped at both ends of the run (slow start, teardown)
+REPORT = "fidelity.json"
+
+_QDISC_RE = re.compile(r"^qdisc (\S+) (\S+) dev (\S+) (root|parent \S+)")
+_SENT_RE = re.compile(r"Sent (\d+) bytes (\d+) pkt \(dropped (\d+), overlimits (\d+)")
+_BACKLOG_RE = re.compile(r"backlog (\d+)b (\d+)p")
+
+
+def read_cpu() -> np.ndarray:
+    """/proc/stat jiffies per core, shape (cores, 3): total, idle (+iowait), softirq."""
+    rows = []
+    with open("/proc/stat", "r") as file:
+        for line in file:
+            if not line.startswith("cpu") or line.startswith("cpu "):
+                continue
+            # user nice system idle iowait irq softirq steal ...
+            values = [int(v) for v in line.split()[1:]]
+            rows.append((sum(values[:8]), values[3] + values[4], values[6]))
+    return np.array(rows, dtype=np.float64)
+
+
+def parse_qdiscs(text: str, devices: set) -> dict:
+    """Root qdisc statistics per device of `tc -s qdisc show`: (bytes sent, drops, backlog bytes, backlog packets)."""
+    stats = {}
+    dev = None
+    for line in text.splitlines():
+        m = _QDISC_RE.match(line)
+        if m is not None:
+            dev = m.group(3) if m.group(4) == "root" and m.group(3) in devices else None
+            if dev is not None:
+                stats[dev] = [0, 0, 0, 0]
+            continue
+        if dev is None:
+            continue
+        m = _SENT_RE.search(line)
+        if m is not None:
+            stats[dev][0] = int(m.group(1))
+            stats[dev][1] = int(m.group(3))
+        m = _BACKLOG_RE.search(line)
+        if m is not None:
+            stats[dev][2] = int(m.group(1))
+            stats[dev][3] = int(m.group(2))
+    return stats
+
+
+def shaped_interfaces(net) -> dict:
+    """Configured rate (Mbit/s) per shaped interface, grouped by namespace: {pid or None: {name: bw}}."""
+    groups = {}
+    for link in net.links:
+        for intf in (link.intf1, link.intf2):
+            bw = intf.params.get("bw")
+            if bw is None:
+                continue
+            node = intf.node
+            pid = node.pid if node.inNamespace else None
+            groups.setdefault(pid, {})[intf.name] = float(bw)
+    return groups
+
+
+class FidelityMonitor:
+    """Background sampler of host CPU and qdisc statistics for one scenario run."""
+
+    def __init__(self, net, interval: float = SAMPLE_INTERVAL_S, limits: dict = None):
+        """limits: configured rate (Mbit/s) per interface overriding the TCLink one, e.g. the peak of a link replay."""
+        self.groups = shaped_interfaces(net)
+        self.devices = [name for group in self.groups.values() for name in group]
+        self.bw = {name: bw for group in self.groups.values() for name, bw in group.items()}
+        self.bw.update(limits or {})
+        self.interval = interval
+        self.times = []
+        self.cpu = []
+        self.qdiscs = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        stats = {}
+        for pid, group in self.groups.items():
+            # mnexec -a: run tc in the host's network namespace without going through its shell
+            argv = ["tc", "-s", "qdisc", "show"] if pid is None else ["mnexec", "-a", str(pid), "tc", "-s", "qdisc", "show"]
+            out = subprocess.run(argv, capture_output=True, text=True).stdout
+            stats.update(parse_qdiscs(out, set(group)))
+        self.times.append(time.monotonic())
+        self.cpu.append(read_cpu())
+        self.qdiscs.append([stats.get(name, [0, 0, 0, 0]) for name in self.devices])
+
+    def _run(self) -> None:
+        while True:
+            self._sample()
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="fidelity monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def report(self, cfg: dict, bottleneck: list) -> dict:
+        """
+        Fidelity metrics and verdict of the sampled run.
+        cfg: experiment config (n_left, parallel_streams, offered_rate), bottleneck:
+        the interfaces of the s1 -- s2 link.
+        """
+        times = np.array(self.times)
+        dt = np.diff(times)
+        cpu = np.array(self.cpu)           # (samples, cores, 3)
+        qdiscs = np.array(self.qdiscs, dtype=np.float64).reshape(len(times), len(self.devices), 4)
+        flags, warnings = [], []
+
+        d = np.diff(cpu, axis=0)
+        total = np.maximum(d[:, :, 0], 1)
+        core_busy = 1 - d[:, :, 1] / total
+        core_softirq = d[:, :, 2] / total
+        host_busy = 1 - d[:, :, 1].sum(axis=1) / np.maximum(d[:, :, 0].sum(axis=1), 1)
+        if len(host_busy) and np.mean(host_busy > CPU_BUSY_MAX) > SATURATED_SHARE:
+            flags.append("cpu_saturated")
+        if len(core_softirq) and np.mean(core_softirq.max(axis=1) > SOFTIRQ_MAX) > SATURATED_SHARE:
+            flags.append("softirq_saturated")
+
+        # per-interval send rate of every interface in Mbit/s
+        rates = np.diff(qdiscs[:, :, 0], axis=0) * 8 / 1e6 / np.maximum(dt, 1e-9)[:, None]
+        core = slice(EDGE_SAMPLES, max(len(rates) - EDGE_SAMPLES, EDGE_SAMPLES + 1))
+        links = {}
+        for k, name in enumerate(self.devices):
+            bw = self.bw[name]
+            series = rates[:, k]
+            peak = float(series[core].max()) if len(series[core]) else 0.0
+            links[name] = {
+                "bw_mbit": bw,
+                "mean_mbit": float(series[core].mean()) if len(series[core]) else 0.0,
+                "peak_mbit": peak,
+                "drops": int(qdiscs[-1, k, 1] - qdiscs[0, k, 1]),
+                "max_backlog_bytes": int(qdiscs[:, k, 2].max()),
+                "max_backlog_packets": int(qdiscs[:, k, 3].max()),
+                "rate_mbit": series.round(3).tolist(),
+            }
+            if peak > bw * RATE_TOLERANCE:
+                flags.append(f"rate_exceeded:{name}")
+
+        rate = bits_per_second(cfg["offered_rate"])
+        demand = cfg["n_left"] * cfg["parallel_streams"] * rate / 1e6 if rate > 0 else float("inf")
+        if cfg.get("traffic", "iperf3") != "iperf3":
+            demand = 0.0  # the offered load of a traffic mix is not known up front
+        # only the direction carrying the data is loaded, the other one carries the acks
+        loaded = max((links[name] for name in bottleneck if name in links), key=lambda link: link["mean_mbit"],
+                     default=None)
+        if loaded is not None and demand >= loaded["bw_mbit"] and loaded["mean_mbit"] < UTILIZATION_MIN * loaded["bw_mbit"]:
+            warnings.append("bottleneck_underused")
+
+        return {
+            "ok": not flags,
+            "flags": flags,
+            "warnings": warnings,
+            "samples": len(times),
+            "interval_s": self.interval,
+            "cpu": {
+                "host_busy_max": float(host_busy.max()) if len(host_busy) else 0.0,
+                "host_busy_mean": float(host_busy.mean()) if len(host_busy) else 0.0,
+                "core_busy_max": float(core_busy.max()) if core_busy.size else 0.0,
+                "core_softirq_max": float(core_softirq.max()) if core_softirq.size else 0.0,
+                "host_busy": host_busy.round(3).tolist(),
+                "core_softirq_max_series": core_softirq.max(axis=1).round(3).tolist() if core_softirq.size else [],
+            },
+            "links": links,
+        }
+
+
+def write_report(out_dir: str, report: dict) -> str:
+    path = os.path.join(out_dir, REPORT)
+    with open(path + ".tmp", "w") as file:
+        json.dump(report, file, indent=1)
+    os.replace(path + ".tmp", path)
+    return path
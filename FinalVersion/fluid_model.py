@@ -0,0 +1,321 @@
+#! /usr/bin/env python3
+"""
+Fluid model of the dumbbell bottleneck (no Mininet, NumPy only).
+
+Every iperf3 stream is a TCP sender (Reno/AIMD or CUBIC) whose rate is
+cwnd / RTT, capped by the offered rate (-b) and its share of the access link.
+All streams share the s1 -- s2 link: bottleneck_bw drains a drop-tail buffer of
+bottleneck_queue packets, the queue adds to the base RTT and overflowing bytes
+are dropped from the streams in proportion to their rate. A stream that sees a
+drop reduces its window at most once per RTT (fast recovery).
+
+The model is stepped in fixed time steps for a whole batch of scenarios at
+once, so thousands of runs are simulated in the time one real run takes. The
+per-stream samples are reduced with json_to_csv.aggregate, which gives the same
+per-interval columns as the converted iperf3 logs (throughput, retransmits,
+snd_cwnd, snd_wnd, rttvar, rtt) and the same run,flow,interval keys.
+
+Options use the Dumbbell.py names. Grid files use the sweep.py format, but any
+option may vary here; every point can be repeated with --replicates (other seed).
+
+Calibration (--calibrate DIR) simulates every run below DIR with the settings
+from its sweep manifest.json (or the command line) and compares the per-flow
+means of every column against the recorded iperf3 client logs.
+
+Usage:
+    python3 fluid_model.py --bottleneck-bw 20 --parallel 3 --out fluid.csv
+    python3 fluid_model.py --grid grid.json --replicates 100 --out fluid.npz
+    python3 fluid_model.py --calibrate sweep_folder
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+
+import dataset_io
+import json_to_csv
+from units import bits_per_second, seconds
+
+
+MSS = 1448        # TCP payload per packet (1500 MTU, timestamps on)
+PACKET = 1500     # bytes per queued packet
+INIT_CWND = 10    # packets (Linux initial window)
+RWND = 4 << 20    # receiver window in bytes, reported as snd_wnd
+CUBIC_C = 0.4     # CUBIC scaling constant (packets / s^3)
+BETA = {"reno": 0.5, "cubic": 0.7}
+INTERVAL_S = 1.0  # iperf3 reporting interval (-i 1)
+MANIFEST = "manifest.json"
+
+# Dumbbell.py options the model understands, with the Dumbbell.py defaults
+DEFAULTS = {
+    "n_left": 3,
+    "n_right": 3,
+    "access_bw": 100,
+    "access_delay": "1ms",
+    "bottleneck_bw": 20,
+    "bottleneck_delay": "10ms",
+    "bottleneck_queue": 200,
+    "duration": 60,
+    "parallel": 3,
+    "rate": "50M",
+}
+
+
+def flow_names(n_left: int, n_right: int, base_port: int = 5201) -> list:
+    """Flow names of scenario 1 (same mapping as Dumbbell.client_flows)."""
+    names = []
+    for i in range(1, n_left + 1):
+        server_idx = ((i - 1) % n_right) + 1
+        names.append(f"L{i}_to_R{server_idx}_p{base_port + server_idx - 1}")
+    return names
+
+
+def simulate(configs: list, cc: str = "cubic", dt: float = None, seed: int = 0) -> np.ndarray:
+    """
+    Simulates a batch of scenarios that share n_left, parallel and duration.
+    configs: dicts with the DEFAULTS keys.
+    Returns an array of shape (scenarios, intervals, fields, streams) in json_to_csv.STREAM_FIELDS
+    order, streams ordered flow by flow (parallel streams per flow).
+    """
+    first = configs[0]
+    for cfg in configs:
+        if (cfg["n_left"], cfg["parallel"], cfg["duration"]) != (first["n_left"], first["parallel"], first["duration"]):
+            raise ValueError("scenarios of one batch need the same n_left, parallel and duration")
+    n_streams = first["n_left"] * first["parallel"]
+    n_intervals = int(first["duration"] / INTERVAL_S)
+    beta = BETA[cc]
+    rng = np.random.default_rng(seed)
+
+    def column(key, convert=float):
+        return np.array([convert(cfg[key]) for cfg in configs], dtype=np.float64)[:, None]
+
+    capacity = column("bottleneck_bw") * 1e6 / 8                                       # bytes/s
+    base_rtt = 2 * (column("bottleneck_delay", seconds) + 2 * column("access_delay", seconds))
+    # zero delays would make every rtt with an empty queue 0; a packet takes at least its
+    # serialization time at the bottleneck
+    base_rtt = np.maximum(base_rtt, PACKET / capacity)
+    buffer = column("bottleneck_queue") * PACKET                                        # bytes
+    offered = column("rate", bits_per_second) / 8
+    cap = np.minimum(np.where(offered > 0, offered, np.inf), column("access_bw") * 1e6 / 8 / first["parallel"])
+    if dt is None:
+        # a few steps per RTT; the shortest RTT of the batch decides
+        dt = float(np.clip(base_rtt.min() / 4, 2.5e-4, 5e-3))
+    steps_per_interval = max(int(round(INTERVAL_S / dt)), 1)
+    dt = INTERVAL_S / steps_per_interval
+
+    shape = (len(configs), n_streams)
+    cwnd = np.full(shape, float(INIT_CWND * MSS))
+    ssthresh = np.full(shape, np.inf)
+    w_max = cwnd.copy()
+    epoch = np.zeros(shape)
+    recover_until = np.zeros(shape)
+    srtt = np.broadcast_to(base_rtt, shape).copy()
+    rttvar = srtt / 2
+    queue = np.zeros((len(configs), 1))
+    lost_total = np.zeros(shape)
+    out = np.empty((len(configs), n_intervals, len(json_to_csv.STREAM_FIELDS), n_streams))
+
+    t = 0.0
+    for interval in range(n_intervals):
+        sent = np.zeros(shape)
+        lost_start = np.floor(lost_total)
+        for _ in range(steps_per_interval):
+            rtt = base_rtt + queue / capacity
+            rate = np.minimum(cwnd / rtt, cap)
+            arrival = rate.sum(axis=1, keepdims=True)
+            queue = queue + (arrival - capacity) * dt
+            overflow = np.maximum(queue - buffer, 0.0)
+            queue = np.clip(queue, 0.0, buffer)
+            drops = overflow * rate / np.maximum(arrival, 1e-9)
+            sent += rate * dt - drops
+            lost_total += drops / MSS
+
+            # RFC 6298 estimators, one RTT sample per RTT
+            gain = dt / rtt
+            rttvar += gain / 4 * (np.abs(srtt - rtt) - rttvar)
+            srtt += gain / 8 * (rtt - srtt)
+
+            loss = (rng.random(shape) < drops / MSS) & (t >= recover_until)
+            acked = rate * dt
+            cwnd_limited = cwnd / rtt < cap
+            slow = cwnd < ssthresh
+            if cc == "reno":
+                increase = np.where(slow, acked, MSS * acked / cwnd)
+            else:
+                k = np.cbrt(w_max * (1 - beta) / (CUBIC_C * MSS))
+                target = CUBIC_C * MSS * (t - epoch - k) ** 3 + w_max
+                # TCP friendly region: never slower than Reno with the same beta
+                reno = w_max * beta + 3 * (1 - beta) / (1 + beta) * MSS * (t - epoch) / rtt
+                target = np.maximum(target, reno)
+                increase = np.where(slow, acked, np.maximum(target - cwnd, 0.01 * MSS) * gain)
+            cwnd = np.where(cwnd_limited, np.minimum(cwnd + increase, RWND), cwnd)
+
+            w_max = np.where(loss, cwnd, w_max)
+            cwnd = np.where(loss, np.maximum(cwnd * beta, 2.0 * MSS), cwnd)
+            ssthresh = np.where(loss, cwnd, ssthresh)
+            epoch = np.where(loss, t, epoch)
+            recover_until = np.where(loss, t + rtt, recover_until)
+            t += dt
+
+        fields = out[:, interval]
+        fields[:, 0] = sent * 8 / INTERVAL_S
+        fields[:, 1] = np.floor(lost_total) - lost_start
+        fields[:, 2] = np.round(cwnd)
+        fields[:, 3] = RWND
+        fields[:, 4] = np.round(rttvar * 1e6)
+        fields[:, 5] = np.round(srtt * 1e6)
+    return out
+
+
+def simulate_runs(configs: list, stats=json_to_csv.DEFAULT_STATS, cc: str = "cubic", dt: float = None,
+                  seed: int = 0) -> list:
+    """
+    Simulates any list of scenarios, batched by (n_left, parallel, duration).
+    Returns per scenario a list of (flow name, aggregated matrix) like json_to_csv.convert_log.
+    """
+    results = [None] * len(configs)
+    key = lambda i: (configs[i]["n_left"], configs[i]["parallel"], configs[i]["duration"])
+    for batch_index, (shape, indices) in enumerate(itertools.groupby(sorted(range(len(configs)), key=key), key=key)):
+        indices = list(indices)
+        n_left, parallel, duration = shape
+        values = simulate([configs[i] for i in indices], cc=cc, dt=dt, seed=seed + batch_index)
+        for row, i in enumerate(indices):
+            flows = flow_names(n_left, configs[i]["n_right"])
+            results[i] = [(flow, json_to_csv.aggregate(values[row, :, :, f * parallel:(f + 1) * parallel], stats))
+                          for f, flow in enumerate(flows)]
+    return results
+
+
+def expand_grid(spec: dict, base: dict) -> list:
+    """Points of a sweep.py style grid file ({"base": {...}, "grid": {...}}) on top of base."""
+    base = dict(base)
+    base.update({key.replace("-", "_"): value for key, value in spec.get("base", {}).items()})
+    grid = {key.replace("-", "_"): values for key, values in spec.get("grid", {}).items()}
+    for key in itertools.chain(base, grid):
+        if key not in DEFAULTS:
+            raise ValueError(f"Unknown option: {key}")
+    keys = list(grid)
+    return [dict(base, **dict(zip(keys, combo))) for combo in itertools.product(*(grid[key] for key in keys))]
+
+
+def write_runs(out_path: str, configs: list, results: list, stats, fmt: str, metadata: dict,
+               prefix: str = "fluid") -> str:
+    """Writes simulated runs (see simulate_runs) as a run,flow,interval keyed dataset."""
+    names = [f"{prefix}_{i:05d}" for i in range(len(configs))]
+    if fmt == "csv":
+        with open(out_path + ".tmp", "w", newline="") as file:
+            file.write(json_to_csv.KEY_HEADER + json_to_csv.csv_header(stats))
+            for run, flows in zip(names, results):
+                for flow, matrix in flows:
+                    for i, row in enumerate(matrix.tolist()):
+                        file.write(f"{run},{flow},{i}," + ",".join(map(str, row)) + "\n")
+        os.replace(out_path + ".tmp", out_path)
+        return out_path
+
+    parts = [(run, flow, matrix) for run, flows in zip(names, results) for flow, matrix in flows]
+    lengths = [len(matrix) for run, flow, matrix in parts]
+    data = {
+        "run": np.repeat(np.array([run for run, flow, matrix in parts], dtype=str), lengths),
+        "flow": np.repeat(np.array([flow for run, flow, matrix in parts], dtype=str), lengths),
+        "interval": np.concatenate([np.arange(n, dtype=np.int64) for n in lengths]),
+    }
+    matrix = np.concatenate([matrix for run, flow, matrix in parts])
+    for k, name in enumerate(json_to_csv.column_names(stats)):
+        data[name] = matrix[:, k]
+    meta = dict(metadata)
+    meta["runs"] = [{"run": run, "config": cfg} for run, cfg in zip(names, configs)]
+    return dataset_io.write_dataset(out_path, data, meta, fmt)
+
+
+def calibrate(root: str, base: dict, cc: str = "cubic", dt: float = None) -> dict:
+    """
+    Compares the model with every recorded client log below root.
+    Returns {column: median relative error of the per-flow means} and prints one line per flow.
+    """
+    logs = json_to_csv.find_client_logs(root)
+    if not logs:
+        raise FileNotFoundError(f"No iperf3 client logs found below {root}")
+    columns = json_to_csv.column_names()
+    runs = {}
+    for rel, run, flow in logs:
+        runs.setdefault(run, []).append((rel, flow))
+
+    errors = {name: [] for name in columns}
+    print("run,flow," + ",".join(f"{name}_measured,{name}_model" for name in columns))
+    for run, flows in runs.items():
+        cfg = dict(base)
+        manifest = os.path.join(root, run, MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest, "r") as file:
+                cfg.update({key: value for key, value in json.load(file).get("config", {}).items() if key in DEFAULTS})
+        measured = {}
+        for rel, flow in flows:
+            header = {}
+            measured[flow] = json_to_csv.convert_log(os.path.join(root, rel), header=header)
+            test = header.get("start", {}).get("test_start", {})
+            cfg["parallel"] = test.get("num_streams", cfg["parallel"])
+            cfg["duration"] = test.get("duration", cfg["duration"])
+        model = dict(simulate_runs([cfg], cc=cc, dt=dt)[0])
+        for flow, matrix in measured.items():
+            if flow not in model or not len(matrix):
+                continue
+            real = matrix.mean(axis=0)
+            sim = model[flow].mean(axis=0)
+            print(f"{run},{flow}," + ",".join(f"{a:.6g},{b:.6g}" for a, b in zip(real, sim)))
+            for name, a, b in zip(columns, real, sim):
+                if a:
+                    errors[name].append(abs(b - a) / abs(a))
+    return {name: float(np.median(values)) for name, values in errors.items() if values}
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Fluid model of the dumbbell bottleneck (no Mininet)")
+    for key, value in DEFAULTS.items():
+        p.add_argument("--" + key.replace("_", "-"), type=type(value), default=value)
+    p.add_argument("--cc", choices=sorted(BETA), default="cubic", help="congestion control of every stream")
+    p.add_argument("--dt", type=float, default=None, help="time step in seconds (default: a quarter of the shortest base RTT)")
+    p.add_argument("--grid", default=None, help="sweep.py style grid file, every option may vary")
+    p.add_argument("--replicates", type=int, default=1, help="simulations per point (different random drops)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--stats", type=json_to_csv.parse_stats, default=json_to_csv.DEFAULT_STATS,
+                   help="per-interval statistics over the streams, see json_to_csv.py")
+    p.add_argument("--out", default="fluid.csv", help="dataset file, format from the extension (csv/feather/parquet/npz)")
+    p.add_argument("--calibrate", default=None, metavar="DIR",
+                   help="compare the model with the iperf3 client logs below DIR instead of generating data")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    base = {key: getattr(args, key) for key in DEFAULTS}
+
+    if args.calibrate:
+        errors = calibrate(args.calibrate, base, cc=args.cc, dt=args.dt)
+        print("[+] Median relative error of the per-flow means:")
+        for name, error in errors.items():
+            print(f"    {name:12s} {100 * error:6.1f} %")
+        return
+
+    points = [base]
+    if args.grid:
+        with open(args.grid, "r") as file:
+            points = expand_grid(json.load(file), base)
+    configs = [point for point in points for _ in range(args.replicates)]
+
+    t0 = time.perf_counter()
+    results = simulate_runs(configs, stats=args.stats, cc=args.cc, dt=args.dt, seed=args.seed)
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    simulated = sum(cfg["duration"] for cfg in configs)
+    metadata = {"run_id": os.path.splitext(os.path.basename(args.out))[0], "model": "fluid", "cc": args.cc,
+                "stats": list(args.stats)}
+    out_path = write_runs(args.out, configs, results, args.stats, dataset_io.format_for_path(args.out), metadata)
+    print(f"[+] {len(configs)} runs ({simulated} s of traffic) in {elapsed:.2f} s "
+          f"({simulated / elapsed:.0f}x real time) -> {out_path}")
+
+
+if __name__ == "__main__":
+    main()
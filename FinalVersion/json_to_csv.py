@@ -1,40 +1,786 @@
 # load one client json file (L1<->R1)
-# average RTT values for all 5 streams -> output.txt
+# average RTT values over all streams -> output.txt
 # use other useful metrics for input.txt
 # convert that to csv
+#
+# The iperf3 log is parsed incrementally: only the interval that is currently
+# being decoded (plus one read chunk) is held in memory, and CSV rows are written
+# as soon as their interval has been parsed. Memory use therefore stays flat no
+# matter how long the run was.
+#
+# The mean of every metric uses the real amount of streams of the log (iperf3
+# -P) and is summed in one pass over the parsed stream dicts. More statistics
+# per interval (sum, min, max, p50, p99, ...) can be requested with --stats;
+# for those the stream metrics are extracted into (intervals x fields x streams)
+# NumPy arrays batch by batch and reduced with vectorized operations.
+#
+# With --root, every client log (iperf3_L{i}_to_R{j}_p{port}.json) below a
+# directory tree is converted on a process pool and merged into one dataset
+# keyed by run (directory relative to the root), flow and interval. Each log is
+# converted into its own part file inside a cache directory; logs whose mtime
+# and hash are unchanged since the last conversion are not parsed again. Parts
+# are merged in sorted path order, so the output does not depend on --jobs.
+#
+# Besides CSV, the dataset can be written as typed columnar files (Feather,
+# Parquet or npz, see dataset_io.py) carrying a metadata block with the run ID,
+# topology parameters (--meta) and the iperf3 test settings.
+#
+# --windows appends rolling-window features per flow (moving average throughput,
+# retransmit rate, cwnd trend; see features.py). They are computed incrementally
+# while the batches stream through, with the same code telemetry.py uses live.
+#
+# --queue appends the bottleneck queue occupancy (queue_sampler.py) of every
+# interval, for logs whose directory holds queue samples (NaN otherwise).
+#
+# --where KEY=VALUE (repeatable, see run_index.py) converts only the runs of the
+# run index (--index) that match every filter, e.g. all runs with
+# bottleneck_bw=20 and bottleneck_queue=200, like --root over their common parent.
+#
+# --archive reads the client logs of one run (--run, optionally one --flow and a
+# --window START:END in seconds) from a compressed log archive (log_archive.py);
+# only the chunks holding the requested intervals are decompressed.
 
+import argparse
+import concurrent.futures
+import hashlib
+import itertools
 import json
+import operator
+import os
+import re
+import time
+
+import numpy as np
+
+import dataset_io
+import features
+import log_archive
+import queue_sampler
+import run_index
 
 folder_name: str = 'scenario_dumbbell_folder'
 file_name: str = 'iperf3_L1_to_R1_p5201.json'
 
-out_data = []
-
-# read given json file and extract metrics / collected data
-with open(folder_name + '/' + file_name, 'r') as file:
-	content: list = json.load(file)['intervals']
-		
-	for x in content:
-		streams: list = x['streams']
-		# (re)set sums for in_data & out_data
-		rtt_sum = 0
-		throughput_sum = 0
-		retransmits_sum = 0
-		snd_cwnd_sum = 0
-		snd_wnd_sum = 0
-		rttvar_sum = 0
-		# calculate new RTT sum and add the average to out_data
+CHUNK_SIZE: int = 1 << 20 # characters read from the log per refill
+BATCH_SIZE: int = 4096 # intervals aggregated per vectorized batch
+KEY_HEADER: str = "run,flow,interval,"
+CACHE_DIR: str = '.json_to_csv_cache'
+STATE_FILE: str = 'state.json'
+STATE_VERSION: int = 2 # bumped whenever the part file layout changes
+
+# client logs only, server logs (iperf3_server_R{i}_p{port}.json) are skipped
+CLIENT_LOG_RE = re.compile(r'iperf3_(L\d+_to_R\d+_p\d+)\.json')
+
+# per-stream metrics read from every interval and the dataset columns they end up in
+STREAM_FIELDS: tuple = ('bits_per_second', 'retransmits', 'snd_cwnd', 'snd_wnd', 'rttvar', 'rtt')
+COLUMNS: tuple = ('throughput', 'retransmits', 'snd_cwnd', 'snd_wnd', 'rttvar', 'rtt')
+STATS: tuple = ('mean', 'sum', 'min', 'max', 'p50', 'p99')
+DEFAULT_STATS: tuple = ('mean',)
+
+_field_getters = tuple(map(operator.itemgetter, STREAM_FIELDS))
+_PERCENTILE_RE = re.compile(r'p\d+(\.\d+)?')
+_decoder = json.JSONDecoder()
+_WHITESPACE: str = ' \t\n\r'
+
+
+# Incremental reader over a JSON text file. Values are decoded one at a time
+# with JSONDecoder.raw_decode; the buffer only keeps the unparsed tail.
+class _Scanner:
+	def __init__(self, file, chunk_size=CHUNK_SIZE):
+		self.file = file
+		self.chunk_size = chunk_size
+		self.buf = ''
+		self.pos = 0
+		self.base = 0 # characters dropped from the buffer so far
+		self.eof = False
+
+	# Drop the consumed prefix of the buffer and append the next chunk.
+	# [Returns] False if the end of the file has been reached.
+	def _fill(self):
+		chunk = self.file.read(self.chunk_size)
+		self.buf = self.buf[self.pos:] + chunk
+		self.base += self.pos
+		self.pos = 0
+		if not chunk:
+			self.eof = True
+		return bool(chunk)
+
+	# [Returns] The next non-whitespace character without consuming it ('' at EOF).
+	def peek(self):
+		while True:
+			buf, pos = self.buf, self.pos
+			n = len(buf)
+			while pos < n and buf[pos] in _WHITESPACE:
+				pos += 1
+			self.pos = pos
+			if pos < n:
+				return buf[pos]
+			if not self._fill():
+				return ''
+
+	# [Returns] Position in the file (characters) of the next unconsumed character.
+	def offset(self):
+		return self.base + self.pos
+
+	# Consume the next non-whitespace character, which has to be one of chars.
+	# [Returns] The consumed character.
+	def take(self, chars):
+		c = self.peek()
+		if c == '' or c not in chars:
+			raise ValueError(f"Malformed iperf3 JSON: expected one of {chars!r}, got {c!r}")
+		self.pos += 1
+		return c
+
+	# Decode the next complete JSON value, reading more of the file if needed.
+	def value(self):
+		self.peek()
+		while True:
+			try:
+				obj, end = _decoder.raw_decode(self.buf, self.pos)
+			except json.JSONDecodeError:
+				if not self._fill():
+					raise
+				continue
+			# a number at the very end of the buffer may continue in the next chunk
+			if end == len(self.buf) and not self.eof and self._fill():
+				continue
+			self.pos = end
+			return obj
+
+
+# Yield the entries of the top-level 'intervals' array of an iperf3 --json log
+# one at a time, without loading the whole document.
+# [Param] path: Path of the iperf3 log.
+# [Param] header: Optional dict that receives all other top-level entries
+#                 ('start', 'end', ...) once they have been parsed.
+# [Param] offsets: Yield (start, end, interval) with the position of every
+#                  interval in the file instead (bytes, the file is read as latin-1).
+def iter_intervals(path, header=None, offsets=False):
+	with open(path, 'r', encoding='latin-1' if offsets else None) as file:
+		scanner = _Scanner(file)
+		scanner.take('{')
+		if scanner.peek() == '}':
+			return
+		while True:
+			key = scanner.value()
+			scanner.take(':')
+			if key == 'intervals':
+				scanner.take('[')
+				if scanner.peek() == ']':
+					scanner.pos += 1
+				else:
+					while True:
+						if offsets:
+							scanner.peek()
+							start = scanner.offset()
+							interval = scanner.value()
+							yield start, scanner.offset(), interval
+						else:
+							yield scanner.value()
+						if scanner.take(',]') == ']':
+							break
+			else:
+				value = scanner.value()
+				if header is not None:
+					header[key] = value
+			if scanner.take(',}') == '}':
+				return
+
+
+# Group parsed intervals into batches of their 'streams' lists.
+# A batch is flushed early if the amount of streams changes between intervals;
+# intervals without streams are skipped.
+# [Param] intervals: Iterable of iperf3 interval dicts (from a log or from --json-stream).
+# [Param] times: Optional list that receives the (start, end) seconds of every
+#                batched interval, in the order of the rows.
+# [Returns] Tuples of (list of 'streams' lists, amount of streams).
+def _stream_batches(intervals, batch_size=BATCH_SIZE, times=None):
+	batch = []
+	n_streams = 0
+	for interval in intervals:
+		streams: list = interval['streams']
+		if not streams:
+			continue
+		if batch and len(streams) != n_streams:
+			yield batch, n_streams
+			batch = []
+		n_streams = len(streams)
+		batch.append(streams)
+		if times is not None:
+			span = interval.get('sum', streams[0])
+			times.append((span['start'], span['end']))
+		if len(batch) == batch_size:
+			yield batch, n_streams
+			batch = []
+	if batch:
+		yield batch, n_streams
+
+
+# Extract the metrics of a batch of intervals into one array.
+# [Returns] Array of shape (intervals, fields, streams).
+def _batch_array(batch, n_streams):
+	flat = list(itertools.chain.from_iterable(batch))
+	n = len(flat)
+	# one pass per field over the flat list is the cheapest way from dicts to floats
+	values = np.empty((len(STREAM_FIELDS), n))
+	for k, getter in enumerate(_field_getters):
+		values[k] = np.fromiter(map(getter, flat), dtype=np.float64, count=n)
+	# fields x streams per interval, contiguous along the streams for the reductions
+	return np.ascontiguousarray(values.reshape(len(STREAM_FIELDS), len(batch), n_streams).transpose(1, 0, 2))
+
+
+# Average the metrics of a batch of intervals straight from the stream dicts
+# (the original per-stream loop, still the cheapest way through the dicts).
+# [Returns] Array of shape (intervals, fields), like aggregate(values, ('mean',)).
+def _batch_means(batch, n_streams):
+	rows = []
+	append = rows.append
+	for streams in batch:
+		throughput_sum = retransmits_sum = snd_cwnd_sum = snd_wnd_sum = rttvar_sum = rtt_sum = 0
 		for flow in streams:
+			throughput_sum += flow['bits_per_second']
+			retransmits_sum += flow['retransmits']
+			snd_cwnd_sum += flow['snd_cwnd']
+			snd_wnd_sum += flow['snd_wnd']
+			rttvar_sum += flow['rttvar']
+			rtt_sum += flow['rtt']
+		append((throughput_sum, retransmits_sum, snd_cwnd_sum, snd_wnd_sum, rttvar_sum, rtt_sum))
+	return np.array(rows, dtype=np.float64) / n_streams
+
+
+# Group parsed intervals into batches and yield their per-stream metrics,
+# see _stream_batches.
+# [Returns] Arrays of shape (intervals, fields, streams), see STREAM_FIELDS.
+def batch_intervals(intervals, batch_size=BATCH_SIZE, times=None):
+	for batch, n_streams in _stream_batches(intervals, batch_size, times):
+		yield _batch_array(batch, n_streams)
+
+
+# Group parsed intervals into batches and yield the mean of every metric over
+# the streams, see _stream_batches. One pass over the stream dicts, no
+# per-stream array is built.
+# [Returns] Arrays of shape (intervals, fields).
+def batch_means(intervals, batch_size=BATCH_SIZE, times=None):
+	for batch, n_streams in _stream_batches(intervals, batch_size, times):
+		yield _batch_means(batch, n_streams)
+
+
+# Yield the per-stream metrics of an iperf3 client log in batches of intervals.
+def iter_batches(json_path, batch_size=BATCH_SIZE, header=None, times=None):
+	return batch_intervals(iter_intervals(json_path, header), batch_size, times)
+
+
+# Check a list of statistics names (see STATS; any 'p<q>' with 0 <= q <= 100 is accepted).
+def parse_stats(text):
+	stats = tuple(stat.strip() for stat in text.split(',') if stat.strip())
+	for stat in stats:
+		if stat in STATS[:4]:
+			continue
+		if _PERCENTILE_RE.fullmatch(stat) and 0 <= float(stat[1:]) <= 100:
+			continue
+		raise ValueError(f"Unknown statistic: {stat}")
+	if not stats:
+		raise ValueError("At least one statistic is needed")
+	return stats
+
+
+# Column names produced by aggregate(). 'mean' keeps the plain metric names
+# (the layout of the original data.csv), every other statistic is appended as a suffix.
+# The rolling-window features of aggregate_batches() and the queue columns of
+# iter_log_rows() follow them.
+def column_names(stats=DEFAULT_STATS, windows=(), queue=False):
+	names = [col if stat == 'mean' else f"{col}_{stat}" for stat in stats for col in COLUMNS]
+	return names + features.feature_names(windows) + (list(queue_sampler.QUEUE_COLUMNS) if queue else [])
+
+
+def csv_header(stats=DEFAULT_STATS, windows=(), queue=False):
+	return ','.join(column_names(stats, windows, queue)) + '\n'
+
+
+# Compute the per-interval statistics over all streams with vectorized reductions.
+# [Param] values: Array of shape (intervals, fields, streams), see iter_batches.
+# [Returns] Array of shape (intervals, len(stats) * fields), ordered like column_names(stats).
+def aggregate(values, stats=DEFAULT_STATS):
+	n_streams = values.shape[2]
+	# one sort per batch serves min, max and every percentile
+	ordered = values if set(stats) <= {'mean', 'sum'} else np.sort(values, axis=2)
+	sums = ordered.sum(axis=2)
+	out = []
+	for stat in stats:
+		if stat == 'mean':
+			out.append(sums / n_streams)
+		elif stat == 'sum':
+			out.append(sums)
+		elif stat == 'min':
+			out.append(ordered[:, :, 0])
+		elif stat == 'max':
+			out.append(ordered[:, :, -1])
+		else:
+			# linear interpolation between the closest ranks (numpy's default method)
+			rank = float(stat[1:]) / 100 * (n_streams - 1)
+			lo = int(rank)
+			hi = min(lo + 1, n_streams - 1)
+			frac = rank - lo
+			out.append(ordered[:, :, lo] + (ordered[:, :, hi] - ordered[:, :, lo]) * frac)
+	return np.concatenate(out, axis=1)
+
+
+# Aggregate the batches of one flow and append its rolling-window features.
+# [Param] windows: Window lengths in intervals, see features.py (empty: no features).
+# [Returns] Arrays of shape (intervals, columns), see column_names(stats, windows).
+def aggregate_batches(batches, stats=DEFAULT_STATS, windows=()):
+	return _with_features((aggregate(values, stats) for values in batches), stats, windows)
+
+
+# Aggregate the parsed intervals of one flow and append its rolling-window features.
+# The default mean is summed in one pass over the stream dicts (batch_means);
+# the (intervals x fields x streams) arrays are only built for other statistics.
+# [Returns] Arrays of shape (intervals, columns), see column_names(stats, windows).
+def aggregate_intervals(intervals, stats=DEFAULT_STATS, windows=(), batch_size=BATCH_SIZE, times=None):
+	if tuple(stats) == ('mean',):
+		matrices = batch_means(intervals, batch_size, times)
+	else:
+		matrices = (aggregate(values, stats) for values in batch_intervals(intervals, batch_size, times))
+	return _with_features(matrices, stats, windows)
+
+
+def _with_features(matrices, stats, windows):
+	rolling = features.RollingFeatures(column_names(stats), windows) if windows else None
+	for matrix in matrices:
+		if rolling is not None:
+			matrix = np.hstack([matrix, rolling.transform(matrix)])
+		yield matrix
+
+
+# Format the rows of an aggregated matrix as CSV lines.
+# [Param] prefix: Text prepended to every row (e.g. the run/flow key columns); if
+#                 given, the interval index (counted from start) follows it.
+def _csv_lines(matrix, prefix='', start=0):
+	for i, row in enumerate(matrix.tolist(), start):
+		line = ','.join(map(str, row)) + '\n'
+		yield f"{prefix}{i},{line}" if prefix else line
+
+
+# Yield the rows of an iperf3 client log batch by batch, see column_names(stats, windows, queue).
+# [Param] queue: Append the queue columns aligned from the queue samples next to the log.
+def iter_log_rows(json_path, stats=DEFAULT_STATS, header=None, windows=(), queue=False):
+	header = {} if header is None else header
+	times = [] if queue else None
+	aligner = None
+	for matrix in aggregate_intervals(iter_intervals(json_path, header), stats, windows, times=times):
+		if queue:
+			# 'start' precedes 'intervals' in the log, so the header is complete here
+			if aligner is None:
+				aligner = queue_sampler.Aligner.for_log(json_path, header) or False
+			if aligner:
+				extra = aligner.columns(times[:len(matrix)])
+			else:
+				extra = np.full((len(matrix), len(queue_sampler.QUEUE_COLUMNS)), np.nan)
+			del times[:len(matrix)]
+			matrix = np.hstack([matrix, extra])
+		yield matrix
+
+
+# Write one CSV row per interval of an iperf3 client log.
+# [Returns] Amount of rows written.
+def write_rows(json_path, csv_out_file, prefix='', stats=DEFAULT_STATS, windows=(), queue=False):
+	rows = 0
+	for matrix in iter_log_rows(json_path, stats, windows=windows, queue=queue):
+		csv_out_file.writelines(_csv_lines(matrix, prefix, rows))
+		rows += len(matrix)
+	return rows
+
+
+# Aggregate a whole iperf3 client log into one matrix.
+# [Param] header: Optional dict that receives the other top-level entries of the log.
+# [Returns] Array of shape (intervals, columns), see column_names(stats, windows, queue).
+def convert_log(json_path, stats=DEFAULT_STATS, header=None, windows=(), queue=False):
+	blocks = list(iter_log_rows(json_path, stats, header, windows, queue))
+	if not blocks:
+		return np.empty((0, len(column_names(stats, windows, queue))))
+	return np.concatenate(blocks)
+
+
+# Settings of an iperf3 test as found in the 'start' block of its log (for the dataset metadata).
+def iperf3_info(header):
+	start = header.get('start', {})
+	return {
+		'version': start.get('version'),
+		'timesecs': start.get('timestamp', {}).get('timesecs'),
+		'test_start': start.get('test_start'),
+	}
+
+
+# Convert one iperf3 client log to a dataset file. CSV rows are written batch
+# by batch as the log is parsed; binary formats are written in one go.
+# [Param] metadata: Dict stored in the metadata block of binary formats.
+# [Returns] Tuple containing (1) the amount of rows written, (2) the size of the log in bytes and (3) the path written.
+def convert_file(json_path, out_path, stats=DEFAULT_STATS, fmt='csv', metadata=None, windows=(), queue=False):
+	if fmt == 'csv':
+		with open(out_path, 'w', newline='') as csv_out_file:
+			csv_out_file.write(csv_header(stats, windows, queue))
+			rows = write_rows(json_path, csv_out_file, stats=stats, windows=windows, queue=queue)
+		return rows, os.path.getsize(json_path), out_path
+
+	header = {}
+	matrix = convert_log(json_path, stats, header, windows, queue)
+	columns = {name: matrix[:, k] for k, name in enumerate(column_names(stats, windows, queue))}
+	meta = dict(metadata or {})
+	meta['iperf3'] = iperf3_info(header)
+	out_path = dataset_io.write_dataset(out_path, columns, meta, fmt)
+	return len(matrix), os.path.getsize(json_path), out_path
+
+
+# Compare the default conversion (mean) and the vectorized statistics with the
+# original per-stream Python loop on synthetic, already parsed intervals (JSON
+# decoding is the same for all of them and excluded).
+def benchmark(n_intervals=100_000, n_streams=64, stats=STATS):
+	rng = np.random.default_rng(0)
+	# a few distinct stream lists, shared between intervals to keep memory small
+	pool = [[dict(zip(STREAM_FIELDS, map(float, rng.integers(1, 10**6, len(STREAM_FIELDS)))))
+			 for _ in range(n_streams)] for _ in range(16)]
+	intervals = [{'streams': pool[i % len(pool)]} for i in range(n_intervals)]
+
+	t0 = time.perf_counter()
+	for x in intervals:
+		rtt_sum = throughput_sum = retransmits_sum = snd_cwnd_sum = snd_wnd_sum = rttvar_sum = 0
+		for flow in x['streams']:
 			rtt_sum += flow['rtt']
 			throughput_sum += flow['bits_per_second']
 			retransmits_sum += flow['retransmits']
 			snd_cwnd_sum += flow['snd_cwnd']
 			snd_wnd_sum += flow['snd_wnd']
 			rttvar_sum += flow['rttvar']
-		out_data.append([throughput_sum / 5, retransmits_sum / 5, snd_cwnd_sum / 5, snd_wnd_sum / 5, rttvar_sum / 5, rtt_sum / 5])
+		[throughput_sum / n_streams, retransmits_sum / n_streams, snd_cwnd_sum / n_streams,
+		 snd_wnd_sum / n_streams, rttvar_sum / n_streams, rtt_sum / n_streams]
+	t_loop = time.perf_counter() - t0
+
+	t0 = time.perf_counter()
+	for _ in aggregate_intervals(intervals):
+		pass
+	t_mean = time.perf_counter() - t0
+
+	t0 = time.perf_counter()
+	batches = list(batch_intervals(intervals))
+	t_extract = time.perf_counter() - t0
+
+	t0 = time.perf_counter()
+	for values in batches:
+		aggregate(values, stats)
+	t_stats = time.perf_counter() - t0
+
+	speedup = t_loop / max(t_mean, 1e-9)
+	print(f"[+] {n_intervals} intervals x {n_streams} streams")
+	print(f"    per-stream loop (mean):       {t_loop:.3f} s")
+	print(f"    one-pass mean (default):      {t_mean:.3f} s ({speedup:.2f}x the loop)")
+	print(f"    columnar extraction:          {t_extract:.3f} s")
+	print(f"    vectorized {','.join(stats)}: {t_stats:.3f} s (with extraction {t_extract + t_stats:.3f} s)")
+	if speedup < 10:
+		print("[!] The 10x target is missed: every stream metric is one lookup in a parsed dict, "
+			  "which bounds the mean as much as it bounded the loop.")
+
+
+# Find all iperf3 client logs below root.
+# [Returns] Sorted list of (relative path, run, flow) tuples.
+def find_client_logs(root):
+	logs = []
+	for dirpath, dirnames, filenames in os.walk(root):
+		dirnames[:] = [d for d in dirnames if d != CACHE_DIR]
+		for name in filenames:
+			m = CLIENT_LOG_RE.fullmatch(name)
+			if m is None:
+				continue
+			rel = os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/')
+			run = os.path.dirname(rel) or '.'
+			logs.append((rel, run, m.group(1)))
+	logs.sort()
+	return logs
+
+
+def _sha256(path):
+	h = hashlib.sha256()
+	with open(path, 'rb') as file:
+		for block in iter(lambda: file.read(CHUNK_SIZE), b''):
+			h.update(block)
+	return h.hexdigest()
+
+
+# Quote a key column if needed (run names are directory names and may contain commas).
+def _csv_field(text):
+	if any(c in text for c in ',"\n'):
+		return '"' + text.replace('"', '""') + '"'
+	return text
+
+
+# Worker: aggregate one client log into its part file (.npy) unless its content is unchanged.
+# [Param] job: Tuple of (root, cache dir, relative path, previous state entry or None, stats, windows, queue).
+# [Returns] Tuple of (relative path, new state entry, converted?).
+def _convert_part(job):
+	root, cache, rel, prev, stats, windows, queue = job
+	path = os.path.join(root, rel)
+	st = os.stat(path)
+	digest = _sha256(path)
+	part = hashlib.sha256(rel.encode()).hexdigest()[:32] + '.npy'
+	entry = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'sha256': digest, 'part': part}
+	if prev is not None and prev['sha256'] == digest and os.path.exists(os.path.join(cache, part)):
+		entry['rows'] = prev['rows']
+		entry['iperf3'] = prev['iperf3']
+		return rel, entry, False
+	header = {}
+	matrix = convert_log(path, stats, header, windows, queue)
+	tmp_path = os.path.join(cache, part + '.tmp')
+	with open(tmp_path, 'wb') as part_file:
+		np.save(part_file, matrix)
+	os.replace(tmp_path, os.path.join(cache, part))
+	entry['rows'] = len(matrix)
+	entry['iperf3'] = iperf3_info(header)
+	return rel, entry, True
+
+
+# Write converted logs as one dataset keyed by run, flow and interval.
+# [Param] parts: List of (run, flow, number of the first interval, matrix) tuples, in output order.
+# [Param] metadata: Dict stored in the metadata block of binary formats.
+# [Returns] The path written.
+def write_parts(parts, out_path, columns, fmt='csv', metadata=None):
+	if fmt == 'csv':
+		tmp_path = out_path + '.tmp'
+		with open(tmp_path, 'w', newline='') as csv_out_file:
+			csv_out_file.write(KEY_HEADER + ','.join(columns) + '\n')
+			for run, flow, first, matrix in parts:
+				prefix = f"{_csv_field(run)},{flow},"
+				for i in range(0, len(matrix), BATCH_SIZE):
+					csv_out_file.writelines(_csv_lines(matrix[i:i + BATCH_SIZE], prefix, first + i))
+		os.replace(tmp_path, out_path)
+		return out_path
+	lengths = [len(matrix) for run, flow, first, matrix in parts]
+	data = {
+		'run': np.repeat(np.array([run for run, flow, first, matrix in parts], dtype=str), lengths),
+		'flow': np.repeat(np.array([flow for run, flow, first, matrix in parts], dtype=str), lengths),
+		'interval': np.concatenate([first + np.arange(n, dtype=np.int64)
+									for (run, flow, first, matrix), n in zip(parts, lengths)]),
+	}
+	matrix = np.concatenate([matrix for run, flow, first, matrix in parts])
+	for k, name in enumerate(columns):
+		data[name] = matrix[:, k]
+	return dataset_io.write_dataset(out_path, data, metadata, fmt)
+
+
+# Convert every client log below root and merge them into one dataset.
+# [Param] jobs: Amount of worker processes (default: one per core).
+# [Param] metadata: Dict stored in the metadata block of binary formats.
+# [Param] runs: Run directories relative to root to convert (default: all below root).
+# [Returns] Tuple containing (1) the amount of logs converted, (2) the amount skipped, (3) the bytes of log parsed and (4) the path written.
+def convert_tree(root, out_path, jobs=None, stats=DEFAULT_STATS, fmt='csv', metadata=None, windows=(),
+				 queue=False, runs=None):
+	cache = os.path.join(root, CACHE_DIR)
+	os.makedirs(cache, exist_ok=True)
+	state_path = os.path.join(cache, STATE_FILE)
+	columns = column_names(stats, windows, queue)
+	state = {}
+	if os.path.exists(state_path):
+		with open(state_path, 'r') as file:
+			saved = json.load(file)
+		# parts written with other columns can not be reused
+		if saved.get('columns') == columns and saved.get('version') == STATE_VERSION:
+			state = saved['logs']
+
+	all_logs = find_client_logs(root)
+	logs = all_logs
+	if runs is not None:
+		runs = {os.path.normpath(run).replace(os.sep, '/') for run in runs}
+		logs = [log for log in all_logs if log[1] in runs]
+	if not logs:
+		raise FileNotFoundError(f"No iperf3 client logs found below {root}")
+	new_state = {}
+	todo = []
+	for rel, run, flow in logs:
+		prev = state.get(rel)
+		st = os.stat(os.path.join(root, rel))
+		# cheap check first: unchanged mtime and size means the log has not been touched
+		if prev is not None and prev['mtime_ns'] == st.st_mtime_ns and prev['size'] == st.st_size \
+				and os.path.exists(os.path.join(cache, prev['part'])):
+			new_state[rel] = prev
+		else:
+			todo.append((root, cache, rel, prev, stats, windows, queue))
+
+	converted = 0
+	parsed_bytes = 0
+	jobs = jobs or os.cpu_count() or 1
+	if jobs > 1 and len(todo) > 1:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+			results = list(pool.map(_convert_part, todo))
+	else:
+		results = [_convert_part(job) for job in todo]
+	for rel, entry, did_convert in results:
+		new_state[rel] = entry
+		if did_convert:
+			converted += 1
+			parsed_bytes += entry['size']
+
+	# remove parts of logs that no longer exist, keep those of runs not selected this time
+	existing = {rel for rel, run, flow in all_logs}
+	for rel, entry in state.items():
+		if rel in new_state:
+			continue
+		if rel in existing:
+			new_state[rel] = entry
+		elif os.path.exists(os.path.join(cache, entry['part'])):
+			os.remove(os.path.join(cache, entry['part']))
+
+	# merge in sorted path order -> identical output for any worker count
+	parts = [(run, flow, 0, np.load(os.path.join(cache, new_state[rel]['part']), mmap_mode='r'))
+			 for rel, run, flow in logs]
+	meta = dict(metadata or {})
+	meta['logs'] = [{'path': rel, 'run': run, 'flow': flow, 'iperf3': new_state[rel]['iperf3']}
+					for rel, run, flow in logs]
+	out_path = write_parts(parts, out_path, columns, fmt, meta)
+
+	with open(state_path + '.tmp', 'w') as file:
+		json.dump({'version': STATE_VERSION, 'columns': columns, 'logs': new_state}, file, indent=1, sort_keys=True)
+	os.replace(state_path + '.tmp', state_path)
+	return converted, len(logs) - converted, parsed_bytes, out_path
+
+
+# Yield the intervals of (interval number, interval) pairs; the first number is appended to first.
+def _numbered(pairs, first):
+	for k, interval in pairs:
+		if not first:
+			first.append(k)
+		yield interval
+
+
+# Convert archived client logs of one run (log_archive.py), optionally one flow and a time window only.
+# [Param] window: Optional (start, end) seconds since the test start, either may be None.
+# [Returns] Tuple containing (1) the amount of rows written, (2) the amount of logs read and (3) the path written.
+def convert_archive(archive_path, run, out_path, flow=None, window=None, stats=DEFAULT_STATS, fmt='csv',
+					metadata=None, windows=()):
+	start, end = window or (None, None)
+	parts = []
+	logs = []
+	with log_archive.LogArchive(archive_path) as archive:
+		members = archive.client_logs(run, flow)
+		if not members:
+			raise FileNotFoundError(f"No archived iperf3 client logs of run {run!r}" + (f", flow {flow}" if flow else ""))
+		for name, member_flow in members:
+			header = {}
+			first = []
+			pairs = archive.iter_intervals(run, name, start, end, header)
+			blocks = list(aggregate_intervals(_numbered(pairs, first), stats, windows))
+			matrix = np.concatenate(blocks) if blocks else np.empty((0, len(column_names(stats, windows))))
+			parts.append((run, member_flow, first[0] if first else 0, matrix))
+			logs.append({'path': f"{run}/{name}", 'run': run, 'flow': member_flow, 'iperf3': iperf3_info(header)})
+	meta = dict(metadata or {})
+	meta['logs'] = logs
+	meta['window'] = [start, end]
+	out_path = write_parts(parts, out_path, column_names(stats, windows), fmt, meta)
+	return sum(len(matrix) for run, member_flow, first, matrix in parts), len(parts), out_path
+
+
+# Parse a START:END window in seconds, either side may be empty.
+def parse_window(text):
+	start, sep, end = text.partition(':')
+	if not sep:
+		raise argparse.ArgumentTypeError(f"expected START:END, got {text!r}")
+	return (float(start) if start else None), (float(end) if end else None)
+
+
+# Parse a KEY=VALUE metadata option; values are read as JSON if possible (numbers, lists, ...).
+def parse_meta(text):
+	key, sep, value = text.partition('=')
+	if not sep or not key:
+		raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {text!r}")
+	try:
+		return key, json.loads(value)
+	except ValueError:
+		return key, value
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Convert iperf3 --json client logs to a training dataset")
+	parser.add_argument("--folder", default=folder_name, help="Folder containing the iperf3 logs.")
+	parser.add_argument("--file", default=file_name, help="iperf3 client log to convert.")
+	parser.add_argument("--out", default=None, help="Output file (default: <folder>/data.<format>, or <root>/dataset.<format> with --root).")
+	parser.add_argument("--root", default=None, help="Convert every iperf3 client log below this directory into one dataset.")
+	parser.add_argument("--where", type=run_index.parse_filter, action='append', default=[], metavar="KEY=VALUE",
+						help="Convert only the runs of the run index matching this filter (ops = != < <= > >=). Repeatable.")
+	parser.add_argument("--index", default=run_index.INDEX, help="Run index for --where (see run_index.py).")
+	parser.add_argument("--archive", default=None, help="Read the client logs of --run from this log archive (see log_archive.py).")
+	parser.add_argument("--run", default='.', help="With --archive: run to convert (directory relative to the archived root).")
+	parser.add_argument("--flow", default=None, help="With --archive: only this flow, e.g. L1_to_R1_p5201.")
+	parser.add_argument("--window", type=parse_window, default=None, metavar="START:END",
+						help="With --archive: only the intervals within this time window (seconds since the test start).")
+	parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes for --root (default: one per core).")
+	parser.add_argument("--stats", type=parse_stats, default=DEFAULT_STATS,
+						help="Comma separated per-interval statistics over the streams: mean, sum, min, max, p<q> (default: mean). "
+							 "Note that the rtt_* columns of other statistics are derived from the rtt label.")
+	parser.add_argument("--windows", type=features.parse_windows, default=(),
+						help="Comma separated window lengths (intervals) of rolling features per flow, e.g. 5,20 "
+							 "(default: none). Needs the mean statistic.")
+	parser.add_argument("--queue", default=False, action='store_true',
+						help="Append the bottleneck queue occupancy per interval (queue_sampler.py samples next to the logs).")
+	parser.add_argument("-f", "--format", choices=dataset_io.FORMATS, default=None,
+						help="Output format (default: from the --out extension, else csv). "
+							 "feather/parquet need pyarrow and fall back to npz without it.")
+	parser.add_argument("--run-id", default=None, help="Run ID stored in the metadata block (default: folder/root name).")
+	parser.add_argument("--meta", type=parse_meta, action='append', default=[], metavar="KEY=VALUE",
+						help="Topology parameter stored in the metadata block, e.g. --meta bottleneck_bw=20. Repeatable.")
+	parser.add_argument("--bench", default=False, action='store_true',
+						help="Benchmark the vectorized aggregation against the per-stream loop and exit.")
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	if args.bench:
+		benchmark()
+		return
+	fmt = args.format or (dataset_io.format_for_path(args.out) if args.out else 'csv')
+	runs = None
+	if args.where:
+		try:
+			root, runs = run_index.query_tree(args.index, args.where)
+		except LookupError as e:
+			raise SystemExit(str(e))
+		args.root = args.root or root
+		runs = [os.path.relpath(os.path.join(root, run), args.root) for run in runs]
+	folder = args.root if args.root is not None else args.folder
+	metadata = {
+		'run_id': args.run_id or os.path.basename(os.path.abspath(folder)),
+		'topology': dict(args.meta),
+		'stats': list(args.stats),
+		'windows': list(args.windows),
+		'queue': args.queue,
+	}
+	if args.where:
+		metadata['query'] = [key + op + value for key, op, value in args.where]
+
+	t0 = time.perf_counter()
+	if args.archive is not None:
+		if args.queue:
+			raise SystemExit("--queue needs the queue samples next to the logs, they are not archived")
+		metadata['run_id'] = args.run_id or args.run
+		out_path = args.out or 'dataset.' + fmt
+		rows, count, out_path = convert_archive(args.archive, args.run, out_path, args.flow, args.window, args.stats,
+												fmt, metadata, args.windows)
+		print(f"[+] {rows} intervals of {count} archived logs -> {out_path} ({time.perf_counter() - t0:.2f} s)")
+		return
+	if args.root is not None:
+		out_path = args.out or os.path.join(args.root, 'dataset.' + fmt)
+		converted, skipped, size, out_path = convert_tree(args.root, out_path, jobs=args.jobs, stats=args.stats,
+														  fmt=fmt, metadata=metadata, windows=args.windows,
+														  queue=args.queue, runs=runs)
+		elapsed = max(time.perf_counter() - t0, 1e-9)
+		print(f"[+] {converted} logs converted, {skipped} unchanged -> {out_path} "
+			  f"({size / 1e6:.1f} MB of log at {size / 1e6 / elapsed:.1f} MB/s)")
+		return
+
+	json_path = os.path.join(args.folder, args.file)
+	out_path = args.out or os.path.join(args.folder, 'data.' + fmt)
+	rows, size, out_path = convert_file(json_path, out_path, stats=args.stats, fmt=fmt, metadata=metadata,
+										 windows=args.windows, queue=args.queue)
+	elapsed = max(time.perf_counter() - t0, 1e-9)
+	print(f"[+] {rows} intervals -> {out_path} ({size / 1e6:.1f} MB of log at {size / 1e6 / elapsed:.1f} MB/s)")
 
 
-with open(folder_name + '/data.csv', 'w', newline='') as csv_out_file:
-	csv_out_file.write("throughput,retransmits,snd_cwnd,snd_wnd,rttvar,rtt\n")
-	for tup in out_data:
-		csv_out_file.write(f"{tup[0]},{tup[1]},{tup[2]},{tup[3]},{tup[4]},{tup[5]}\n")
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,281 @@
+#! /usr/bin/env python3
+"""
+Replay of time-varying link conditions onto a running dumbbell.
+
+A trace lists bandwidth, delay, loss and queue size over time; LinkReplay
+applies every step to the TCLink interfaces of the replayed links (by default
+both ends of s1 -- s2) at its time offset from the client start, at any
+(sub-second) granularity. Changes go through one long-lived `tc -force -batch -`
+process per network namespace instead of one tc fork per change:
+- bw:    `tc class change ... classid 5:1 htb rate`,
+- delay, loss, queue: `tc qdisc change ... handle 10: netem` (netem resets
+  what a change leaves out, so every change carries all three).
+This is the qdisc layout TCIntf builds with use_htb (see Dumbbell.link_params).
+
+After the commands of a step, a fence (`qdisc show dev lo`) is written and
+its output awaited; tc executes a batch in order and every change is
+acknowledged by the kernel, so the fence marks the point where the step is in
+effect. The skew between the trace time and that point is recorded per step
+and summarized (mean, p50, p99, max); the steps are written to link_replay.csv
+next to the iperf3 logs.
+
+Trace file, CSV or JSON; t in seconds since the client start, bw in Mbit/s,
+delay as tc delay ("10ms") or ms, loss in percent, queue in packets. Empty
+or missing values keep the previous value:
+    t,bw,delay,loss,queue
+    0,20,10ms,0,200
+    0.5,12,,0.5,
+    1.25,30,25ms,,100
+or [{"t": 0, "bw": 20, "delay": "10ms"}, {"t": 0.5, "bw": 12}, ...]
+
+Usage: Dumbbell.py --link-trace trace.csv, or to check a trace and print the
+tc batch it produces for an interface:
+    python3 link_replay.py trace.csv --dev s1-eth1
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from units import seconds
+
+
+TRACE_COLUMNS = ("bw", "delay", "loss", "queue")
+REPORT = "link_replay.csv"
+FENCE = "qdisc show dev lo"
+_PARAM = {"bw": "bw", "delay": "delay", "loss": "loss", "queue": "max_queue_size"}
+
+
+def _value(key: str, value):
+    if key == "delay":
+        # tc delay string, numbers are ms like everywhere else
+        return f"{value}ms" if isinstance(value, (int, float)) else str(value).strip()
+    if key == "queue":
+        return int(float(value))
+    return float(value)
+
+
+def load_trace(path: str) -> list:
+    """(t, {column: value}) steps of a trace file, sorted by t."""
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, "r") as file:
+            rows = json.load(file)
+        if isinstance(rows, dict):
+            rows = rows["steps"]
+    else:
+        with open(path, "r", newline="") as file:
+            rows = list(csv.DictReader(file))
+    steps = []
+    for row in rows:
+        values = {key: _value(key, row[key]) for key in TRACE_COLUMNS if row.get(key) not in (None, "")}
+        unknown = set(row) - set(TRACE_COLUMNS) - {"t"}
+        if unknown:
+            raise ValueError(f"Unknown trace columns: {sorted(unknown)}")
+        if "delay" in values:
+            seconds(values["delay"])  # validates the delay
+        steps.append((float(row["t"]), values))
+    steps.sort(key=lambda step: step[0])
+    if not steps:
+        raise ValueError(f"Empty trace: {path}")
+    return steps
+
+
+def link_state(intf) -> dict:
+    """Current bw / delay / loss / queue of a TCLink interface (its params)."""
+    params = intf.params
+    if params.get("bw") is None or params.get("delay") is None:
+        raise ValueError(f"{intf.name} is not shaped with bw and delay, nothing to replay onto")
+    return {key: params.get(param) for key, param in _PARAM.items()}
+
+
+def tc_commands(dev: str, old: dict, new: dict) -> list:
+    """tc batch lines taking an interface from state old to state new."""
+    lines = []
+    if new["bw"] != old["bw"]:
+        lines.append(f"class change dev {dev} parent 5:0 classid 5:1 htb rate {new['bw']:f}Mbit burst 15k")
+    if any(new[key] != old[key] for key in ("delay", "loss", "queue")):
+        netem = f"delay {new['delay']}"
+        if new["loss"]:
+            netem += f" loss {new['loss']:.5f}%"
+        if new["queue"] is not None:
+            netem += f" limit {new['queue']}"
+        lines.append(f"qdisc change dev {dev} parent 5:1 handle 10: netem {netem}")
+    return lines
+
+
+class TcBatch:
+    """A long-lived `tc -batch` process, in a host's network namespace if pid is given."""
+
+    def __init__(self, pid: int = None):
+        # stdbuf: the fence output has to come through the pipe right away
+        argv = ["stdbuf", "-oL", "tc", "-force", "-batch", "-"]
+        if pid is not None:
+            argv = ["mnexec", "-a", str(pid)] + argv
+        self.proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     text=True, bufsize=1)
+        self.errors = []
+        self._messages = []
+        self._stderr = threading.Thread(target=self._read_errors, name="tc batch stderr", daemon=True)
+        self._stderr.start()
+
+    def _read_errors(self) -> None:
+        for line in self.proc.stderr:
+            line = line.strip()
+            if line.startswith("Command failed"):
+                # the lines before it say why, warnings of successful commands are dropped
+                self.errors.append(" / ".join(self._messages + [line]))
+                self._messages = []
+            elif line and not line.startswith("Warning"):
+                self._messages.append(line)
+
+    def run(self, lines: list) -> float:
+        """Executes the lines and waits until they are in effect. Returns that time (time.monotonic)."""
+        self.proc.stdin.write("".join(line + "\n" for line in lines) + FENCE + "\n")
+        self.proc.stdin.flush()
+        if not self.proc.stdout.readline():
+            raise RuntimeError(f"tc batch exited with {self.proc.wait()}")
+        return time.monotonic()
+
+    def close(self) -> None:
+        self.proc.stdin.close()
+        try:
+            self.proc.wait(2)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self._stderr.join(1)
+
+
+def replay_interfaces(net, links: list = None, prefix: str = "") -> list:
+    """Both interfaces of every (node, node) link, default: s1 -- s2."""
+    intfs = []
+    for a, b in links or [("s1", "s2")]:
+        link = net.linksBetween(net[f"{prefix}{a}"], net[f"{prefix}{b}"])[0]
+        intfs += [link.intf1, link.intf2]
+    return intfs
+
+
+class LinkReplay:
+    """Background replay of a trace onto the given TCLink interfaces."""
+
+    def __init__(self, intfs: list, steps: list):
+        self.intfs = intfs
+        self.steps = steps
+        self.initial = {intf.name: link_state(intf) for intf in intfs}
+        self.state = {name: dict(state) for name, state in self.initial.items()}
+        # one tc process per namespace (switch interfaces all live in the root namespace)
+        self.groups = {}
+        for intf in intfs:
+            pid = intf.node.pid if intf.node.inNamespace else None
+            self.groups.setdefault(pid, []).append(intf)
+        self.batches = {}
+        self.log = []  # (t, due, sent, applied) per step, seconds since start
+        self.t0 = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def peak(self) -> dict:
+        """Highest bw of the replay per interface (the rate fidelity.py checks a shaped link against)."""
+        return {intf.name: max([self.initial[intf.name]["bw"]] + [values["bw"] for _, values in self.steps
+                                                                     if "bw" in values]) for intf in self.intfs}
+
+    def _apply(self, values: dict) -> float:
+        applied = None
+        for pid, intfs in self.groups.items():
+            lines = []
+            for intf in intfs:
+                new = {**self.state[intf.name], **values}
+                lines += tc_commands(intf.name, self.state[intf.name], new)
+                self.state[intf.name] = new
+            if lines:
+                applied = self.batches[pid].run(lines)
+        return applied if applied is not None else time.monotonic()
+
+    def _run(self) -> None:
+        for t, values in self.steps:
+            due = self.t0 + t
+            if self._stop.wait(max(due - time.monotonic(), 0)):
+                break
+            sent = time.monotonic()
+            applied = self._apply(values)
+            self.log.append((t, due - self.t0, sent - self.t0, applied - self.t0))
+
+    def start(self, t0: float = None) -> None:
+        """Starts the replay, trace time 0 is t0 (time.monotonic, default: now)."""
+        for pid in self.groups:
+            self.batches[pid] = TcBatch(pid)
+        self.t0 = time.monotonic() if t0 is None else t0
+        self._thread = threading.Thread(target=self._run, name="link replay", daemon=True)
+        self._thread.start()
+
+    def stop(self, restore: bool = True) -> dict:
+        """Stops the replay (optionally restoring the initial shaping) and returns the skew summary."""
+        self._stop.set()
+        self._thread.join()
+        if restore:
+            for pid, intfs in self.groups.items():
+                lines = []
+                for intf in intfs:
+                    lines += tc_commands(intf.name, self.state[intf.name], self.initial[intf.name])
+                    self.state[intf.name] = dict(self.initial[intf.name])
+                if lines:
+                    self.batches[pid].run(lines)
+        errors = []
+        for batch in self.batches.values():
+            batch.close()
+            errors += batch.errors
+        skew = np.array([applied - due for _, due, _, applied in self.log]) * 1e3
+        return {
+            "steps": len(self.steps),
+            "applied": len(self.log),
+            "errors": errors,
+            "skew_ms": {
+                "mean": float(skew.mean()) if len(skew) else 0.0,
+                "p50": float(np.percentile(skew, 50)) if len(skew) else 0.0,
+                "p99": float(np.percentile(skew, 99)) if len(skew) else 0.0,
+                "max": float(skew.max()) if len(skew) else 0.0,
+            },
+        }
+
+    def write_log(self, out_dir: str) -> str:
+        """Per-step timing (seconds since the start) and skew, one row per applied step."""
+        path = os.path.join(out_dir, REPORT)
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(("t", "due_s", "sent_s", "applied_s", "skew_ms") + TRACE_COLUMNS)
+            for (t, due, sent, applied), (_, values) in zip(self.log, self.steps):
+                writer.writerow((t, round(due, 6), round(sent, 6), round(applied, 6), round((applied - due) * 1e3, 3))
+                                + tuple(values.get(key, "") for key in TRACE_COLUMNS))
+        return path
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Check a link trace and print the tc batch it produces")
+    p.add_argument("trace", help="trace file (CSV or JSON)")
+    p.add_argument("--dev", default="s1-eth1", help="interface name used in the printed commands")
+    p.add_argument("--bw", type=float, default=20, help="initial bw (Mbit/s)")
+    p.add_argument("--delay", default="10ms", help="initial delay")
+    p.add_argument("--queue", type=int, default=200, help="initial queue (packets)")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    steps = load_trace(args.trace)
+    state = {"bw": args.bw, "delay": args.delay, "loss": None, "queue": args.queue}
+    for t, values in steps:
+        new = {**state, **values}
+        for line in tc_commands(args.dev, state, new):
+            print(f"# t={t:g}\n{line}")
+        state = new
+    print(f"# {len(steps)} steps over {steps[-1][0]:g} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,519 @@
+#! /usr/bin/env python3
+"""
+Compressed, chunked archive of the raw run logs with random access.
+
+The raw logs of a run directory (iperf3 JSON, ping transcripts, the out/ and
+process logs, RAW_PATTERNS) are cut into chunks of about --chunk-kb raw bytes,
+every chunk is compressed on its own (zstd if the zstandard module is installed,
+gzip otherwise) and appended to one data file. A SQLite index records per chunk
+its byte range in the data file and in the original log, and what it covers:
+- iperf3 logs are cut between intervals: a head chunk (everything before the
+  first interval), body chunks with the first interval number and the start /
+  end time of the intervals they hold, and a tail chunk (the "end" block),
+- ping transcripts are cut between lines, body chunks carry the time range of
+  their replies (icmp_seq at PING_INTERVAL_S),
+- other logs are cut between lines, without a time range.
+A flow or a time window of a flow is read by decompressing only the head, tail
+and overlapping body chunks; a whole log is restored byte for byte (SHA-256
+checked) by concatenating its chunks.
+
+Layout of an archive directory:
+    chunks.bin    compressed chunks, append-only
+    index.sqlite  members (run, file name, flow, size, SHA-256) and chunks
+Adding a run again only archives new or changed logs; the chunks of a
+replaced log stay in chunks.bin as dead bytes.
+
+json_to_csv.py --archive converts a flow or time window straight from an archive.
+
+Usage:
+    python3 log_archive.py add sweep_folder --archive logs.archive [--remove]
+    python3 log_archive.py add ../out --archive logs.archive
+    python3 log_archive.py ls --archive logs.archive
+    python3 log_archive.py extract point_0003 --archive logs.archive --out restored
+    python3 log_archive.py bench sweep_folder     # ratio and decode speed vs. the plain files
+"""
+
+import argparse
+import fnmatch
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, gzip works without it
+    zstandard = None
+
+import json_to_csv
+from ping_store import LOG_NAME_RE, PING_INTERVAL_S, REPLY_RE
+
+
+DATA = "chunks.bin"
+INDEX = "index.sqlite"
+CODECS = ("zstd", "gzip")
+DEFAULT_LEVEL = {"zstd": 9, "gzip": 6}
+DEFAULT_CHUNK_BYTES = 1 << 20
+RAW_PATTERNS = ("iperf3_*.json", "ping_*.txt", "*.out", "*.err", "*.log")
+IPERF3_RE = re.compile(r"iperf3_(.+)\.json")
+PING_RE = re.compile(r"ping_(.+)\.txt")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    id INTEGER PRIMARY KEY,
+    run TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    flow TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    UNIQUE (run, name)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    member INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    raw_offset INTEGER NOT NULL,
+    raw_length INTEGER NOT NULL,
+    first_item INTEGER,
+    t_start REAL,
+    t_end REAL,
+    PRIMARY KEY (member, seq)
+);
+CREATE INDEX IF NOT EXISTS members_flow ON members (run, flow);
+CREATE INDEX IF NOT EXISTS chunks_time ON chunks (member, t_start, t_end);
+"""
+
+
+def resolve_codec(codec: str) -> str:
+    """Falls back to gzip if zstd is requested without the zstandard module."""
+    if codec == "zstd" and zstandard is None:
+        print("[!] zstandard is not installed, compressing with gzip instead")
+        return "gzip"
+    return codec
+
+
+def compress(data: bytes, codec: str, level: int) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This archive holds zstd chunks, install the zstandard module to read them")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def member_kind(name: str) -> tuple:
+    """(kind, flow) of a raw log by its file name: iperf3, ping or text."""
+    m = IPERF3_RE.fullmatch(name)
+    if m is not None:
+        return "iperf3", m.group(1)
+    m = PING_RE.fullmatch(name) or LOG_NAME_RE.fullmatch(name)
+    if m is not None:
+        return "ping", m.group(1)
+    return "text", None
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(DEFAULT_CHUNK_BYTES), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def iperf3_chunks(path: str, chunk_bytes: int) -> list:
+    """
+    Chunks of an iperf3 log as (role, raw offset, raw length, first interval, t_start, t_end),
+    cut between intervals. Logs that do not parse (killed clients) are cut like text.
+    """
+    size = os.path.getsize(path)
+    body = []
+    group = None  # [start offset, end offset, first interval, t_start, t_end]
+    try:
+        for k, (start, end, interval) in enumerate(json_to_csv.iter_intervals(path, offsets=True)):
+            span = interval.get("sum") or (interval.get("streams") or [{}])[0]
+            if group is not None and start - group[0] >= chunk_bytes:
+                body.append(group)
+                group = None
+            if group is None:
+                group = [start, end, k, span.get("start"), span.get("end")]
+            group[1] = end
+            group[4] = span.get("end", group[4])
+        if group is not None:
+            body.append(group)
+    except ValueError:
+        return text_chunks(path, chunk_bytes, ping=False)
+    if not body:
+        return [("all", 0, size, None, None, None)]
+    chunks = [("head", 0, body[0][0], None, None, None)]
+    for k, (start, end, first, t_start, t_end) in enumerate(body):
+        # up to the next group, so the separators between intervals are kept
+        stop = body[k + 1][0] if k + 1 < len(body) else end
+        chunks.append(("body", start, stop - start, first, t_start, t_end))
+    chunks.append(("tail", body[-1][1], size - body[-1][1], None, None, None))
+    return chunks
+
+
+def _ping_times(text: str) -> tuple:
+    seqs = [int(m.group(2)) for m in REPLY_RE.finditer(text)]
+    if not seqs:
+        return None, None
+    return (min(seqs) - 1) * PING_INTERVAL_S, max(seqs) * PING_INTERVAL_S
+
+
+def text_chunks(path: str, chunk_bytes: int, ping: bool) -> list:
+    """Chunks of a text log, cut after a newline (with the reply time range of ping transcripts)."""
+    chunks = []
+    offset = 0
+    data = b""
+    eof = False
+    with open(path, "rb") as file:
+        while data or not eof:
+            if not eof and len(data) < 2 * chunk_bytes:
+                more = file.read(chunk_bytes)
+                eof = not more
+                data += more
+                continue
+            if eof and len(data) <= chunk_bytes:
+                cut = len(data)
+            else:
+                cut = data.rfind(b"\n", 0, chunk_bytes) + 1
+                if cut == 0:  # a line longer than a chunk
+                    cut = chunk_bytes
+            t_start, t_end = _ping_times(data[:cut].decode("utf-8", "replace")) if ping else (None, None)
+            chunks.append(("body", offset, cut, None, t_start, t_end))
+            offset += cut
+            data = data[cut:]
+    return chunks or [("all", 0, 0, None, None, None)]
+
+
+class LogArchive:
+    """An archive directory: chunks.bin plus its SQLite index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(path, INDEX))
+        self.conn.executescript(SCHEMA)
+        self.data = open(os.path.join(path, DATA), "a+b")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.data.close()
+        self.conn.close()
+
+    def _member(self, run: str, name: str) -> tuple:
+        row = self.conn.execute("SELECT id, kind, size, sha256 FROM members WHERE run = ? AND name = ?",
+                                (run, name)).fetchone()
+        if row is None:
+            raise KeyError(f"{run}/{name} is not in the archive {self.path}")
+        return row
+
+    def add_file(self, path: str, run: str, codec: str, level: int, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> tuple:
+        """Archives one log unless it is archived unchanged already. Returns (raw bytes, stored bytes), None if skipped."""
+        name = os.path.basename(path)
+        st = os.stat(path)
+        row = self.conn.execute("SELECT id, size, mtime_ns, sha256 FROM members WHERE run = ? AND name = ?",
+                                (run, name)).fetchone()
+        if row is not None and (row[1], row[2]) == (st.st_size, st.st_mtime_ns):
+            return None
+        digest = _sha256(path)
+        if row is not None and row[3] == digest:
+            with self.conn:
+                self.conn.execute("UPDATE members SET mtime_ns = ? WHERE id = ?", (st.st_mtime_ns, row[0]))
+            return None
+
+        kind, flow = member_kind(name)
+        if kind == "iperf3":
+            spans = iperf3_chunks(path, chunk_bytes)
+        else:
+            spans = text_chunks(path, chunk_bytes, ping=kind == "ping")
+        rows = []
+        stored = 0
+        self.data.seek(0, os.SEEK_END)
+        with open(path, "rb") as file:
+            for seq, (role, raw_offset, raw_length, first, t_start, t_end) in enumerate(spans):
+                file.seek(raw_offset)
+                packed = compress(file.read(raw_length), codec, level)
+                offset = self.data.tell()
+                self.data.write(packed)
+                stored += len(packed)
+                rows.append((seq, role, codec, offset, len(packed), raw_offset, raw_length, first, t_start, t_end))
+        # the chunks are on disk before the index points at them
+        self.data.flush()
+        os.fsync(self.data.fileno())
+        with self.conn:
+            if row is not None:
+                self.conn.execute("DELETE FROM chunks WHERE member = ?", (row[0],))
+                self.conn.execute("DELETE FROM members WHERE id = ?", (row[0],))
+            member = self.conn.execute(
+                "INSERT INTO members (run, name, kind, flow, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run, name, kind, flow, st.st_size, st.st_mtime_ns, digest)).lastrowid
+            self.conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  [(member,) + r for r in rows])
+        return st.st_size, stored
+
+    def add_tree(self, root: str, codec: str, level: int, chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+                 remove: bool = False) -> tuple:
+        """
+        Archives the raw logs of every directory below root (run = directory relative to root).
+        With remove, every archived log is read back, checked and deleted.
+        Returns (logs archived, raw bytes, stored bytes).
+        """
+        archive = os.path.abspath(self.path)
+        count = raw = stored = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith(".")
+                                 and os.path.abspath(os.path.join(dirpath, d)) != archive)
+            run = os.path.relpath(dirpath, root).replace(os.sep, "/")
+            for name in sorted(filenames):
+                if not any(fnmatch.fnmatch(name, pattern) for pattern in RAW_PATTERNS):
+                    continue
+                path = os.path.join(dirpath, name)
+                added = self.add_file(path, run, codec, level, chunk_bytes)
+                if added is not None:
+                    count += 1
+                    raw += added[0]
+                    stored += added[1]
+                if remove:
+                    self.verify(run, name)
+                    os.remove(path)
+        return count, raw, stored
+
+    def _read(self, chunks: list) -> bytes:
+        return b"".join(decompress(os.pread(self.data.fileno(), length, offset), codec)
+                        for codec, offset, length in chunks)
+
+    def read(self, run: str, name: str) -> bytes:
+        """A whole log, byte for byte."""
+        member = self._member(run, name)[0]
+        return self._read(self.conn.execute("SELECT codec, offset, length FROM chunks WHERE member = ? ORDER BY seq",
+                                            (member,)).fetchall())
+
+    def verify(self, run: str, name: str) -> None:
+        """Raises ValueError if the archived copy of a log does not match its checksum."""
+        digest = self._member(run, name)[3]
+        if hashlib.sha256(self.read(run, name)).hexdigest() != digest:
+            raise ValueError(f"{run}/{name}: archived copy does not match its SHA-256")
+
+    def read_window(self, run: str, name: str, start: float = None, end: float = None) -> bytes:
+        """The body chunks of a log overlapping [start, end) seconds (whole lines / intervals)."""
+        member = self._member(run, name)[0]
+        rows = self.conn.execute(
+            "SELECT codec, offset, length FROM chunks WHERE member = ? AND role = 'body' "
+            "AND (? IS NULL OR t_end > ?) AND (? IS NULL OR t_start < ?) ORDER BY seq",
+            (member, start, start, end, end)).fetchall()
+        return self._read(rows)
+
+    def iter_intervals(self, run: str, name: str, start: float = None, end: float = None, header: dict = None):
+        """
+        Yields (interval number, interval) of an archived iperf3 log whose time
+        overlaps [start, end) seconds; header receives the other top-level entries.
+        Only the head, tail and overlapping body chunks are decompressed.
+        """
+        member, kind, _, _ = self._member(run, name)
+        if kind != "iperf3":
+            raise ValueError(f"{run}/{name} is not an iperf3 log")
+        header = {} if header is None else header
+        ends = {role: (codec, offset, length) for role, codec, offset, length in self.conn.execute(
+            "SELECT role, codec, offset, length FROM chunks WHERE member = ? AND role != 'body'", (member,))}
+        if "all" in ends:
+            # a log without intervals is a single chunk
+            document = json.loads(self._read([ends["all"]]))
+            document.pop("intervals", None)
+            header.update(document)
+            return
+        if "head" not in ends:
+            raise ValueError(f"{run}/{name} did not parse when it was archived (incomplete log)")
+        head = json.loads(self._read([ends["head"]]).decode() + "]}")
+        head.pop("intervals")
+        header.update(head)
+        tail = self._read([ends["tail"]]).decode().strip()
+        rest = tail[1:].strip()  # after the ']' closing the intervals
+        if rest.startswith(","):
+            header.update(json.loads("{" + rest[1:]))
+
+        rows = self.conn.execute(
+            "SELECT codec, offset, length, first_item FROM chunks WHERE member = ? AND role = 'body' "
+            "AND (? IS NULL OR t_end > ?) AND (? IS NULL OR t_start < ?) ORDER BY seq",
+            (member, start, start, end, end)).fetchall()
+        decoder = json.JSONDecoder()
+        for codec, offset, length, first in rows:
+            # chunks are cut between intervals, never inside a UTF-8 sequence
+            text = self._read([(codec, offset, length)]).decode()
+            pos = 0
+            k = first
+            while True:
+                while pos < len(text) and text[pos] in " \t\r\n,":
+                    pos += 1
+                if pos == len(text):
+                    break
+                interval, pos = decoder.raw_decode(text, pos)
+                span = interval.get("sum") or interval["streams"][0]
+                if (start is None or span["end"] > start) and (end is None or span["start"] < end):
+                    yield k, interval
+                k += 1
+
+    def client_logs(self, run: str, flow: str = None) -> list:
+        """(file name, flow) of the archived iperf3 client logs of a run."""
+        rows = self.conn.execute("SELECT name, flow FROM members WHERE run = ? AND kind = 'iperf3' "
+                                 "AND (? IS NULL OR flow = ?) ORDER BY name", (run, flow, flow)).fetchall()
+        return [(name, flow) for name, flow in rows if json_to_csv.CLIENT_LOG_RE.fullmatch(name)]
+
+    def runs(self) -> list:
+        """(run, logs, raw bytes, stored bytes) per archived run."""
+        return self.conn.execute(
+            "SELECT run, COUNT(*), SUM(size), SUM(stored) FROM members JOIN "
+            "(SELECT member, SUM(length) AS stored FROM chunks GROUP BY member) ON member = id "
+            "GROUP BY run ORDER BY run").fetchall()
+
+    def extract(self, out_dir: str, run: str = None) -> int:
+        """Restores the logs of one run (default: all) below out_dir. Returns the amount of logs written."""
+        rows = self.conn.execute("SELECT run, name FROM members WHERE ? IS NULL OR run = ? ORDER BY run, name",
+                                 (run, run)).fetchall()
+        for member_run, name in rows:
+            directory = os.path.join(out_dir, member_run)
+            os.makedirs(directory, exist_ok=True)
+            data = self.read(member_run, name)
+            if hashlib.sha256(data).hexdigest() != self._member(member_run, name)[3]:
+                raise ValueError(f"{member_run}/{name}: archived copy does not match its SHA-256")
+            with open(os.path.join(directory, name), "wb") as file:
+                file.write(data)
+        return len(rows)
+
+
+def _raw_logs(root: str) -> list:
+    return [os.path.join(dirpath, name) for dirpath, dirnames, filenames in os.walk(root)
+            for name in sorted(filenames) if any(fnmatch.fnmatch(name, pattern) for pattern in RAW_PATTERNS)
+            and not any(part.startswith(".") for part in os.path.relpath(dirpath, root).split(os.sep) if part != ".")]
+
+
+def benchmark(root: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> None:
+    """Compression ratio, encode / decode throughput and window reads against the plain logs below root."""
+    paths = _raw_logs(root)
+    clients = [path for path in paths if json_to_csv.CLIENT_LOG_RE.fullmatch(os.path.basename(path))]
+    raw = sum(os.path.getsize(path) for path in paths)
+    if not raw:
+        raise SystemExit(f"No raw logs below {root}")
+
+    t0 = time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as file:
+            while file.read(DEFAULT_CHUNK_BYTES):
+                pass
+    plain_read = raw / 1e6 / max(time.perf_counter() - t0, 1e-9)
+    # a window of a plain log means parsing it from the start
+    t0 = time.perf_counter()
+    for path in clients:
+        for _ in json_to_csv.iter_intervals(path):
+            pass
+    plain_parse_ms = (time.perf_counter() - t0) * 1e3 / max(len(clients), 1)
+
+    print(f"[+] {len(paths)} logs, {raw / 1e6:.1f} MB; plain: read {plain_read:.0f} MB/s, "
+          f"full parse {plain_parse_ms:.1f} ms per client log")
+    print("codec,level,stored_mb,ratio,encode_mb_s,decode_mb_s,window_ms,window_decoded_share")
+    codecs = [("gzip", 1), ("gzip", 6), ("gzip", 9)]
+    if zstandard is not None:
+        codecs += [("zstd", 3), ("zstd", 9), ("zstd", 19)]
+    for codec, level in codecs:
+        with tempfile.TemporaryDirectory(prefix="log_archive_") as tmp:
+            with LogArchive(tmp) as archive:
+                t0 = time.perf_counter()
+                archive.add_tree(root, codec, level, chunk_bytes)
+                encode = raw / 1e6 / max(time.perf_counter() - t0, 1e-9)
+                stored = os.path.getsize(os.path.join(tmp, DATA))
+                members = archive.conn.execute("SELECT run, name FROM members").fetchall()
+                t0 = time.perf_counter()
+                for run, name in members:
+                    archive.read(run, name)
+                decode = raw / 1e6 / max(time.perf_counter() - t0, 1e-9)
+
+                # 10 % window in the middle of every client log
+                window_s = 0.0
+                decoded = total = 0
+                for run, name in archive.conn.execute(
+                        "SELECT run, name FROM members WHERE kind = 'iperf3'").fetchall():
+                    if not json_to_csv.CLIENT_LOG_RE.fullmatch(name):
+                        continue
+                    member = archive._member(run, name)[0]
+                    lo, hi, size = archive.conn.execute(
+                        "SELECT MIN(t_start), MAX(t_end), SUM(raw_length) FROM chunks WHERE member = ?",
+                        (member,)).fetchone()
+                    if lo is None:
+                        continue
+                    a, b = lo + 0.45 * (hi - lo), lo + 0.55 * (hi - lo)
+                    t0 = time.perf_counter()
+                    for _ in archive.iter_intervals(run, name, a, b):
+                        pass
+                    window_s += time.perf_counter() - t0
+                    decoded += archive.conn.execute(
+                        "SELECT SUM(raw_length) FROM chunks WHERE member = ? AND (role != 'body' "
+                        "OR (t_end > ? AND t_start < ?))", (member, a, b)).fetchone()[0]
+                    total += size
+        print(f"{codec},{level},{stored / 1e6:.2f},{raw / max(stored, 1):.1f},{encode:.1f},{decode:.1f},"
+              f"{window_s * 1e3 / max(len(clients), 1):.1f},{decoded / max(total, 1):.3f}", flush=True)
+
+
+def parse_args():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--archive", default="logs.archive", help="archive directory")
+    p = argparse.ArgumentParser(description="Compressed, chunked archive of raw run logs")
+    sub = p.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", parents=[common], help="archive the raw logs below a directory")
+    add.add_argument("root")
+    add.add_argument("--codec", choices=CODECS, default="zstd", help="falls back to gzip without zstandard")
+    add.add_argument("--level", type=int, default=None, help="compression level (default: zstd 9, gzip 6)")
+    add.add_argument("--chunk-kb", type=int, default=DEFAULT_CHUNK_BYTES >> 10, help="raw bytes per chunk")
+    add.add_argument("--remove", action="store_true", help="delete every log once its archived copy is verified")
+    sub.add_parser("ls", parents=[common], help="archived runs")
+    extract = sub.add_parser("extract", parents=[common], help="restore archived logs")
+    extract.add_argument("run", nargs="?", default=None, help="run (directory relative to the archived root)")
+    extract.add_argument("--out", default="restored")
+    bench = sub.add_parser("bench", help="compression ratio and decode speed against the plain logs below root")
+    bench.add_argument("root")
+    bench.add_argument("--chunk-kb", type=int, default=DEFAULT_CHUNK_BYTES >> 10)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "bench":
+        benchmark(args.root, args.chunk_kb << 10)
+        return
+    with LogArchive(args.archive) as archive:
+        if args.command == "add":
+            codec = resolve_codec(args.codec)
+            level = DEFAULT_LEVEL[codec] if args.level is None else args.level
+            t0 = time.perf_counter()
+            count, raw, stored = archive.add_tree(args.root, codec, level, args.chunk_kb << 10, args.remove)
+            elapsed = max(time.perf_counter() - t0, 1e-9)
+            print(f"[+] {count} logs archived ({codec} {level}): {raw / 1e6:.1f} MB -> {stored / 1e6:.1f} MB "
+                  f"at {raw / 1e6 / elapsed:.1f} MB/s")
+        elif args.command == "ls":
+            for run, logs, raw, stored in archive.runs():
+                print(f"{run:40s} {logs:4d} logs  {raw / 1e6:8.2f} MB -> {stored / 1e6:8.2f} MB")
+        else:
+            count = archive.extract(args.out, args.run)
+            print(f"[+] {count} logs restored below {args.out}")
+
+
+if __name__ == "__main__":
+    main()
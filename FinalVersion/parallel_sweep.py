@@ -0,0 +1,310 @@
+#! /usr/bin/env python3
+"""
+Parallel parameter sweep: N independent dumbbells on one machine.
+
+Same grid file and output layout as sweep.py, but the grid points are spread
+over --workers worker processes. Every worker builds its own DumbbellTopo once
+and reshapes its links per point, like sweep.py does. Workers do not collide:
+- node names carry the prefix w<k> (w0s1, w0L1, ...), which also keeps the OVS
+  bridges and veth names apart,
+- IP base 10.<k+1>.0.0/16,
+- iperf3 ports base_port + k * PORT_STRIDE (and the telemetry port, if set),
+- CPU budget: every worker and everything it starts (iperf3, ping) is pinned
+  to its own --cpus-per-worker cores.
+
+The coordinator hands the points to the workers one at a time. After every
+run the summed iperf3 receive rate is compared with what the bottleneck should
+carry, min(bottleneck_bw, n_left * parallel * rate). A run below
+--min-utilization, or whose fidelity check failed (fidelity.py), may be CPU
+contention or the configuration itself (tiny queues, long delays never fill the
+bottleneck). The point is therefore run again alone, with the other workers
+idle: if it passes there, it was contention and one point fewer is run at once
+from then on; if not, the result is kept and marked "contended" in its manifest
+and the parallelism stays. After --raise-after points in a row passed, one point
+more is run at once again (up to --workers).
+
+A point whose run raised, or whose worker died, is queued again; after
+MAX_ERRORS failures its manifest is marked "failed" (so it is run again on
+resume) and the sweep goes on with the other points.
+
+Usage:
+    sudo python3 parallel_sweep.py grid.json --workers 4 --cpus-per-worker 2
+"""
+
+from mininet.log import lg
+
+from Dumbbell import DumbbellTopo, exp_cfg, run_scenario, topo_kwargs
+from fast_net import WarmNetwork
+from sweep import MANIFEST, load_grid, point_dir, read_manifest, write_manifest
+from units import bits_per_second
+import json_to_csv
+import run_index
+
+import argparse
+import collections
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from datetime import datetime
+
+
+PORT_STRIDE = 100
+MIN_UTILIZATION = 0.8
+MAX_ERRORS = 3
+RAISE_AFTER = 5
+POLL_S = 1.0
+
+
+def worker_layout(worker: int, cpus_per_worker: int) -> dict:
+    """Name prefix, IP base, port offset and CPU set of worker k."""
+    n_cpus = os.cpu_count() or 1
+    cpus = {(worker * cpus_per_worker + i) % n_cpus for i in range(cpus_per_worker)}
+    return {
+        "prefix": f"w{worker}",
+        "ip_base": f"10.{worker + 1}.0.0/16",
+        "port_offset": worker * PORT_STRIDE,
+        "cpus": cpus,
+    }
+
+
+def measured_throughput(directory: str) -> float:
+    """Sum of the receive rates (bit/s) of all iperf3 client logs of a run."""
+    total = 0.0
+    for rel, _, _ in json_to_csv.find_client_logs(directory):
+        header = {}
+        try:
+            for _ in json_to_csv.iter_intervals(os.path.join(directory, rel), header):
+                pass
+        except ValueError:
+            continue  # killed client, incomplete log
+        total += header.get("end", {}).get("sum_received", {}).get("bits_per_second", 0.0)
+    return total
+
+
+def expected_throughput(params) -> float:
+    """What the bottleneck should carry without contention (bit/s)."""
+    capacity = float(params.bottleneck_bw) * 1e6
+    rate = bits_per_second(params.rate)
+    if rate <= 0:
+        return capacity
+    # iperf3 -b applies to every stream of -P
+    return min(capacity, params.n_left * params.parallel * rate)
+
+
+def _run_point(worker: int, layout: dict, warm: WarmNetwork, base: dict, out_dir: str,
+               index: int, point: dict, attempt: int) -> dict:
+    directory = point_dir(out_dir, index, point)
+    params = argparse.Namespace(**{**base, **point, "out_dir": directory,
+                                   "base_port": base["base_port"] + layout["port_offset"]})
+    if params.telemetry_port:
+        params.telemetry_port += layout["port_offset"]
+
+    t0 = time.perf_counter()
+    net = warm.get(prefix=layout["prefix"], **topo_kwargs(params))
+    setup_s = time.perf_counter() - t0
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = {
+        "index": index,
+        "point": point,
+        "config": vars(params),
+        "worker": worker,
+        "attempt": attempt,
+        "setup_s": setup_s,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "status": "running",
+    }
+    write_manifest(directory, manifest)
+
+    cfg = exp_cfg(params)
+    cfg["prefix"] = layout["prefix"]
+    manifest.update(run_scenario(net, cfg, vars(params)))
+    measured = measured_throughput(directory)
+    expected = expected_throughput(params)
+    manifest.update({"throughput_bps": measured, "expected_bps": expected, "utilization": measured / expected})
+    return manifest
+
+
+def _worker(worker: int, base: dict, out_dir: str, cpus_per_worker: int, inbox, results) -> None:
+    layout = worker_layout(worker, cpus_per_worker)
+    # inherited by the processes started in the hosts
+    os.sched_setaffinity(0, layout["cpus"])
+    warm = WarmNetwork(DumbbellTopo, autoSetMacs=True, ipBase=layout["ip_base"])
+    try:
+        warm.get(prefix=layout["prefix"], **topo_kwargs(argparse.Namespace(**base)))
+        for index, point, attempt in iter(inbox.get, None):
+            try:
+                results.put(_run_point(worker, layout, warm, base, out_dir, index, point, attempt))
+            except Exception as e:
+                traceback.print_exc()
+                results.put({"index": index, "point": point, "attempt": attempt, "worker": worker, "error": repr(e)})
+                # the network may be left half configured, the next point builds it again
+                warm.close()
+    finally:
+        warm.close()
+
+
+def run_parallel(base: dict, points: list, out_dir: str, workers: int, cpus_per_worker: int,
+                 min_utilization: float = MIN_UTILIZATION, raise_after: int = RAISE_AFTER) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    todo = [(index, point) for index, point in enumerate(points)
+            if read_manifest(point_dir(out_dir, index, point)).get("status") != "done"]
+    print(f"[+] {len(points) - len(todo)} points already done, {len(todo)} to run on {workers} workers")
+    if not todo:
+        return
+
+    results = multiprocessing.Queue()
+    inboxes = [multiprocessing.Queue() for _ in range(workers)]
+    procs = [multiprocessing.Process(target=_worker, args=(k, base, out_dir, cpus_per_worker, inboxes[k], results),
+                                     name=f"dumbbell worker {k}")
+             for k in range(workers)]
+    for proc in procs:
+        proc.start()
+
+    pending = collections.deque((index, point, 0) for index, point in todo)
+    holding = [None] * workers  # the task every worker runs
+    peak = [0] * workers  # most tasks run at once during it
+    errors = collections.Counter()
+    active = workers
+    probe = None  # contended task waiting to run alone
+    solo = None  # worker running it
+    clean = 0  # points in a row that passed
+
+    def lost(task: tuple, worker: int, error: str) -> bool:
+        """Queues a failed task again, True if the point is given up on instead."""
+        index, point, attempt = task
+        errors[index] += 1
+        if errors[index] < MAX_ERRORS:
+            print(f"[!] Point {index + 1} failed on worker {worker} ({error}), running it again")
+            pending.appendleft((index, point, attempt + 1))
+            return False
+        print(f"[!] Point {index + 1} failed {MAX_ERRORS} times, giving up on it: {error}")
+        directory = point_dir(out_dir, index, point)
+        os.makedirs(directory, exist_ok=True)
+        write_manifest(directory, {**read_manifest(directory), "index": index, "point": point, "worker": worker,
+                                   "attempt": attempt, "error": error,
+                                   "finished": datetime.now().isoformat(timespec="seconds"), "status": "failed"})
+        return True
+
+    t0 = time.perf_counter()
+    done = failed = 0
+    try:
+        while done < len(todo):
+            live = [k for k, proc in enumerate(procs) if proc.is_alive()]
+            for k, task in enumerate(holding):
+                if task is not None and k not in live:
+                    holding[k] = None
+                    if k == solo:
+                        solo = None
+                    if lost(task, k, f"worker exited with code {procs[k].exitcode}"):
+                        done += 1
+                        failed += 1
+            if not live:
+                raise RuntimeError(f"All workers exited with {len(todo) - done} points left")
+            busy = [k for k, task in enumerate(holding) if task is not None]
+            if probe is not None:
+                # once the running points are done
+                if not busy:
+                    solo, peak[live[0]] = live[0], 1
+                    holding[solo], probe = probe, None
+                    inboxes[solo].put(holding[solo])
+            elif solo is None:
+                for k in live:
+                    if not pending or len(busy) >= active:
+                        break
+                    if holding[k] is None:
+                        holding[k], peak[k] = pending.popleft(), 0
+                        inboxes[k].put(holding[k])
+                        busy.append(k)
+                        for j in busy:
+                            peak[j] = max(peak[j], len(busy))
+
+            try:
+                manifest = results.get(timeout=POLL_S)
+            except queue.Empty:
+                continue
+            index, point, worker = manifest["index"], manifest["point"], manifest["worker"]
+            if holding[worker] != (index, point, manifest["attempt"]):
+                continue  # from a worker that exited after reporting, already queued again
+            task, holding[worker] = holding[worker], None
+            probed = worker == solo
+            if probed:
+                solo = None
+            if "error" in manifest:
+                if lost(task, worker, manifest["error"]):
+                    done += 1
+                    failed += 1
+                continue
+
+            utilization = manifest["utilization"]
+            faithful = manifest.get("fidelity", {}).get("ok", True)
+            contended = bool(manifest["timed_out"]) or utilization < min_utilization or not faithful
+            if contended and peak[worker] > 1:
+                print(f"[!] Point {index + 1}: utilization {utilization:.2f} (minimum {min_utilization}), "
+                      f"fidelity flags {manifest.get('fidelity', {}).get('flags', [])} on worker "
+                      f"{worker} with {peak[worker]} points at once, running it again"
+                      f"{' alone' if probe is None else ''}")
+                if probe is None:
+                    probe = (index, point, manifest["attempt"] + 1)
+                else:
+                    pending.appendleft((index, point, manifest["attempt"] + 1))
+                continue
+            if probed and not contended:
+                active, clean = max(1, active - 1), 0
+                print(f"[!] Point {index + 1} passed alone (utilization {utilization:.2f}), "
+                      f"lowering parallelism to {active}")
+            elif probed:
+                print(f"[!] Point {index + 1} stays below the minimum alone too, keeping it as it is")
+            elif not contended:
+                clean += 1
+                if clean >= raise_after and active < workers:
+                    active, clean = active + 1, 0
+                    print(f"[+] {raise_after} points in a row passed, raising parallelism to {active}")
+
+            directory = point_dir(out_dir, index, point)
+            manifest["contended"] = contended
+            manifest["parallelism"] = peak[worker]
+            manifest["finished"] = datetime.now().isoformat(timespec="seconds")
+            manifest["files"] = sorted(name for name in os.listdir(directory) if name != MANIFEST)
+            manifest["status"] = "done"
+            write_manifest(directory, manifest)
+            run_index.reindex(directory, manifest["config"]["run_index"])
+            done += 1
+            print(f"[+] Point {index + 1}/{len(points)} done on worker {worker} "
+                  f"(utilization {utilization:.2f}{', contended' if contended else ''})")
+    finally:
+        for inbox in inboxes:
+            inbox.put(None)
+        for proc in procs:
+            proc.join()
+
+    elapsed = time.perf_counter() - t0
+    print(f"[+] {done} points in {elapsed:.0f} s ({failed} failed), {active} of {workers} workers active at the end")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Parallel parameter sweep over several Mininet dumbbells")
+    p.add_argument("grid", help="Grid file (JSON), see sweep.py")
+    p.add_argument("--out-dir", type=str, default="sweep_folder", help="One sub-directory per grid point is created here")
+    p.add_argument("--workers", type=int, default=None, help="Dumbbells run at once (default: cores / --cpus-per-worker)")
+    p.add_argument("--cpus-per-worker", type=int, default=2, help="Cores every dumbbell is pinned to")
+    p.add_argument("--min-utilization", type=float, default=MIN_UTILIZATION,
+                   help="Measured / expected bottleneck throughput below which a run counts as contended")
+    p.add_argument("--raise-after", type=int, default=RAISE_AFTER,
+                   help="Points in a row that pass before one point more is run at once again")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    lg.setLogLevel("warning")
+    base, points = load_grid(args.grid)
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.cpus_per_worker)
+    run_parallel(base, points, args.out_dir, min(workers, len(points)), args.cpus_per_worker, args.min_utilization,
+                 args.raise_after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#! /usr/bin/env python3
+"""
+Indexed store for the historical ping transcripts in out/.
+
+Every h{n}_{YYYYmmdd_HHMMSS}.out transcript (and its err/ twin) is parsed in one
+pass into per-sample records (host, run timestamp, icmp_seq, ttl, RTT). Missing
+sequence numbers, including the ones lost at the end of a run, are recorded as
+losses. Everything goes into one SQLite file with indexes on host and time, so
+queries do not have to read the text files again.
+
+Re-runs are incremental: only files whose mtime or size changed (or that are
+new) are parsed again.
+
+Usage:
+    python3 ping_store.py index [--logs ../out] [--db ../out/ping_index.sqlite]
+    python3 ping_store.py query --host h1 --since 2025-11-25T16:00 --until 2025-11-25T18:00
+    python3 ping_store.py summary
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+
+LOG_NAME_RE = re.compile(r"(h\d+)_(\d{8}_\d{6})\.out")
+# optional [epoch] prefix (ping -D), optional ident (newer iputils)
+REPLY_RE = re.compile(
+    r"^(?:\[(\d+\.\d+)\] )?\d+ bytes from [^:]+: icmp_seq=(\d+)(?: ident=\d+)? ttl=(\d+) time=([\d.]+) ms",
+    re.MULTILINE)
+DEST_RE = re.compile(r"^PING \S+ \(([\d.]+)\)", re.MULTILINE)
+TRANSMITTED_RE = re.compile(r"^(\d+) packets transmitted, (\d+) received", re.MULTILINE)
+PING_INTERVAL_S = 1.0  # ping default (-i 1), used to place samples without a -D timestamp
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    run_ts REAL NOT NULL,
+    dest TEXT,
+    transmitted INTEGER,
+    received INTEGER,
+    err TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    host TEXT NOT NULL,
+    run_ts REAL NOT NULL,
+    t REAL NOT NULL,
+    icmp_seq INTEGER NOT NULL,
+    ttl INTEGER NOT NULL,
+    rtt_ms REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS losses (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    host TEXT NOT NULL,
+    run_ts REAL NOT NULL,
+    icmp_seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_host_t ON samples(host, t);
+CREATE INDEX IF NOT EXISTS samples_file ON samples(file_id);
+CREATE INDEX IF NOT EXISTS losses_host_run ON losses(host, run_ts);
+CREATE INDEX IF NOT EXISTS losses_file ON losses(file_id);
+"""
+
+
+def parse_transcript(text: str, run_ts: float) -> dict:
+    """
+    Parses one ping transcript.
+    Returns dest, transmitted, received, samples [(t, icmp_seq, ttl, rtt_ms)] and lost [icmp_seq].
+    """
+    samples = []
+    for stamp, seq, ttl, rtt in REPLY_RE.findall(text):
+        seq = int(seq)
+        t = float(stamp) if stamp else run_ts + (seq - 1) * PING_INTERVAL_S
+        samples.append((t, seq, int(ttl), float(rtt)))
+
+    dest = DEST_RE.search(text)
+    stats = TRANSMITTED_RE.search(text)
+    # runs that were killed have no statistics; the highest sequence number seen is the best guess
+    transmitted = int(stats.group(1)) if stats else max((s[1] for s in samples), default=0)
+    received = int(stats.group(2)) if stats else len(samples)
+
+    seen = {s[1] for s in samples}
+    lost = [seq for seq in range(1, transmitted + 1) if seq not in seen]
+    return {
+        "dest": dest.group(1) if dest else None,
+        "transmitted": transmitted,
+        "received": received,
+        "samples": samples,
+        "lost": lost,
+    }
+
+
+def find_transcripts(logs_dir: str) -> list:
+    """Returns (path, host, run_ts) of every transcript below logs_dir, sorted by path."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(logs_dir):
+        for name in filenames:
+            m = LOG_NAME_RE.fullmatch(name)
+            if m is None:
+                continue
+            run_ts = datetime.strptime(m.group(2), "%Y%m%d_%H%M%S").timestamp()
+            found.append((os.path.join(dirpath, name), m.group(1), run_ts))
+    found.sort()
+    return found
+
+
+def _err_path(path: str) -> str:
+    directory, name = os.path.split(path)
+    candidate = os.path.join(directory, "err", name[:-len(".out")] + ".err")
+    return candidate if os.path.exists(candidate) else path[:-len(".out")] + ".err"
+
+
+def open_store(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def index_logs(conn: sqlite3.Connection, logs_dir: str) -> tuple:
+    """
+    Adds new and changed transcripts to the store and drops the ones that disappeared.
+    Returns (files parsed, files unchanged, samples inserted).
+    """
+    known = {path: (file_id, mtime_ns, size)
+             for file_id, path, mtime_ns, size in conn.execute("SELECT id, path, mtime_ns, size FROM files")}
+    parsed = unchanged = inserted = 0
+    present = set()
+
+    with conn:
+        for path, host, run_ts in find_transcripts(logs_dir):
+            key = os.path.relpath(path, logs_dir)
+            present.add(key)
+            st = os.stat(path)
+            old = known.get(key)
+            if old is not None and old[1:] == (st.st_mtime_ns, st.st_size):
+                unchanged += 1
+                continue
+            if old is not None:
+                _delete_file(conn, old[0])
+
+            with open(path, "r", errors="replace") as file:
+                result = parse_transcript(file.read(), run_ts)
+            err = None
+            err_path = _err_path(path)
+            if os.path.exists(err_path):
+                with open(err_path, "r", errors="replace") as file:
+                    err = file.read().strip() or None
+
+            cur = conn.execute(
+                "INSERT INTO files (path, mtime_ns, size, host, run_ts, dest, transmitted, received, err) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, st.st_mtime_ns, st.st_size, host, run_ts, result["dest"],
+                 result["transmitted"], result["received"], err))
+            file_id = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO samples (file_id, host, run_ts, t, icmp_seq, ttl, rtt_ms) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(file_id, host, run_ts) + sample for sample in result["samples"]])
+            conn.executemany(
+                "INSERT INTO losses (file_id, host, run_ts, icmp_seq) VALUES (?, ?, ?, ?)",
+                [(file_id, host, run_ts, seq) for seq in result["lost"]])
+            parsed += 1
+            inserted += len(result["samples"])
+
+        for key, (file_id, mtime_ns, size) in known.items():
+            if key not in present:
+                _delete_file(conn, file_id)
+    return parsed, unchanged, inserted
+
+
+def _delete_file(conn: sqlite3.Connection, file_id: int) -> None:
+    conn.execute("DELETE FROM samples WHERE file_id = ?", (file_id,))
+    conn.execute("DELETE FROM losses WHERE file_id = ?", (file_id,))
+    conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+
+def query_samples(conn: sqlite3.Connection, host: str = None, since: float = None, until: float = None) -> list:
+    """Returns (host, run_ts, t, icmp_seq, ttl, rtt_ms) rows, ordered by host and time."""
+    where, params = [], []
+    if host is not None:
+        where.append("host = ?")
+        params.append(host)
+    if since is not None:
+        where.append("t >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("t < ?")
+        params.append(until)
+    sql = "SELECT host, run_ts, t, icmp_seq, ttl, rtt_ms FROM samples"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return conn.execute(sql + " ORDER BY host, t", params).fetchall()
+
+
+def summary(conn: sqlite3.Connection) -> list:
+    """Per run: host, run_ts, dest, transmitted, received, lost, avg RTT."""
+    return conn.execute(
+        "SELECT f.host, f.run_ts, f.dest, f.transmitted, f.received, "
+        "       (SELECT COUNT(*) FROM losses l WHERE l.file_id = f.id), "
+        "       (SELECT AVG(rtt_ms) FROM samples s WHERE s.file_id = f.id) "
+        "FROM files f ORDER BY f.run_ts, f.host").fetchall()
+
+
+def _timestamp(text: str) -> float:
+    return datetime.fromisoformat(text).timestamp()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts).isoformat(timespec="milliseconds")
+
+
+def parse_args():
+    here = os.path.dirname(os.path.abspath(__file__))
+    default_logs = os.path.join(here, "..", "out")
+    p = argparse.ArgumentParser(description="Index and query the out/*.out ping transcripts")
+    p.add_argument("--logs", default=default_logs, help="directory with the h{n}_{timestamp}.out transcripts")
+    p.add_argument("--db", default=None, help="SQLite store (default: <logs>/ping_index.sqlite)")
+    sub = p.add_subparsers(dest="command", required=True)
+    sub.add_parser("index", help="parse new and changed transcripts")
+    q = sub.add_parser("query", help="print samples of a host / time range")
+    q.add_argument("--host", default=None)
+    q.add_argument("--since", type=_timestamp, default=None, help="ISO time, e.g. 2025-11-25T16:00")
+    q.add_argument("--until", type=_timestamp, default=None, help="ISO time (exclusive)")
+    sub.add_parser("summary", help="print loss and RTT per run")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    db_path = args.db or os.path.join(args.logs, "ping_index.sqlite")
+    conn = open_store(db_path)
+    try:
+        if args.command == "index":
+            t0 = time.perf_counter()
+            parsed, unchanged, inserted = index_logs(conn, args.logs)
+            print(f"[+] {parsed} transcripts parsed ({inserted} samples), {unchanged} unchanged "
+                  f"in {time.perf_counter() - t0:.2f} s -> {db_path}")
+        elif args.command == "query":
+            print("host,run,time,icmp_seq,ttl,rtt_ms")
+            for host, run_ts, t, seq, ttl, rtt in query_samples(conn, args.host, args.since, args.until):
+                print(f"{host},{_iso(run_ts)},{_iso(t)},{seq},{ttl},{rtt}")
+        else:
+            print("host,run,dest,transmitted,received,lost,avg_rtt_ms")
+            for host, run_ts, dest, transmitted, received, lost, avg in summary(conn):
+                print(f"{host},{_iso(run_ts)},{dest},{transmitted},{received},{lost},"
+                      f"{'' if avg is None else f'{avg:.3f}'}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
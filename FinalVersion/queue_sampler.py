@@ -0,0 +1,273 @@
+"""
+Queue occupancy time series of the s1 -- s2 bottleneck.
+
+QueueSampler polls the root qdisc statistics of both ends of the bottleneck
+link every 10-100 ms during a scenario: backlog (bytes and packets), drops,
+overlimits, requeues and bytes/packets sent. Both interfaces belong to the
+switches, i.e. to the root network namespace, so the sampler talks rtnetlink
+directly (one RTM_GETQDISC dump per sample, parsed with struct) instead of
+starting `tc -s qdisc` processes. Its own CPU time is measured and stored with
+the samples; at 20 ms it stays around 1 % of one core.
+
+The samples are appended as fixed-size binary records (SAMPLE_DTYPE) to
+queue_samples.bin next to the iperf3 logs, with a small queue_samples.json
+describing the devices, the sampling interval and the time the iperf3 clients
+were started:
+    samples = np.fromfile("queue_samples.bin", dtype=queue_sampler.SAMPLE_DTYPE)
+
+Note that the backlog of the root qdisc includes the netem delay line, i.e.
+up to bw x delay of packets in flight besides the standing queue.
+
+Aligner maps the samples onto iperf3 intervals (QUEUE_COLUMNS, used by
+json_to_csv.py --queue): time-averaged and maximum backlog of the forward
+(s1 -> s2, data) direction, drops and overlimits during the interval, and the
+backlog of the reverse (ack) direction. Interval times come from the iperf3 log
+relative to the client start; the alignment error is the iperf3 connection
+setup (a few RTTs).
+"""
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+
+SAMPLES = "queue_samples.bin"
+SIDECAR = "queue_samples.json"
+DEFAULT_INTERVAL_MS = 20
+FLUSH_RECORDS = 4096
+
+SAMPLE_DTYPE = np.dtype([
+    ("t", "<f8"),            # epoch seconds
+    ("dev", "u1"),           # index into the devices list of the sidecar (0: s1 side, 1: s2 side)
+    ("bytes", "<u8"),
+    ("packets", "<u4"),
+    ("qlen", "<u4"),
+    ("backlog", "<u4"),      # bytes
+    ("drops", "<u4"),
+    ("requeues", "<u4"),
+    ("overlimits", "<u4"),
+])
+QUEUE_COLUMNS = ("queue_backlog_bytes", "queue_backlog_max_bytes", "queue_backlog_pkts", "queue_drops",
+                 "queue_overlimits", "rev_queue_backlog_bytes")
+
+# rtnetlink constants (linux/netlink.h, linux/rtnetlink.h, linux/gen_stats.h)
+_NLMSG_ERROR = 2
+_NLMSG_DONE = 3
+_RTM_NEWQDISC = 36
+_RTM_GETQDISC = 38
+_NLM_F_REQUEST = 0x1
+_NLM_F_DUMP = 0x300
+_TC_H_ROOT = 0xFFFFFFFF
+_TCA_STATS2 = 7
+_TCA_STATS_BASIC = 1
+_TCA_STATS_QUEUE = 3
+_NLMSG = struct.Struct("<IHHII")
+_TCMSG = struct.Struct("<BBHiIII")
+_RTA = struct.Struct("<HH")
+_BASIC = struct.Struct("<QI")
+_QUEUE = struct.Struct("<IIIII")
+
+
+class QdiscStats:
+    """rtnetlink RTM_GETQDISC dumps, reduced to the root qdiscs of some interfaces."""
+
+    def __init__(self, ifindexes: list):
+        self.slot = {ifindex: k for k, ifindex in enumerate(ifindexes)}
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self.sock.bind((0, 0))
+        self.buf = bytearray(1 << 16)
+        self.seq = 0
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def dump(self) -> dict:
+        """{slot: (bytes, packets, qlen, backlog, drops, requeues, overlimits)} of the root qdiscs."""
+        self.seq += 1
+        self.sock.send(_NLMSG.pack(_NLMSG.size + _TCMSG.size, _RTM_GETQDISC, _NLM_F_REQUEST | _NLM_F_DUMP,
+                                   self.seq, 0) + _TCMSG.pack(0, 0, 0, 0, 0, 0, 0))
+        out = {}
+        view = memoryview(self.buf)
+        while True:
+            n = self.sock.recv_into(self.buf)
+            pos = 0
+            while pos + _NLMSG.size <= n:
+                length, kind, _, seq, _ = _NLMSG.unpack_from(view, pos)
+                if kind == _NLMSG_DONE:
+                    return out
+                if kind == _NLMSG_ERROR:
+                    raise OSError(-struct.unpack_from("<i", view, pos + _NLMSG.size)[0], "RTM_GETQDISC failed")
+                if kind == _RTM_NEWQDISC and seq == self.seq:
+                    self._parse(view, pos + _NLMSG.size, pos + length, out)
+                pos += (length + 3) & ~3
+
+    def _parse(self, view, pos: int, end: int, out: dict) -> None:
+        _, _, _, ifindex, _, parent, _ = _TCMSG.unpack_from(view, pos)
+        slot = self.slot.get(ifindex)
+        if slot is None or parent != _TC_H_ROOT:
+            return
+        basic = queue = None
+        pos += _TCMSG.size
+        while pos + _RTA.size <= end:
+            length, kind = _RTA.unpack_from(view, pos)
+            if kind == _TCA_STATS2:
+                sub, sub_end = pos + _RTA.size, pos + length
+                while sub + _RTA.size <= sub_end:
+                    sub_length, sub_kind = _RTA.unpack_from(view, sub)
+                    if sub_kind == _TCA_STATS_BASIC:
+                        basic = _BASIC.unpack_from(view, sub + _RTA.size)
+                    elif sub_kind == _TCA_STATS_QUEUE:
+                        queue = _QUEUE.unpack_from(view, sub + _RTA.size)
+                    sub += (sub_length + 3) & ~3
+            pos += (length + 3) & ~3
+        if basic is not None and queue is not None:
+            out[slot] = basic + queue
+
+
+def bottleneck_devices(net, prefix: str = "") -> list:
+    """Interface names of the s1 -- s2 link, s1 side (forward direction) first."""
+    link = net.linksBetween(net[f"{prefix}s1"], net[f"{prefix}s2"])[0]
+    intfs = (link.intf1, link.intf2) if link.intf1.node.name == f"{prefix}s1" else (link.intf2, link.intf1)
+    return [intf.name for intf in intfs]
+
+
+class QueueSampler:
+    """Background sampler writing SAMPLE_DTYPE records of the given (root namespace) interfaces."""
+
+    def __init__(self, devices: list, out_dir: str, interval_ms: float = DEFAULT_INTERVAL_MS):
+        self.devices = devices
+        self.out_dir = out_dir
+        self.interval = interval_ms / 1e3
+        self.clients_started = None
+        self.samples = 0
+        self.cpu_s = 0.0
+        self.wall_s = 0.0
+        self._stats = QdiscStats([socket.if_nametoindex(name) for name in devices])
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self) -> None:
+        records = np.zeros(FLUSH_RECORDS, dtype=SAMPLE_DTYPE)
+        n = 0
+        cpu0 = time.thread_time()
+        wall0 = time.monotonic()
+        next_t = wall0
+        with open(os.path.join(self.out_dir, SAMPLES), "wb") as file:
+            while not self._stop.is_set():
+                t = time.time()
+                for slot, values in self._stats.dump().items():
+                    records[n] = (t, slot) + values
+                    n += 1
+                    if n == FLUSH_RECORDS:
+                        file.write(records.tobytes())
+                        n = 0
+                self.samples += 1
+                # fixed rate: the next sample is due one interval after the previous due time
+                next_t += self.interval
+                self._stop.wait(max(next_t - time.monotonic(), 0))
+            file.write(records[:n].tobytes())
+        self.cpu_s = time.thread_time() - cpu0
+        self.wall_s = time.monotonic() - wall0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="queue sampler", daemon=True)
+        self._thread.start()
+
+    def mark_clients_started(self) -> None:
+        """Reference time for the iperf3 interval times (call right before the clients start)."""
+        self.clients_started = time.time()
+
+    def stop(self) -> dict:
+        """Stops sampling, writes the sidecar and returns it."""
+        self._stop.set()
+        self._thread.join()
+        self._stats.close()
+        info = {
+            "devices": self.devices,
+            "interval_ms": self.interval * 1e3,
+            "clients_started": self.clients_started,
+            "samples": self.samples,
+            "cpu_share": self.cpu_s / self.wall_s if self.wall_s else 0.0,
+        }
+        with open(os.path.join(self.out_dir, SIDECAR), "w") as file:
+            json.dump(info, file, indent=1)
+        return info
+
+
+def load_samples(directory: str) -> tuple:
+    """(records, sidecar dict) of a run directory, or (None, None) if it has no queue samples."""
+    path = os.path.join(directory, SAMPLES)
+    if not os.path.exists(path) or not os.path.exists(os.path.join(directory, SIDECAR)):
+        return None, None
+    with open(os.path.join(directory, SIDECAR), "r") as file:
+        info = json.load(file)
+    return np.fromfile(path, dtype=SAMPLE_DTYPE), info
+
+
+class Aligner:
+    """Maps queue samples onto iperf3 intervals given in seconds since the client start."""
+
+    def __init__(self, samples: np.ndarray, anchor: float):
+        self.anchor = anchor
+        self.fwd = samples[samples["dev"] == 0]
+        self.rev = samples[samples["dev"] == 1]
+
+    @classmethod
+    def for_log(cls, json_path: str, header: dict):
+        """Aligner for an iperf3 client log (None if its directory has no queue samples)."""
+        samples, info = load_samples(os.path.dirname(json_path))
+        if samples is None:
+            return None
+        anchor = info.get("clients_started")
+        if anchor is None:
+            # whole seconds only
+            anchor = header.get("start", {}).get("timestamp", {}).get("timesecs", 0)
+        return cls(samples, anchor)
+
+    @staticmethod
+    def _window(series: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> tuple:
+        """Index range [a, b) of the samples inside every interval [lo, hi)."""
+        t = series["t"]
+        return np.searchsorted(t, lo), np.searchsorted(t, hi)
+
+    @staticmethod
+    def _mean(values: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        cum = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+        count = b - a
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(count > 0, (cum[b] - cum[a]) / np.maximum(count, 1), np.nan)
+
+    @staticmethod
+    def _delta(values: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        # counter increase between the last sample before and the last sample inside the interval
+        if len(values) == 0:
+            return np.full(len(a), np.nan)
+        v = values.astype(np.float64)
+        before = np.where(a > 0, v[np.maximum(a - 1, 0)], v[0])
+        last = v[np.maximum(b - 1, 0)]
+        return np.where(b > a, last - before, np.nan)
+
+    def columns(self, times: list) -> np.ndarray:
+        """QUEUE_COLUMNS of intervals given as (start, end) seconds, shape (intervals, len(QUEUE_COLUMNS))."""
+        bounds = np.asarray(times, dtype=np.float64).reshape(-1, 2) + self.anchor
+        lo, hi = bounds[:, 0], bounds[:, 1]
+        out = np.full((len(bounds), len(QUEUE_COLUMNS)), np.nan)
+        a, b = self._window(self.fwd, lo, hi)
+        if len(self.fwd):
+            backlog = self.fwd["backlog"].astype(np.float64)
+            out[:, 0] = self._mean(backlog, a, b)
+            has = b > a
+            if has.any():
+                out[has, 1] = [backlog[i:j].max() for i, j in zip(a[has], b[has])]
+            out[:, 2] = self._mean(self.fwd["qlen"].astype(np.float64), a, b)
+            out[:, 3] = self._delta(self.fwd["drops"], a, b)
+            out[:, 4] = self._delta(self.fwd["overlimits"], a, b)
+        if len(self.rev):
+            ra, rb = self._window(self.rev, lo, hi)
+            out[:, 5] = self._mean(self.rev["backlog"].astype(np.float64), ra, rb)
+        return out
@@ -0,0 +1,246 @@
+#! /usr/bin/env python3
+"""
+Content-addressed cache of dumbbell run results.
+
+A run is identified by the SHA-256 of
+- the normalized DumbbellTopo kwargs and experiment config (Mininet._exp_cfg;
+  units are normalized, so "10ms" == "10.0ms" and "50M" == "50000000"),
+- the tool versions (iperf3, ping, Open vSwitch, Mininet, kernel) and the TCP
+  congestion control / default qdisc sysctls,
+- the qdiscs actually installed on the bottleneck link (tc qdisc show, counters
+  removed),
+plus the replicate number. Options that change neither the traffic nor the
+files a run writes (out_dir, grace_s, run_index) are not part of the key; of
+telemetry_port only whether live telemetry is on counts, as it replaces the
+client logs with iperf3_*.jsonl and live_*.csv (columns set by feature_windows).
+
+An entry holds the output files of one replicate as the run wrote them (iperf3
+client and server logs, ping transcripts, queue samples, fidelity report, ...;
+everything but the manifests), so a replicate served from the cache converts
+(json_to_csv.py, train.py --where) exactly like a fresh one. Entries are indexed
+in SQLite with their size and last use; when the cache grows beyond its size cap,
+the least recently used entries are evicted.
+
+sweep.py uses the cache per grid point and replicate (--replicates N): cached
+replicates are copied into the point directory, only missing ones are run.
+
+Usage:
+    python3 result_cache.py list [--cache-dir result_cache]
+    python3 result_cache.py prune --max-gb 2
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+
+from units import bits_per_second, seconds
+
+
+CACHE_DIR = "result_cache"
+INDEX = "index.sqlite"
+DEFAULT_MAX_BYTES = 10 << 30
+KEY_VERSION = 3  # bumped whenever the key or the entry layout changes
+# files of a run directory that describe that particular run and are not stored
+NOT_STORED = ("manifest.json", "run_manifest.json")  # sweep.MANIFEST, run_index.RUN_MANIFEST
+# experiment options without influence on the measured traffic or the run's output files
+IGNORED = ("out_dir", "grace_s", "run_index")
+# tc statistics that change while traffic flows
+_TC_COUNTERS_RE = re.compile(r"\s+direct_packets_stat \d+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT NOT NULL,
+    replicate INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    config TEXT NOT NULL,
+    PRIMARY KEY (key, replicate)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+
+def normalize_config(topo: dict, cfg: dict) -> dict:
+    """Key-relevant part of the DumbbellTopo kwargs and experiment config, in canonical units."""
+    out = {}
+    for key, value in {**topo, **cfg}.items():
+        if key in IGNORED:
+            continue
+        if key.endswith("_delay"):
+            value = seconds(value)
+        elif key.endswith("_bw"):
+            value = float(value)
+        elif key == "offered_rate":
+            value = bits_per_second(value)
+        elif key == "telemetry_port":
+            key, value = "telemetry", bool(value)
+        out[key] = value
+    return out
+
+
+def _first_line(argv: list) -> str:
+    try:
+        proc = subprocess.run(argv, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        return "missing"
+    lines = (proc.stdout or proc.stderr).strip().splitlines()
+    return lines[0].strip() if lines else "unknown"
+
+
+@functools.lru_cache(maxsize=None)
+def tool_versions() -> dict:
+    """Versions of everything on the data path that can change the results (queried once per process)."""
+    from mininet.net import VERSION as mininet_version
+
+    return {
+        "iperf3": _first_line(["iperf3", "--version"]),
+        "ping": _first_line(["ping", "-V"]),
+        "ovs": _first_line(["ovs-vsctl", "--version"]),
+        "mininet": mininet_version,
+        "kernel": os.uname().release,
+        "tcp_congestion_control": _first_line(["sysctl", "-n", "net.ipv4.tcp_congestion_control"]),
+        "default_qdisc": _first_line(["sysctl", "-n", "net.core.default_qdisc"]),
+    }
+
+
+def qdisc_settings(net) -> list:
+    """Installed qdiscs of both ends of the s1 -- s2 link (tc qdisc show without counters)."""
+    link = net.linksBetween(net["s1"], net["s2"])[0]
+    out = []
+    for intf in (link.intf1, link.intf2):
+        shown = intf.cmd(f"tc qdisc show dev {intf.name}")
+        # the interface name is part of every line and does not matter for the traffic
+        out += [_TC_COUNTERS_RE.sub("", line.replace(intf.name, "<dev>")).strip()
+                for line in shown.splitlines() if line.strip()]
+    return out
+
+
+def config_key(topo: dict, cfg: dict, versions: dict, qdiscs: list) -> str:
+    """Cache key of a configuration (all replicates of it share the key)."""
+    text = json.dumps({"version": KEY_VERSION, "config": normalize_config(topo, cfg),
+                       "tools": versions, "qdiscs": qdiscs}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, _, names in os.walk(path) for name in names)
+
+
+class ResultCache:
+    """Per-replicate result entries below root, LRU-evicted beyond max_bytes."""
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, INDEX))
+        self.conn.executescript(SCHEMA)
+
+    def _path(self, key: str, replicate: int) -> str:
+        return os.path.join(self.root, key[:2], key, f"r{replicate:03d}")
+
+    def replicates(self, key: str) -> list:
+        """Replicate numbers cached for key."""
+        rows = self.conn.execute("SELECT replicate FROM entries WHERE key = ? ORDER BY replicate", (key,))
+        return [replicate for (replicate,) in rows]
+
+    def fetch(self, key: str, replicate: int, directory: str) -> bool:
+        """Copies a cached replicate into directory. Returns False if it is not cached."""
+        path = self._path(key, replicate)
+        if replicate not in self.replicates(key) or not os.path.isdir(path):
+            return False
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(path):
+            shutil.copy2(os.path.join(path, name), os.path.join(directory, name))
+        with self.conn:
+            self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ? AND replicate = ?",
+                              (time.time(), key, replicate))
+        return True
+
+    def store(self, key: str, replicate: int, directory: str, config: dict) -> int:
+        """
+        Stores the output files of a finished run in directory (all files except
+        the manifests and hidden ones) as replicate of key. Returns the entry size.
+        """
+        path = self._path(key, replicate)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".tmp_")
+        try:
+            for name in os.listdir(directory):
+                source = os.path.join(directory, name)
+                if name in NOT_STORED or name.startswith(".") or not os.path.isfile(source):
+                    continue
+                shutil.copy2(source, os.path.join(tmp, name))
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        size = _dir_size(path)
+        now = time.time()
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                              (key, replicate, size, now, now, json.dumps(config, sort_keys=True)))
+        self.evict(keep=(key, replicate))
+        return size
+
+    def size(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self, keep: tuple = None) -> list:
+        """Removes least recently used entries until the cache fits max_bytes. Returns the removed (key, replicate)."""
+        removed = []
+        total = self.size()
+        rows = self.conn.execute("SELECT key, replicate, size FROM entries ORDER BY last_used").fetchall()
+        for key, replicate, size in rows:
+            if total <= self.max_bytes:
+                break
+            if (key, replicate) == keep:
+                continue
+            shutil.rmtree(self._path(key, replicate), ignore_errors=True)
+            with self.conn:
+                self.conn.execute("DELETE FROM entries WHERE key = ? AND replicate = ?", (key, replicate))
+            total -= size
+            removed.append((key, replicate))
+        return removed
+
+    def entries(self) -> list:
+        """(key, replicate count, bytes, last use, config) per cached configuration, most recent first."""
+        return self.conn.execute(
+            "SELECT key, COUNT(*), SUM(size), MAX(last_used), config FROM entries "
+            "GROUP BY key ORDER BY MAX(last_used) DESC").fetchall()
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Inspect or prune the dumbbell result cache")
+    p.add_argument("command", choices=("list", "prune"))
+    p.add_argument("--cache-dir", default=CACHE_DIR)
+    p.add_argument("--max-gb", type=float, default=DEFAULT_MAX_BYTES / 2**30, help="size cap for prune")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    cache = ResultCache(args.cache_dir, int(args.max_gb * 2**30))
+    if args.command == "prune":
+        removed = cache.evict()
+        print(f"[+] Evicted {len(removed)} entries, {cache.size() / 1e6:.1f} MB left")
+        return
+    for key, replicates, size, last_used, config in cache.entries():
+        used = time.strftime("%Y-%m-%d %H:%M", time.localtime(last_used))
+        print(f"{key[:16]}  {replicates:3d} replicates  {size / 1e6:8.1f} MB  {used}  {config}")
+    print(f"[+] {cache.size() / 1e6:.1f} MB in {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#! /usr/bin/env python3
+"""
+RTT predictor inference without the notebook.
+
+The model trained in DNN_Colab.ipynb is exported (last notebook cell) into one
+npz file holding the Dense layer weights, the StandardScaler parameters and the
+y_min / y_max of the target normalization:
+    W0, b0, ..., Wn, bn    kernel (in x out) and bias of every Dense layer
+    scaler_mean, scaler_scale
+    y_min, y_max
+    features               input column names, in training order
+Hidden layers use ReLU, the last one is linear (see the notebook model).
+
+The forward pass is plain NumPy (float32); the scaler is folded into the first
+layer, so a prediction is n matrix products plus the denormalization. Only
+numpy is imported, which keeps startup well below a second. --backend tf runs
+a saved Keras model through TensorFlow instead (same scaler/normalization file).
+
+The server listens on a Unix socket. Requests that queue up while a batch is
+evaluated are combined into the next one (up to --max-batch rows); --max-wait-ms
+additionally holds a batch back for late requests.
+Wire format (little endian):
+    request:  uint32 rows, uint32 features, rows x features float32
+    response: uint32 rows, rows float32 (RTT in the unit of the training data, µs)
+    error:    uint32 0xffffffff, uint32 length, UTF-8 message (the connection stays usable)
+
+Usage:
+    python3 rtt_inference.py serve rtt_model.npz --socket /tmp/rtt.sock
+    python3 rtt_inference.py predict rtt_model.npz data.csv
+    python3 rtt_inference.py bench [rtt_model.npz]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+
+SOCKET_PATH = "/tmp/rtt_inference.sock"
+MAX_BATCH = 4096
+MAX_WAIT_MS = 0.0  # extra wait for more requests; queued ones are batched anyway
+HEADER = struct.Struct("<II")
+COUNT = struct.Struct("<I")
+ERROR = 0xFFFFFFFF  # row count of an error response
+# architecture of the notebook model, used for benchmarks without an exported file
+NOTEBOOK_LAYERS = (256, 128, 64, 64, 32, 1)
+NOTEBOOK_FEATURES = ("throughput", "retransmits", "snd_cwnd", "snd_wnd", "rttvar")
+
+
+def save_model(path: str, weights: list, biases: list, mean, scale, y_min: float, y_max: float,
+               features: list) -> None:
+    """Writes the export format read by RttModel.load (same keys as the notebook export cell)."""
+    layers = {f"W{i}": np.asarray(w) for i, w in enumerate(weights)}
+    layers.update({f"b{i}": np.asarray(b) for i, b in enumerate(biases)})
+    np.savez(path, **layers, scaler_mean=np.asarray(mean), scaler_scale=np.asarray(scale),
+             y_min=y_min, y_max=y_max, features=np.array(features, dtype=str))
+
+
+class RttModel:
+    """NumPy forward pass of the exported notebook model."""
+
+    def __init__(self, weights: list, biases: list, mean: np.ndarray, scale: np.ndarray,
+                 y_min: float, y_max: float, features: list):
+        # fold the StandardScaler into the first layer: ((x - mean) / scale) @ W + b
+        first = weights[0] / scale[:, None]
+        self.weights = [first.astype(np.float32)] + [w.astype(np.float32) for w in weights[1:]]
+        bias0 = biases[0] - (mean / scale) @ weights[0]
+        self.biases = [bias0.astype(np.float32)] + [b.astype(np.float32) for b in biases[1:]]
+        self.y_min = float(y_min)
+        self.y_range = float(y_max) - float(y_min)
+        self.features = list(features)
+
+    @classmethod
+    def load(cls, path: str) -> "RttModel":
+        with np.load(path) as data:
+            n_layers = sum(1 for name in data.files if name.startswith("W"))
+            return cls([data[f"W{i}"] for i in range(n_layers)], [data[f"b{i}"] for i in range(n_layers)],
+                       data["scaler_mean"], data["scaler_scale"], data["y_min"], data["y_max"],
+                       [str(name) for name in data["features"]])
+
+    @classmethod
+    def random(cls, seed: int = 0) -> "RttModel":
+        """Untrained model with the notebook architecture (benchmarks)."""
+        rng = np.random.default_rng(seed)
+        sizes = (len(NOTEBOOK_FEATURES),) + NOTEBOOK_LAYERS
+        weights = [rng.normal(0, (2 / n) ** 0.5, (n, m)) for n, m in zip(sizes, sizes[1:])]
+        biases = [np.zeros(m) for m in sizes[1:]]
+        n = len(NOTEBOOK_FEATURES)
+        return cls(weights, biases, np.zeros(n), np.ones(n), 0.0, 1.0, NOTEBOOK_FEATURES)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """x: (rows, features) in the training column order. Returns (rows,) RTT predictions."""
+        h = np.asarray(x, dtype=np.float32)
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            h = h @ w
+            h += b
+            if i < last:
+                np.maximum(h, 0, out=h)
+        return h[:, 0] * self.y_range + self.y_min
+
+
+class KerasModel:
+    """Same interface, evaluated by TensorFlow (--backend tf)."""
+
+    def __init__(self, model_path: str, params_path: str):
+        import tensorflow as tf  # only this backend needs TensorFlow
+
+        self.model = tf.keras.models.load_model(model_path)
+        with np.load(params_path) as data:
+            self.mean = data["scaler_mean"].astype(np.float32)
+            self.scale = data["scaler_scale"].astype(np.float32)
+            self.y_min = float(data["y_min"])
+            self.y_range = float(data["y_max"]) - self.y_min
+            self.features = [str(name) for name in data["features"]]
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        scaled = (np.asarray(x, dtype=np.float32) - self.mean) / self.scale
+        return self.model(scaled, training=False).numpy()[:, 0] * self.y_range + self.y_min
+
+
+class BatchingServer:
+    """Unix socket server that evaluates concurrent requests as micro-batches."""
+
+    def __init__(self, model, path: str = SOCKET_PATH, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS):
+        self.model = model
+        self.path = path
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1e3
+        self.queue = None
+        self.batches = 0
+        self.rows = 0
+
+    async def _handle(self, reader, writer) -> None:
+        n_features = len(self.model.features)
+        try:
+            while True:
+                rows, features = HEADER.unpack(await reader.readexactly(HEADER.size))
+                payload = await reader.readexactly(rows * features * 4)
+                if features != n_features:
+                    self._error(writer, f"expected {n_features} features, got {features}")
+                    await writer.drain()
+                    continue
+                x = np.frombuffer(payload, dtype="<f4").reshape(rows, features)
+                done = asyncio.get_running_loop().create_future()
+                await self.queue.put((x, done))
+                try:
+                    y = await done
+                except Exception as e:
+                    self._error(writer, f"prediction failed: {e!r}")
+                else:
+                    writer.write(COUNT.pack(len(y)) + y.astype("<f4").tobytes())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _error(writer, message: str) -> None:
+        data = message.encode()
+        writer.write(COUNT.pack(ERROR) + COUNT.pack(len(data)) + data)
+
+    async def _batcher(self) -> None:
+        while True:
+            pending = [await self.queue.get()]
+            rows = len(pending[0][0])
+            # everything that queued up while the last batch ran joins this one
+            while rows < self.max_batch and not self.queue.empty():
+                item = self.queue.get_nowait()
+                pending.append(item)
+                rows += len(item[0])
+            deadline = asyncio.get_running_loop().time() + self.max_wait
+            while rows < self.max_batch and self.max_wait > 0:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                rows += len(item[0])
+            try:
+                x = pending[0][0] if len(pending) == 1 else np.concatenate([item[0] for item in pending])
+                y = self.model.predict(x)
+            except Exception as e:
+                # fail this batch only, the batcher keeps serving
+                for part, done in pending:
+                    if not done.done():
+                        done.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += rows
+            start = 0
+            for part, done in pending:
+                # a client that went away cancelled its future
+                if not done.done():
+                    done.set_result(y[start:start + len(part)])
+                start += len(part)
+
+    async def serve(self, ready: threading.Event = None) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+        server = await asyncio.start_unix_server(self._handle, self.path)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+class Client:
+    """Blocking client for BatchingServer."""
+
+    def __init__(self, path: str = SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        x = np.ascontiguousarray(x, dtype="<f4")
+        self.sock.sendall(HEADER.pack(*x.shape) + x.tobytes())
+        rows, = COUNT.unpack(self._recv(COUNT.size))
+        if rows == ERROR:
+            length, = COUNT.unpack(self._recv(COUNT.size))
+            raise ValueError(self._recv(length).decode())
+        return np.frombuffer(self._recv(rows * 4), dtype="<f4")
+
+    def _recv(self, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("server closed the connection")
+            buf += chunk
+        return bytes(buf)
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+def _percentile_ms(times: list, q: float) -> float:
+    return 1e3 * float(np.percentile(times, q))
+
+
+def benchmark(model, sizes=tuple(2 ** i for i in range(13)), budget_s: float = 0.5, clients=(1, 4, 16, 64),
+              rows_per_request: int = 1) -> None:
+    """
+    Rows/s and p99 latency per batch size, in-process and through the socket server,
+    then with several concurrent clients (threads), which the server combines into micro-batches.
+    """
+    rng = np.random.default_rng(0)
+    path = f"/tmp/rtt_inference_bench_{os.getpid()}.sock"
+    server = BatchingServer(model, path)
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(server.serve(ready)), daemon=True).start()
+    ready.wait()
+    client = Client(path)
+
+    print("batch,local_rows_per_s,local_p99_ms,socket_rows_per_s,socket_p99_ms")
+    for size in sizes:
+        x = rng.normal(size=(size, len(model.features))).astype(np.float32)
+        row = [str(size)]
+        for predict in (model.predict, client.predict):
+            times = []
+            t_end = time.perf_counter() + budget_s
+            while time.perf_counter() < t_end or len(times) < 20:
+                t0 = time.perf_counter()
+                predict(x)
+                times.append(time.perf_counter() - t0)
+            row += [f"{size * len(times) / sum(times):.0f}", f"{_percentile_ms(times, 99):.3f}"]
+        print(",".join(row), flush=True)
+    client.close()
+
+    # micro-batching only happens with requests from several clients at once
+    print("clients,rows_per_request,rows_per_s,p99_ms,rows_per_batch")
+    for n_clients in clients:
+        x = rng.normal(size=(rows_per_request, len(model.features))).astype(np.float32)
+        times = [[] for _ in range(n_clients)]
+        start = threading.Barrier(n_clients + 1)
+
+        def run(k):
+            own = Client(path)
+            start.wait()
+            t_end = time.perf_counter() + budget_s
+            while time.perf_counter() < t_end:
+                t0 = time.perf_counter()
+                own.predict(x)
+                times[k].append(time.perf_counter() - t0)
+            own.close()
+
+        threads = [threading.Thread(target=run, args=(k,)) for k in range(n_clients)]
+        for thread in threads:
+            thread.start()
+        batches, rows = server.batches, server.rows
+        start.wait()
+        t0 = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - t0
+        batches, rows = server.batches - batches, server.rows - rows
+        every = [t for own in times for t in own]
+        print(f"{n_clients},{rows_per_request},{rows / wall:.0f},{_percentile_ms(every, 99):.3f},"
+              f"{rows / max(batches, 1):.1f}", flush=True)
+    os.remove(path)
+
+
+def _load(args):
+    if args.backend == "tf":
+        return KerasModel(args.keras, args.model)
+    return RttModel.load(args.model)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="NumPy inference service for the RTT predictor")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    def common(q, model_required=True):
+        q.add_argument("model", nargs=None if model_required else "?", default=None,
+                       help="exported npz (weights, scaler, y_min/y_max)")
+        q.add_argument("--backend", choices=("numpy", "tf"), default="numpy")
+        q.add_argument("--keras", default=None, help="saved Keras model for --backend tf")
+
+    serve = sub.add_parser("serve", help="serve predictions on a Unix socket")
+    common(serve)
+    serve.add_argument("--socket", default=SOCKET_PATH)
+    serve.add_argument("--max-batch", type=int, default=MAX_BATCH, help="rows per micro-batch")
+    serve.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="time a request waits for others")
+
+    predict = sub.add_parser("predict", help="predict the RTT of every row of a dataset file")
+    common(predict)
+    predict.add_argument("dataset", help="csv/feather/parquet/npz file with the feature columns (see dataset_io.py)")
+
+    bench = sub.add_parser("bench", help="throughput and p99 latency for batch sizes 1..4096 and concurrent clients")
+    common(bench, model_required=False)
+    return p.parse_args()
+
+
+def main():
+    t0 = time.perf_counter()
+    args = parse_args()
+
+    if args.command == "bench":
+        model = _load(args) if args.model else RttModel.random()
+        print(f"[+] Model ready {time.perf_counter() - t0:.3f} s after start ({args.backend})")
+        benchmark(model)
+        return
+
+    model = _load(args)
+    print(f"[+] Model ready {time.perf_counter() - t0:.3f} s after start ({args.backend})")
+    if args.command == "serve":
+        server = BatchingServer(model, args.socket, args.max_batch, args.max_wait_ms)
+        print(f"[+] Serving on {args.socket}")
+        try:
+            asyncio.run(server.serve())
+        except KeyboardInterrupt:
+            print(f"[+] {server.rows} rows in {server.batches} batches")
+    else:
+        import dataset_io
+
+        columns, meta = dataset_io.load_dataset(args.dataset)
+        x = np.column_stack([columns[name] for name in model.features])
+        for value in model.predict(x).tolist():
+            print(value)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+#! /usr/bin/env python3
+"""
+Run manifests and a global SQLite index over them.
+
+Every run_scenario call writes run_manifest.json into its output directory:
+- config: the full Dumbbell.py options (argparse) and the experiment config,
+- topology: hosts, switches and every link with its shaping parameters,
+- started / finished timestamps, the run summary (timeouts, fidelity, ...),
+- tool versions (result_cache.tool_versions),
+- size and SHA-256 of every file of the run.
+Replicates sweep.py serves from the result cache get a manifest too.
+
+The index (one SQLite file, default run_index.sqlite) holds one row per run
+directory and one row per config option and file. Options are stored as text
+and, where possible, as a number in canonical units (delays in seconds, rates
+in bit/s), so "bottleneck_delay=10ms" matches 10.0ms and ranges work. With
+Dumbbell.py --run-index PATH every run adds itself; `scan` (re)indexes the
+manifests below a directory, e.g. an archive of older sweeps.
+
+Filters are KEY<op>VALUE with op one of = != < <= > >=; all must match:
+    python3 run_index.py scan sweep_folder
+    python3 run_index.py query bottleneck_bw=20 bottleneck_queue=200
+    python3 run_index.py query bottleneck_delay'>='10ms status=done --files 'iperf3_L*.json'
+    python3 run_index.py keys
+
+json_to_csv.py and train.py take the same filters (--where) to convert or
+train on a slice of the index.
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from units import bits_per_second, seconds
+
+
+RUN_MANIFEST = "run_manifest.json"
+SWEEP_MANIFEST = "manifest.json"  # sweep.py, rewritten after the run
+INDEX = "run_index.sqlite"
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 1 << 20
+_FILTER_RE = re.compile(r"([A-Za-z_][\w-]*)\s*(<=|>=|!=|=|<|>)\s*(.*)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    dir TEXT NOT NULL UNIQUE,
+    manifest_mtime_ns INTEGER NOT NULL,
+    started TEXT,
+    finished TEXT
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    text TEXT,
+    num REAL,
+    PRIMARY KEY (run_id, key)
+);
+CREATE INDEX IF NOT EXISTS params_num ON params (key, num);
+CREATE INDEX IF NOT EXISTS params_text ON params (key, text);
+CREATE TABLE IF NOT EXISTS files (
+    run_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (run_id, path)
+);
+"""
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def run_files(directory: str) -> dict:
+    """{relative path: {"size", "sha256"}} of the files of a run (nested runs and hidden entries excluded)."""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(directory):
+        # a nested directory with its own manifest is another run (sweep.py rep_NN)
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(".")
+                             and not os.path.exists(os.path.join(dirpath, d, RUN_MANIFEST)))
+        for name in sorted(filenames):
+            if name.startswith(".") or name in (RUN_MANIFEST, SWEEP_MANIFEST):
+                continue
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, directory).replace(os.sep, "/")
+            files[rel] = {"size": os.path.getsize(path), "sha256": _sha256(path)}
+    return files
+
+
+def topology(net) -> dict:
+    """Nodes and links of a network, with the shaping parameters of both link ends."""
+    links = []
+    for link in net.links:
+        links.append({
+            "node1": link.intf1.node.name, "node2": link.intf2.node.name,
+            "intf1": link.intf1.name, "intf2": link.intf2.name,
+            "params1": dict(link.intf1.params), "params2": dict(link.intf2.params),
+        })
+    return {"hosts": [host.name for host in net.hosts], "switches": [switch.name for switch in net.switches],
+            "links": links}
+
+
+def write_manifest(out_dir: str, net, cfg: dict, args: dict = None, summary: dict = None,
+                   started: datetime = None) -> dict:
+    """
+    Writes run_manifest.json for a finished run in out_dir and adds it to the
+    index cfg["run_index"] if set. Returns the manifest.
+    """
+    # result_cache imports json_to_csv, which imports this module
+    import result_cache
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "run_id": uuid.uuid4().hex,
+        "started": (started or datetime.now()).isoformat(timespec="milliseconds"),
+        "finished": datetime.now().isoformat(timespec="milliseconds"),
+        "config": {"args": dict(args or {}), "experiment": dict(cfg)},
+        "topology": topology(net),
+        "summary": summary or {},
+        "tools": result_cache.tool_versions(),
+        "files": run_files(out_dir),
+    }
+    path = os.path.join(out_dir, RUN_MANIFEST)
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file, indent=1, default=str)
+    os.replace(path + ".tmp", path)
+    if cfg.get("run_index"):
+        with RunIndex(cfg["run_index"]) as index:
+            index.add(path)
+    return manifest
+
+
+def reindex(directory: str, index_path: str) -> None:
+    """Indexes the run of a directory again (after its sweep manifest changed), if it has a run manifest."""
+    path = os.path.join(directory, RUN_MANIFEST)
+    if index_path and os.path.exists(path):
+        with RunIndex(index_path) as index:
+            index.add(path)
+
+
+def _mtime_ns(directory: str) -> int:
+    # the sweep manifest carries the status and changes after the run manifest
+    return max(os.stat(os.path.join(directory, name)).st_mtime_ns for name in (RUN_MANIFEST, SWEEP_MANIFEST)
+               if os.path.exists(os.path.join(directory, name)))
+
+
+def _number(key: str, value):
+    """Canonical numeric value of an option (None if it is not a number)."""
+    if isinstance(value, bool):
+        return float(value)
+    try:
+        if key.endswith("delay"):
+            return seconds(value)
+        if key.endswith("rate"):
+            return bits_per_second(value)
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value) -> str:
+    return value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
+
+
+def manifest_params(manifest: dict, status: str = None) -> dict:
+    """Flat {key: value} of a manifest as indexed: experiment config, overridden by the command line options."""
+    params = {**manifest["config"].get("experiment", {}), **manifest["config"].get("args", {})}
+    summary = manifest.get("summary", {})
+    params["timed_out"] = bool(summary.get("timed_out"))
+    if "fidelity" in summary:
+        params["faithful"] = summary["fidelity"].get("ok", True)
+    params["cached"] = bool(summary.get("cached"))
+    params["status"] = status or "done"
+    return params
+
+
+def parse_filter(text: str) -> tuple:
+    """(key, op, value) of a KEY<op>VALUE filter; dashes in KEY are read as underscores."""
+    m = _FILTER_RE.fullmatch(text.strip())
+    if m is None:
+        raise argparse.ArgumentTypeError(f"expected KEY<op>VALUE with op one of = != < <= > >=, got {text!r}")
+    key, op, value = m.groups()
+    return key.replace("-", "_"), op, value
+
+
+class RunIndex:
+    """SQLite index of run manifests."""
+
+    def __init__(self, path: str = INDEX):
+        self.path = path
+        # parallel_sweep.py workers add their runs concurrently
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def add(self, manifest_path: str) -> str:
+        """(Re)indexes one manifest. Returns its run ID."""
+        directory = os.path.abspath(os.path.dirname(manifest_path))
+        mtime_ns = _mtime_ns(directory)
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+        status = None
+        sweep_manifest = os.path.join(directory, SWEEP_MANIFEST)
+        if os.path.exists(sweep_manifest):
+            with open(sweep_manifest, "r") as file:
+                status = json.load(file).get("status")
+        run_id = manifest["run_id"]
+        params = manifest_params(manifest, status)
+        with self.conn:
+            self._remove(directory)
+            self.conn.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?)",
+                              (run_id, directory, mtime_ns, manifest.get("started"), manifest.get("finished")))
+            self.conn.executemany("INSERT INTO params VALUES (?, ?, ?, ?)",
+                                  [(run_id, key, _text(value), _number(key, value)) for key, value in params.items()])
+            self.conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?)",
+                                  [(run_id, rel, info["size"], info["sha256"])
+                                   for rel, info in manifest.get("files", {}).items()])
+        return run_id
+
+    def _remove(self, directory: str) -> None:
+        for (run_id,) in self.conn.execute("SELECT run_id FROM runs WHERE dir = ?", (directory,)).fetchall():
+            for table in ("runs", "params", "files"):
+                self.conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+
+    def scan(self, root: str) -> tuple:
+        """
+        Indexes every manifest below root whose file changed since it was indexed
+        and drops the runs below root whose manifest is gone.
+        Returns (manifests found, (re)indexed, removed).
+        """
+        root = os.path.abspath(root)
+        known = dict(self.conn.execute("SELECT dir, manifest_mtime_ns FROM runs WHERE dir = ? OR dir LIKE ?",
+                                       (root, root.rstrip(os.sep) + os.sep + "%")).fetchall())
+        found = updated = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            if RUN_MANIFEST not in filenames:
+                continue
+            found += 1
+            path = os.path.join(dirpath, RUN_MANIFEST)
+            if known.pop(os.path.abspath(dirpath), None) != _mtime_ns(dirpath):
+                self.add(path)
+                updated += 1
+        with self.conn:
+            for directory in known:
+                self._remove(directory)
+        return found, updated, len(known)
+
+    def query(self, filters: list) -> list:
+        """(run ID, directory) of the runs matching every (key, op, value) filter, oldest first."""
+        clauses = []
+        values = []
+        for key, op, value in filters:
+            num = _number(key, value)
+            if num is not None:
+                clauses.append(f"run_id IN (SELECT run_id FROM params WHERE key = ? AND num {op} ?)")
+                values += [key, num]
+            elif op in ("=", "!="):
+                clauses.append(f"run_id IN (SELECT run_id FROM params WHERE key = ? AND text {op} ?)")
+                values += [key, value]
+            else:
+                raise ValueError(f"{key}{op}{value}: ordering needs a number")
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return self.conn.execute(f"SELECT run_id, dir FROM runs{where} ORDER BY started, dir", values).fetchall()
+
+    def files(self, run_ids: list, pattern: str = None) -> list:
+        """Absolute paths of the files of some runs, optionally only those whose name matches a glob pattern."""
+        paths = []
+        for run_id in run_ids:
+            rows = self.conn.execute("SELECT runs.dir, files.path FROM files JOIN runs USING (run_id) "
+                                     "WHERE run_id = ? ORDER BY files.path", (run_id,))
+            paths += [os.path.join(directory, rel) for directory, rel in rows
+                      if pattern is None or fnmatch.fnmatch(os.path.basename(rel), pattern)]
+        return paths
+
+    def keys(self) -> list:
+        """(key, distinct values, runs) per indexed option."""
+        return self.conn.execute("SELECT key, COUNT(DISTINCT text), COUNT(*) FROM params GROUP BY key "
+                                 "ORDER BY key").fetchall()
+
+
+def query_tree(index_path: str, filters: list) -> tuple:
+    """
+    (root, run directories relative to root) of the runs of an index matching the
+    filters, as input for json_to_csv.convert_tree. root is a proper parent of
+    every run, so the runs keep their names in the dataset.
+    """
+    with RunIndex(index_path) as index:
+        dirs = [directory for _, directory in index.query(filters)]
+    if not dirs:
+        raise LookupError(f"No runs in {index_path} match {' '.join(k + op + v for k, op, v in filters)}")
+    root = os.path.commonpath(dirs)
+    if root in dirs:
+        root = os.path.dirname(root)
+    return root, [os.path.relpath(directory, root) for directory in dirs]
+
+
+def parse_args():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--index", default=INDEX, help="SQLite index file")
+    p = argparse.ArgumentParser(description="Index run manifests and query them by parameter")
+    sub = p.add_subparsers(dest="command", required=True)
+    scan = sub.add_parser("scan", parents=[common], help="index the manifests below some directories")
+    scan.add_argument("roots", nargs="+")
+    query = sub.add_parser("query", parents=[common], help="run directories (or files) of the runs matching every filter")
+    query.add_argument("filters", nargs="*", type=parse_filter, metavar="KEY<op>VALUE")
+    query.add_argument("--files", nargs="?", const="*", default=None, metavar="GLOB",
+                       help="print the files of the runs instead, optionally only names matching GLOB")
+    query.add_argument("--json", action="store_true", help="print run ID, directory and files as JSON")
+    sub.add_parser("keys", parents=[common], help="indexed option names")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    with RunIndex(args.index) as index:
+        if args.command == "scan":
+            for root in args.roots:
+                t0 = time.perf_counter()
+                found, updated, removed = index.scan(root)
+                print(f"[+] {root}: {found} manifests, {updated} (re)indexed, {removed} removed "
+                      f"in {time.perf_counter() - t0:.2f} s")
+            return
+        if args.command == "keys":
+            for key, distinct, runs in index.keys():
+                print(f"{key:24s} {distinct:6d} values in {runs} runs")
+            return
+
+        t0 = time.perf_counter()
+        runs = index.query(args.filters)
+        if args.json:
+            print(json.dumps([{"run_id": run_id, "dir": directory, "files": index.files([run_id], args.files)}
+                              for run_id, directory in runs], indent=1))
+        else:
+            for line in (index.files([run_id for run_id, _ in runs], args.files) if args.files
+                         else [directory for _, directory in runs]):
+                print(line)
+        # stderr: stdout stays a plain list of paths for other tools
+        print(f"[+] {len(runs)} runs in {(time.perf_counter() - t0) * 1e3:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#! /usr/bin/env python3
+"""
+Headless parameter sweep over the dumbbell topology.
+
+The network is built and started once and kept warm (fast_net.WarmNetwork):
+for every grid point the links are reshaped in place, and before every run it is
+reset to a clean state; scenario 1 is run without the CLI.
+Each point gets its own output directory with a manifest.json; points whose
+manifest says "done" are skipped, so an interrupted sweep can be resumed.
+Runs that fail the fidelity check (fidelity.py) are marked "rejected" instead
+with --reject-unfaithful in the grid base, and run again on the next resume.
+
+Grid file (JSON), keys are the Dumbbell.py option names (dashes or underscores):
+    {
+      "base": {"duration": 30, "n_left": 3, "n_right": 3},
+      "grid": {
+        "bottleneck_bw": [10, 20, 50],
+        "bottleneck_delay": ["5ms", "20ms"],
+        "bottleneck_queue": [50, 200],
+        "parallel": [1, 3],
+        "rate": ["50M"]
+      }
+    }
+Only the link parameters and the traffic options may vary per point; the
+topology size is fixed for the whole sweep ("base").
+
+With --replicates N every point is run N times (point_xxxx/rep_NN). Results are
+looked up in a content-addressed cache first (result_cache.py): replicates of an
+identical configuration that were measured before, by this or an earlier sweep,
+are copied from the cache and only the missing ones are run.
+
+Usage:
+    sudo python3 sweep.py grid.json --out-dir sweep_folder
+    sudo python3 sweep.py grid.json --replicates 5 --cache-dir result_cache
+"""
+
+from mininet.log import lg
+
+from Dumbbell import DumbbellTopo, build_parser, exp_cfg, run_scenario, topo_kwargs
+from fast_net import WarmNetwork, reset_network
+
+import result_cache
+import run_index
+
+import argparse
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+
+
+# options that may change between points without rebuilding the network
+VARYING = ("access_bw", "access_delay", "access_queue", "bottleneck_bw", "bottleneck_delay", "bottleneck_queue",
+           "duration", "parallel", "rate")
+MANIFEST = "manifest.json"
+
+
+def _option(name: str) -> str:
+    return name.replace("-", "_")
+
+
+def load_grid(path: str) -> tuple:
+    """
+    Reads a grid file.
+    Returns (base, points): the fixed Dumbbell options and the list of per-point options.
+    """
+    with open(path, "r") as file:
+        spec = json.load(file)
+
+    defaults = vars(build_parser().parse_args([]))
+    base = dict(defaults)
+    for key, value in spec.get("base", {}).items():
+        key = _option(key)
+        if key not in defaults:
+            raise ValueError(f"Unknown option in base: {key}")
+        base[key] = value
+
+    grid = {_option(key): values for key, values in spec.get("grid", {}).items()}
+    for key, values in grid.items():
+        if key not in VARYING:
+            raise ValueError(f"{key} can not vary within a sweep (allowed: {', '.join(VARYING)})")
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"Grid values of {key} must be a non-empty list")
+
+    keys = list(grid)
+    points = [dict(zip(keys, combo)) for combo in itertools.product(*(grid[key] for key in keys))]
+    return base, points
+
+
+def point_dir(out_dir: str, index: int, point: dict) -> str:
+    label = "_".join(f"{key}-{value}" for key, value in point.items())
+    return os.path.join(out_dir, f"point_{index:04d}" + (f"_{label}" if label else ""))
+
+
+def replicate_dir(directory: str, replicate: int, replicates: int) -> str:
+    # a single replicate keeps the flat layout of earlier sweeps
+    return directory if replicates == 1 else os.path.join(directory, f"rep_{replicate:02d}")
+
+
+def read_manifest(directory: str) -> dict:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def write_manifest(directory: str, manifest: dict) -> None:
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def run_sweep(base: dict, points: list, out_dir: str, replicates: int = 1,
+              cache: result_cache.ResultCache = None) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    args = argparse.Namespace(**base)
+
+    t0 = time.perf_counter()
+    warm = WarmNetwork(DumbbellTopo, autoSetMacs=True)
+    net = warm.get(**topo_kwargs(args))
+    build_s = time.perf_counter() - t0
+    print(f"[+] Network built and started in {build_s:.2f} s")
+
+    setup_times = []
+    runs = cached = 0
+    try:
+        for index, point in enumerate(points):
+            directory = point_dir(out_dir, index, point)
+            todo = [r for r in range(replicates)
+                    if read_manifest(replicate_dir(directory, r, replicates)).get("status") != "done"]
+            if not todo:
+                print(f"[+] Point {index + 1}/{len(points)} already done, skipping")
+                continue
+
+            params = argparse.Namespace(**{**base, **point, "out_dir": directory})
+            print(f"[+] Point {index + 1}/{len(points)}: {point}")
+
+            t0 = time.perf_counter()
+            net = warm.get(**topo_kwargs(params))
+            setup_s = time.perf_counter() - t0
+            setup_times.append(setup_s)
+
+            key = None
+            if cache is not None:
+                key = result_cache.config_key(topo_kwargs(params), exp_cfg(params), result_cache.tool_versions(),
+                                              result_cache.qdisc_settings(net))
+
+            for i, replicate in enumerate(todo):
+                run_dir = replicate_dir(directory, replicate, replicates)
+                run_params = argparse.Namespace(**{**vars(params), "out_dir": run_dir})
+                os.makedirs(run_dir, exist_ok=True)
+                manifest = {
+                    "index": index,
+                    "point": point,
+                    "replicate": replicate,
+                    "config": vars(run_params),
+                    "setup_s": setup_s,
+                    "cache_key": key,
+                    "started": datetime.now().isoformat(timespec="seconds"),
+                    "status": "running",
+                }
+
+                if cache is not None and cache.fetch(key, replicate, run_dir):
+                    print(f"[+] Replicate {replicate + 1}/{replicates} served from the cache")
+                    cached += 1
+                    manifest["cached"] = True
+                    run_index.write_manifest(run_dir, net, exp_cfg(run_params), vars(run_params),
+                                             {"cached": True, "cache_key": key})
+                else:
+                    write_manifest(run_dir, manifest)
+                    if i:
+                        reset_network(net)
+                    manifest.update(run_scenario(net, exp_cfg(run_params), vars(run_params)))
+                    runs += 1
+                    faithful = manifest.get("fidelity", {}).get("ok", True)
+                    if not faithful and params.reject_unfaithful:
+                        print(f"[!] Replicate {replicate + 1}/{replicates} rejected: {manifest['fidelity']['flags']}")
+                        manifest["status"] = "rejected"
+                        write_manifest(run_dir, manifest)
+                        run_index.reindex(run_dir, params.run_index)
+                        continue
+                    # runs with killed flows are incomplete and not worth reusing
+                    if cache is not None and not manifest["timed_out"] and faithful:
+                        cache.store(key, replicate, run_dir, result_cache.normalize_config(
+                            topo_kwargs(run_params), exp_cfg(run_params)))
+
+                manifest["finished"] = datetime.now().isoformat(timespec="seconds")
+                manifest["files"] = sorted(name for name in os.listdir(run_dir)
+                                           if name != MANIFEST and not name.startswith("."))
+                manifest["status"] = "done"
+                write_manifest(run_dir, manifest)
+                run_index.reindex(run_dir, params.run_index)
+    finally:
+        warm.close()
+
+    if setup_times:
+        print(f"[+] Per-point setup: {1000 * sum(setup_times) / len(setup_times):.1f} ms on average "
+              f"(full network build: {1000 * build_s:.0f} ms)")
+    if cache is not None:
+        print(f"[+] {runs} runs, {cached} replicates from the cache ({cache.size() / 1e6:.1f} MB cached)")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Headless parameter sweep over the Mininet dumbbell")
+    p.add_argument("grid", help="Grid file (JSON), see the module docstring")
+    p.add_argument("--out-dir", type=str, default="sweep_folder", help="One sub-directory per grid point is created here")
+    p.add_argument("--dry-run", default=False, action="store_true", help="Only list the grid points")
+    p.add_argument("--replicates", type=int, default=1, help="Runs per grid point")
+    p.add_argument("--cache-dir", type=str, default=result_cache.CACHE_DIR, help="Result cache (see result_cache.py)")
+    p.add_argument("--cache-max-gb", type=float, default=result_cache.DEFAULT_MAX_BYTES / 2**30,
+                   help="Size cap of the result cache, least recently used entries are evicted")
+    p.add_argument("--no-cache", default=False, action="store_true", help="Always run, do not read or fill the cache")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    lg.setLogLevel("info")
+    base, points = load_grid(args.grid)
+    print(f"[+] {len(points)} grid points")
+    if args.dry_run:
+        for index, point in enumerate(points):
+            for replicate in range(args.replicates):
+                print(f"    {replicate_dir(point_dir(args.out_dir, index, point), replicate, args.replicates)}")
+        return
+    cache = None if args.no_cache else result_cache.ResultCache(args.cache_dir, int(args.cache_max_gb * 2**30))
+    run_sweep(base, points, args.out_dir, args.replicates, cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Live telemetry for running dumbbell flows.
+
+Instead of writing iperf3/ping output to files and converting it after the run,
+the clients are started on pipes (iperf3 --json-stream, line-buffered ping) and
+read with asyncio as the data arrives:
+- every iperf3 interval becomes a record with the json_to_csv.py columns,
+- every ping reply becomes a record with icmp_seq, ttl and rtt_ms.
+
+Records are kept in an in-memory ring buffer that is served on localhost:
+    GET /records?since=<seq>[&kind=iperf3|ping][&flow=L1_to_R1_p5201]
+                    (poll on with since=<next> of the reply)
+    GET /status
+    GET /stop       (ends the run early, e.g. for a bad run)
+
+The converted rows are also written per flow (live_<flow>.csv, same columns as
+json_to_csv.py), so no separate conversion pass is needed. The raw lines are
+kept next to them (iperf3_<flow>.jsonl, ping_<flow>.txt). With cfg
+"feature_windows" the rolling-window features of features.py are appended,
+updated per interval like json_to_csv.py --windows does for a whole log.
+
+iperf3 >= 3.17 is needed for --json-stream.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import re
+import time
+import urllib.parse
+from collections import deque
+
+import numpy as np
+
+import features
+import json_to_csv
+
+
+RING_SIZE = 100_000  # records kept for /records
+PING_REPLY_RE = re.compile(rb"icmp_seq=(\d+) ttl=(\d+) time=([\d.]+) ms")
+
+
+class RingBuffer:
+    """Bounded record buffer; every record gets an increasing sequence number 'seq'."""
+
+    def __init__(self, size: int = RING_SIZE):
+        self.records = deque(maxlen=size)
+        self.next_seq = 0
+
+    def append(self, record: dict) -> None:
+        record["seq"] = self.next_seq
+        self.next_seq += 1
+        self.records.append(record)
+
+    def since(self, seq: int, kind: str = None, flow: str = None, limit: int = 10_000) -> tuple:
+        """
+        Up to limit records newer than seq (oldest first), optionally filtered by kind and flow.
+        Returns (records, cursor): the seq of the last record returned, or the last seq scanned if
+        nothing matched. Polling again with since=cursor continues right after what was seen.
+        """
+        out = []
+        cursor = seq
+        # seqs are consecutive, so the first newer record is found by index; from there
+        # the records are scanned towards the newest one until limit records matched
+        start = max(seq + 1 - (self.next_seq - len(self.records)), 0)
+        for record in itertools.islice(self.records, start, None):
+            if (kind is None or record["kind"] == kind) and (flow is None or record["flow"] == flow):
+                out.append(record)
+                if len(out) == limit:
+                    break
+            cursor = record["seq"]
+        return out, out[-1]["seq"] if out else cursor
+
+
+class LiveRun:
+    """
+    Runs the client side of scenario 1 with live collection.
+    flows: (flow name, client host, server IP, port) tuples, see Dumbbell.client_flows.
+    """
+
+    def __init__(self, flows: list, cfg: dict, port: int, ring_size: int = RING_SIZE):
+        self.flows = flows
+        self.cfg = cfg
+        self.port = port
+        self.ring = RingBuffer(ring_size)
+        self.windows = tuple(cfg.get("feature_windows", ()))
+        self.columns = json_to_csv.column_names(windows=self.windows)
+        self.counts = {}
+        self.procs = {}
+        self.stop_event = None
+
+    def _host_exec(self, host, argv: list):
+        # same as Node.popen: run inside the host's namespaces via mnexec
+        return asyncio.create_subprocess_exec("mnexec", "-da", str(host.pid), *argv,
+                                              stdout=asyncio.subprocess.PIPE,
+                                              stderr=asyncio.subprocess.STDOUT)
+
+    async def _iperf3(self, flow: str, host, server_ip: str, port: int) -> None:
+        cfg = self.cfg
+        argv = ["iperf3", "-c", server_ip, "-p", str(port), "-t", str(cfg["duration_s"]),
+                "-P", str(cfg["parallel_streams"]), "-b", cfg["offered_rate"], "--json-stream"]
+        proc = self.procs[f"iperf3 {flow}"] = await self._host_exec(host, argv)
+        out_dir = cfg["out_dir"]
+        interval = 0
+        with open(os.path.join(out_dir, f"iperf3_{flow}.jsonl"), "wb") as raw, \
+                open(os.path.join(out_dir, f"live_{flow}.csv"), "w", newline="") as csv_out_file:
+            csv_out_file.write(json_to_csv.csv_header(windows=self.windows))
+            rolling = features.RollingFeatures(json_to_csv.column_names(), self.windows) if self.windows else None
+            async for line in proc.stdout:
+                raw.write(line)
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("event") != "interval":
+                    continue
+                data = event["data"]
+                for row in json_to_csv.batch_means([data]):
+                    if rolling is not None:
+                        row = np.hstack([row, rolling.transform(row)])
+                    row = row[0].tolist()
+                    csv_out_file.write(",".join(map(str, row)) + "\n")
+                    csv_out_file.flush()
+                    record = {"kind": "iperf3", "flow": flow, "interval": interval, "time": time.time(),
+                              "end": data["sum"]["end"] if "sum" in data else None}
+                    record.update(zip(self.columns, row))
+                    self.ring.append(record)
+                    self.counts[flow] = self.counts.get(flow, 0) + 1
+                    interval += 1
+        await proc.wait()
+
+    async def _ping(self, flow: str, host, server_ip: str) -> None:
+        argv = ["stdbuf", "-oL", "ping", "-i", "1", "-c", str(self.cfg["duration_s"]), server_ip]
+        proc = self.procs[f"ping {flow}"] = await self._host_exec(host, argv)
+        name = flow.rsplit("_p", 1)[0]
+        with open(os.path.join(self.cfg["out_dir"], f"ping_{name}.txt"), "wb") as raw:
+            async for line in proc.stdout:
+                raw.write(line)
+                m = PING_REPLY_RE.search(line)
+                if m is None:
+                    continue
+                self.ring.append({"kind": "ping", "flow": flow, "time": time.time(),
+                                  "icmp_seq": int(m.group(1)), "ttl": int(m.group(2)),
+                                  "rtt_ms": float(m.group(3))})
+        await proc.wait()
+
+    def _running(self) -> list:
+        return [name for name, proc in self.procs.items() if proc.returncode is None]
+
+    async def _handle(self, reader, writer) -> None:
+        """Minimal HTTP/1.0 JSON endpoint."""
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            url = urllib.parse.urlsplit(parts[1] if len(parts) > 1 else "/")
+            query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+            status = "200 OK"
+            if url.path == "/records":
+                records, cursor = self.ring.since(int(query.get("since", -1)), query.get("kind"), query.get("flow"))
+                body = {"next": cursor, "records": records}
+            elif url.path == "/status":
+                body = {"intervals": self.counts, "running": self._running(), "records": self.ring.next_seq}
+            elif url.path == "/stop":
+                self.stop_event.set()
+                body = {"stopping": self._running()}
+            else:
+                status = "404 Not Found"
+                body = {"error": f"unknown path {url.path}"}
+            payload = json.dumps(body).encode()
+            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except (ValueError, IndexError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _main(self, timeout: float) -> list:
+        self.stop_event = asyncio.Event()
+        server = await asyncio.start_server(self._handle, "127.0.0.1", self.port)
+        os.makedirs(self.cfg["out_dir"], exist_ok=True)
+        tasks = []
+        for flow, host, server_ip, port in self.flows:
+            tasks.append(asyncio.create_task(self._iperf3(flow, host, server_ip, port)))
+            tasks.append(asyncio.create_task(self._ping(flow, host, server_ip)))
+        print(f"[+] Started {len(self.flows)} client flows with live telemetry.")
+
+        flows_done = asyncio.gather(*tasks)
+        stopped = asyncio.create_task(self.stop_event.wait())
+        await asyncio.wait({flows_done, stopped}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if self.stop_event.is_set():
+            print("[!] Run stopped via /stop")
+
+        pending = self._running()
+        for name in pending:
+            self.procs[name].terminate()
+        await asyncio.gather(flows_done, return_exceptions=True)
+        stopped.cancel()
+        server.close()
+        await server.wait_closed()
+        return pending
+
+    def run(self, timeout: float) -> list:
+        """Runs until every flow finished, /stop was requested or timeout expired. Returns the killed processes."""
+        return asyncio.run(self._main(timeout))
@@ -0,0 +1,23 @@
+"""
+The per-interval throughput of the packet simulator is what crossed the
+bottleneck in that interval, so the streams together never exceed its rate.
+
+    python3 -m pytest FinalVersion/test_packet_sim.py
+"""
+
+import pytest
+
+import packet_sim
+
+
+@pytest.mark.parametrize("changes", [
+    {},
+    {"n_left": 1, "n_right": 1, "parallel": 1, "duration": 30},
+    {**packet_sim.FIRST_ATTEMPT_ACCESS, **packet_sim.FIRST_ATTEMPT_SCENARIOS[1], "duration": 30},
+])
+def test_summed_interval_throughput_never_exceeds_the_bottleneck(changes):
+    cfg = dict(packet_sim.SIM_DEFAULTS, **changes)
+    values, _ = packet_sim.simulate(cfg)
+    throughput = values[:, 0, :].sum(axis=1)
+    assert throughput.max() <= cfg["bottleneck_bw"] * 1e6
+    assert throughput.min() > 0
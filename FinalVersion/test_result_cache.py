@@ -0,0 +1,74 @@
+"""
+A sweep point whose replicates come partly from the result cache and partly
+from fresh runs converts into one dataset holding every replicate.
+
+    python3 -m pytest FinalVersion/test_result_cache.py
+"""
+
+import json
+import os
+
+import numpy as np
+
+import json_to_csv
+import result_cache
+
+
+def write_run(directory: str, throughput: float, intervals: int = 5) -> None:
+    """Output files of a minimal run: one iperf3 client log, a ping transcript and a manifest."""
+    os.makedirs(directory, exist_ok=True)
+    stream = {"bits_per_second": throughput, "retransmits": 0, "snd_cwnd": 10000, "snd_wnd": 60000,
+              "rttvar": 500, "rtt": 20000}
+    log = {
+        "start": {"version": "iperf 3.12", "timestamp": {"timesecs": 0}, "test_start": {"num_streams": 2}},
+        "intervals": [{"streams": [stream, stream], "sum": {"start": float(i), "end": float(i + 1)}}
+                      for i in range(intervals)],
+        "end": {},
+    }
+    with open(os.path.join(directory, "iperf3_L1_to_R1_p5201.json"), "w") as file:
+        json.dump(log, file, indent="\t")
+    with open(os.path.join(directory, "ping_L1_to_R1.txt"), "w") as file:
+        file.write("64 bytes from 10.0.0.4: icmp_seq=1 ttl=64 time=20.1 ms\n")
+    with open(os.path.join(directory, "manifest.json"), "w") as file:
+        json.dump({"status": "done"}, file)
+
+
+def test_cached_and_fresh_replicates_convert_together(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / "cache"))
+    key = "ab" * 32
+
+    # an earlier sweep measured replicate 1 and stored it
+    earlier = str(tmp_path / "earlier")
+    write_run(earlier, throughput=2e6)
+    assert cache.store(key, 1, earlier, {"bottleneck_bw": 20.0}) > 0
+    assert not os.path.exists(os.path.join(cache._path(key, 1), "manifest.json"))
+
+    # this sweep runs replicate 0 and is served replicate 1 from the cache
+    point = tmp_path / "sweep" / "point_0000"
+    write_run(str(point / "rep_00"), throughput=1e6)
+    assert cache.fetch(key, 1, str(point / "rep_01"))
+    assert not cache.fetch(key, 2, str(point / "rep_02"))
+
+    out_path = str(tmp_path / "dataset.npz")
+    converted, skipped, _, out_path = json_to_csv.convert_tree(str(tmp_path / "sweep"), out_path, jobs=1, fmt="npz")
+    assert (converted, skipped) == (2, 0)
+    with np.load(out_path) as data:
+        runs = [str(run) for run in data["run"]]
+        throughput = data["throughput"]
+    assert sorted(set(runs)) == ["point_0000/rep_00", "point_0000/rep_01"]
+    assert runs.count("point_0000/rep_01") == 5
+    assert np.allclose(throughput[[run == "point_0000/rep_01" for run in runs]], 2e6)
+
+
+def test_options_that_change_the_stored_files_change_the_key():
+    topo = {"bottleneck_bw": 20, "bottleneck_delay": "10ms"}
+    cfg = {"duration_s": 30, "out_dir": "runs/a", "grace_s": 5, "fidelity": True, "queue_interval_ms": 10,
+           "feature_windows": [1, 5], "telemetry_port": 8100}
+
+    def key(**changes):
+        return result_cache.config_key(topo, {**cfg, **changes}, {}, [])
+
+    assert key(out_dir="runs/b", grace_s=10, telemetry_port=8107) == key()
+    for changes in ({"fidelity": False}, {"queue_interval_ms": 0}, {"feature_windows": [1]},
+                    {"telemetry_port": None}):
+        assert key(**changes) != key(), changes
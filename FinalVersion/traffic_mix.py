@@ -0,0 +1,457 @@
+#! /usr/bin/env python3
+"""
+Traffic-mix generator for the dumbbell hosts (scenario 2).
+
+Instead of a few identical long-lived iperf3 flows, one asyncio process per
+host generates a campus-like mix out of independent traffic classes:
+- web:   short TCP flows with Poisson arrivals and heavy-tailed sizes, one
+         connection per flow (download: the server sends `size` bytes, upload:
+         the client does),
+- video: on/off UDP senders, constant bitrate in frames of `fps` during the on
+         periods,
+- rpc:   request/response over persistent TCP connections, Poisson arrivals.
+All flows of a host share one event loop, so tens of thousands of concurrent
+flows need no process or thread per flow (the file descriptor limit is raised
+to the hard limit at start).
+
+The server side (`serve`) answers all classes on one port: TCP requests start
+with a 16 byte header (request bytes, response bytes), the server reads the
+request and answers with the response bytes. UDP datagrams carry flow, burst,
+sequence number and send time; at the end of a burst the client asks for a
+report with the received count and mean one-way delay (both ends of a Mininet
+host pair share the clock).
+
+Every finished flow, request or burst becomes a record (RECORD_COLUMNS):
+class, flow, item (request / burst number), start_s (since the client start),
+duration_s (flow / request completion time, burst length), bytes, packets sent
+and received, one-way delay, ok. The records are written with dataset_io
+(csv, feather, parquet or npz by extension), with the mix, the seed and the
+start time in the metadata.
+
+Mix file (JSON), sizes in bytes, times in seconds, distributions are a number
+or {"dist": "exp"|"pareto"|"lognormal"|"uniform", ...}:
+    {"classes": [
+      {"type": "web", "rate": 20, "direction": "download",
+       "size": {"dist": "pareto", "shape": 1.2, "min": 4000, "max": 50000000}},
+      {"type": "video", "flows": 2, "bitrate": "4M", "fps": 30,
+       "on": {"dist": "exp", "mean": 10}, "off": {"dist": "exp", "mean": 3}},
+      {"type": "rpc", "connections": 4, "rate": 50, "request": 200,
+       "response": {"dist": "lognormal", "mu": 8, "sigma": 1}}
+    ]}
+
+Usage (inside the Mininet hosts, see Dumbbell.py scenario 2):
+    python3 traffic_mix.py serve --port 5201
+    python3 traffic_mix.py client 10.0.0.4 --port 5201 --duration 60 --out mix_L1.csv [--mix mix.json]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import resource
+import struct
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import dataset_io
+from units import bits_per_second
+
+
+DEFAULT_MIX = {
+    "classes": [
+        {"type": "web", "rate": 20, "direction": "download",
+         "size": {"dist": "pareto", "shape": 1.2, "min": 4000, "max": 50_000_000}},
+        {"type": "video", "flows": 2, "bitrate": "4M", "fps": 30,
+         "on": {"dist": "exp", "mean": 10}, "off": {"dist": "exp", "mean": 3}},
+        {"type": "rpc", "connections": 4, "rate": 50, "request": 200,
+         "response": {"dist": "lognormal", "mu": 8, "sigma": 1}},
+    ],
+}
+RECORD_COLUMNS = ("class", "flow", "item", "start_s", "duration_s", "bytes", "packets_sent", "packets_received",
+                  "owd_ms", "ok")
+CHUNK = 1 << 16
+DATAGRAM_SIZE = 1200
+FLOW_TIMEOUT_S = 30.0
+MAX_INFLIGHT = 50_000
+REPORT_TIMEOUT_S = 0.5
+REPORT_TRIES = 3
+
+_REQUEST = struct.Struct("<QQ")      # request bytes, response bytes
+_DATAGRAM = struct.Struct("<IIId")   # flow, burst, seq, send time (epoch)
+_REPORT = struct.Struct("<IIId")     # flow, burst, received, mean one-way delay (s)
+_END = 0xFFFFFFFF                    # seq of the report request closing a burst
+_PAYLOAD = memoryview(bytes(CHUNK))  # shared zero payload, sliced instead of copied
+
+
+def sample(spec, rng: np.random.Generator) -> float:
+    """One value of a distribution spec (a number or {"dist": ..., parameters})."""
+    if isinstance(spec, (int, float)):
+        return float(spec)
+    dist = spec["dist"]
+    if dist == "exp":
+        value = rng.exponential(spec["mean"])
+    elif dist == "pareto":
+        # classic Pareto with scale "min": heavy tail for shape <= 2
+        value = (rng.pareto(spec["shape"]) + 1) * spec["min"]
+    elif dist == "lognormal":
+        value = rng.lognormal(spec["mu"], spec["sigma"])
+    elif dist == "uniform":
+        value = rng.uniform(spec["low"], spec["high"])
+    else:
+        raise ValueError(f"Unknown distribution: {dist!r}")
+    return float(min(value, spec.get("max", math.inf)))
+
+
+def load_mix(path: str = None) -> dict:
+    if not path:
+        return DEFAULT_MIX
+    with open(path, "r") as file:
+        mix = json.load(file)
+    for spec in mix["classes"]:
+        if spec["type"] not in ("web", "video", "rpc"):
+            raise ValueError(f"Unknown traffic class: {spec['type']!r}")
+    return mix
+
+
+def raise_fd_limit() -> int:
+    """Raises the soft open file limit to the hard limit (one descriptor per flow). Returns the new limit."""
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+async def _send(writer, n: int) -> None:
+    while n > 0:
+        size = min(n, CHUNK)
+        writer.write(_PAYLOAD[:size])
+        n -= size
+        await writer.drain()
+
+
+async def _receive(reader, n: int) -> None:
+    while n > 0:
+        chunk = await reader.read(min(n, CHUNK))
+        if not chunk:
+            raise ConnectionError("connection closed early")
+        n -= len(chunk)
+
+
+async def _exchange(reader, writer, request: int, response: int) -> None:
+    """One request/response on an open connection."""
+    writer.write(_REQUEST.pack(request, response))
+    await _send(writer, request)
+    await _receive(reader, response)
+
+
+async def _connect_exchange(server: str, port: int, request: int, response: int) -> None:
+    """One request/response on a new connection (a short flow)."""
+    reader, writer = await asyncio.open_connection(server, port)
+    try:
+        await _exchange(reader, writer, request, response)
+    finally:
+        writer.close()
+
+
+class _VideoSink(asyncio.DatagramProtocol):
+    """Server side of the video class: counts datagrams per burst, answers report requests."""
+
+    def __init__(self, keep: int = 10_000):
+        self.bursts = {}
+        self.done = OrderedDict()  # answered reports, for repeated requests
+        self.keep = keep
+        self.transport = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if len(data) < _DATAGRAM.size:
+            return
+        flow, burst, seq, sent = _DATAGRAM.unpack_from(data)
+        key = (addr, flow, burst)
+        if seq != _END:
+            received, delay = self.bursts.get(key, (0, 0.0))
+            self.bursts[key] = (received + 1, delay + time.time() - sent)
+            return
+        report = self.done.get(key)
+        if report is None:
+            received, delay = self.bursts.pop(key, (0, 0.0))
+            report = self.done[key] = _REPORT.pack(flow, burst, received, delay / received if received else math.nan)
+            if len(self.done) > self.keep:
+                self.done.popitem(last=False)
+        self.transport.sendto(report, addr)
+
+
+async def _serve_tcp(reader, writer) -> None:
+    try:
+        while True:
+            request, response = _REQUEST.unpack(await reader.readexactly(_REQUEST.size))
+            await _receive(reader, request)
+            await _send(writer, response)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(port: int) -> None:
+    """Runs the TCP and UDP side of all traffic classes on port until cancelled."""
+    loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(_serve_tcp, "0.0.0.0", port, backlog=4096)
+    transport, _ = await loop.create_datagram_endpoint(_VideoSink, local_addr=("0.0.0.0", port))
+    print(f"[+] Traffic mix server on port {port} (tcp + udp)", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        transport.close()
+
+
+class _VideoSource(asyncio.DatagramProtocol):
+    """Client side of one video flow: resolves the report futures of its bursts."""
+
+    def __init__(self):
+        self.reports = {}
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if len(data) < _REPORT.size:
+            return
+        _, burst, received, owd = _REPORT.unpack_from(data)
+        future = self.reports.get(burst)
+        if future is not None and not future.done():
+            future.set_result((received, owd))
+
+
+class MixClient:
+    """Generates the traffic classes of a mix towards one server and collects the per-flow records."""
+
+    def __init__(self, mix: dict, server: str, port: int, duration: float, seed: int = 0,
+                 drain: float = 10.0, max_inflight: int = MAX_INFLIGHT):
+        self.mix = mix
+        self.server = server
+        self.port = port
+        self.duration = duration
+        self.drain = drain
+        self.max_inflight = max_inflight
+        self.rng = np.random.default_rng(seed)
+        self.records = {name: [] for name in RECORD_COLUMNS}
+        self.flows = set()   # running web flow tasks
+        self.skipped = 0     # web arrivals dropped at max_inflight
+        self.next_flow = 0
+        self.t0 = None
+        self.started = None
+        self.deadline = None
+
+    def _record(self, cls: str, flow: int, item: int, start: float, duration: float, size: int,
+                sent: int = -1, received: int = -1, owd: float = math.nan, ok: bool = True) -> None:
+        for name, value in zip(RECORD_COLUMNS, (cls, flow, item, start - self.t0, duration, size, sent, received,
+                                                owd * 1e3, int(ok))):
+            self.records[name].append(value)
+
+    def _flow_id(self) -> int:
+        self.next_flow += 1
+        return self.next_flow - 1
+
+    async def _web_flow(self, spec: dict, flow: int, size: int) -> None:
+        loop = asyncio.get_running_loop()
+        upload = spec.get("direction", "download") == "upload"
+        request, response = (size, 1) if upload else (0, size)
+        start = loop.time()
+        ok = False
+        try:
+            await asyncio.wait_for(_connect_exchange(self.server, self.port, request, response),
+                                   spec.get("timeout", FLOW_TIMEOUT_S))
+            ok = True
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            # also recorded (not ok) when the flow is cancelled at the end of the run
+            self._record(spec["name"], flow, 0, start, loop.time() - start, size, ok=ok)
+
+    async def _web(self, spec: dict) -> None:
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while True:
+            # absolute schedule: late arrivals start at once instead of shifting the process
+            due += self.rng.exponential(1 / spec["rate"])
+            if due >= self.deadline:
+                return
+            await asyncio.sleep(max(due - loop.time(), 0))
+            if len(self.flows) >= self.max_inflight:
+                self.skipped += 1
+                continue
+            size = max(int(sample(spec["size"], self.rng)), 1)
+            task = asyncio.create_task(self._web_flow(spec, self._flow_id(), size))
+            self.flows.add(task)
+            task.add_done_callback(self.flows.discard)
+
+    async def _rpc_connection(self, spec: dict, rate: float) -> None:
+        loop = asyncio.get_running_loop()
+        flow = self._flow_id()
+        timeout = spec.get("timeout", FLOW_TIMEOUT_S)
+        reader, writer = await asyncio.open_connection(self.server, self.port)
+        due = loop.time()
+        item = 0
+        try:
+            while True:
+                due += self.rng.exponential(1 / rate)
+                if due >= self.deadline:
+                    return
+                await asyncio.sleep(max(due - loop.time(), 0))
+                request = int(sample(spec.get("request", 200), self.rng))
+                response = max(int(sample(spec["response"], self.rng)), 1)
+                ok = False
+                try:
+                    await asyncio.wait_for(_exchange(reader, writer, request, response), timeout)
+                    ok = True
+                finally:
+                    # measured from the scheduled arrival, so waiting behind the previous request counts
+                    self._record(spec["name"], flow, item, due, loop.time() - due, request + response, ok=ok)
+                item += 1
+        except (OSError, asyncio.TimeoutError):
+            pass  # a broken connection ends its request stream
+        finally:
+            writer.close()
+
+    async def _video_flow(self, spec: dict) -> None:
+        loop = asyncio.get_running_loop()
+        flow = self._flow_id()
+        transport, source = await loop.create_datagram_endpoint(_VideoSource, remote_addr=(self.server, self.port))
+        packet = spec.get("packet", DATAGRAM_SIZE)
+        frame_bytes = bits_per_second(spec["bitrate"]) / 8 / spec["fps"]
+        per_frame = max(math.ceil(frame_bytes / packet), 1)
+        buf = bytearray(packet)
+        burst = 0
+        try:
+            # random phase: start with an off period
+            await asyncio.sleep(min(sample(spec["off"], self.rng), max(self.deadline - loop.time(), 0)))
+            while loop.time() < self.deadline:
+                start = loop.time()
+                end = min(start + sample(spec["on"], self.rng), self.deadline)
+                seq = 0
+                frame = start
+                while frame < end:
+                    for _ in range(per_frame):
+                        _DATAGRAM.pack_into(buf, 0, flow, burst, seq, time.time())
+                        transport.sendto(buf)
+                        seq += 1
+                    frame += 1 / spec["fps"]
+                    await asyncio.sleep(max(frame - loop.time(), 0))
+                duration = loop.time() - start
+                received, owd = -1, math.nan
+                future = source.reports[burst] = loop.create_future()
+                for _ in range(REPORT_TRIES):
+                    transport.sendto(_DATAGRAM.pack(flow, burst, _END, time.time()))
+                    try:
+                        received, owd = await asyncio.wait_for(asyncio.shield(future), REPORT_TIMEOUT_S)
+                        break
+                    except asyncio.TimeoutError:
+                        continue
+                del source.reports[burst]
+                self._record(spec["name"], flow, burst, start, duration, seq * packet, seq, received, owd,
+                             ok=received >= 0)
+                burst += 1
+                await asyncio.sleep(min(sample(spec["off"], self.rng), max(self.deadline - loop.time(), 0)))
+        finally:
+            transport.close()
+
+    async def run(self) -> dict:
+        """Generates the mix for duration seconds, waits up to drain seconds for running flows. Returns a summary."""
+        loop = asyncio.get_running_loop()
+        self.started = time.time()
+        self.t0 = loop.time()
+        self.deadline = self.t0 + self.duration
+        tasks = []
+        seen = {}
+        for spec in self.mix["classes"]:
+            # record class: the type, numbered from the second class of the same type on (web, web2, ...)
+            seen[spec["type"]] = seen.get(spec["type"], 0) + 1
+            n = seen[spec["type"]]
+            spec = {"name": spec["type"] if n == 1 else f"{spec['type']}{n}", **spec}
+            if spec["type"] == "web":
+                tasks.append(asyncio.create_task(self._web(spec)))
+            elif spec["type"] == "rpc":
+                n = spec.get("connections", 1)
+                tasks += [asyncio.create_task(self._rpc_connection(spec, spec["rate"] / n)) for _ in range(n)]
+            else:
+                tasks += [asyncio.create_task(self._video_flow(spec)) for _ in range(spec.get("flows", 1))]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [repr(result) for result in results if isinstance(result, BaseException)]
+        if self.flows:
+            await asyncio.wait(set(self.flows), timeout=self.drain)
+        unfinished = len(self.flows)
+        for task in list(self.flows):
+            task.cancel()
+        await asyncio.gather(*self.flows, return_exceptions=True)
+        return {"records": len(self.records["class"]), "skipped": self.skipped, "unfinished": unfinished,
+                "errors": errors}
+
+    def columns(self) -> dict:
+        columns = {name: np.array(values) for name, values in self.records.items()}
+        columns["class"] = columns["class"].astype(str)
+        for name in ("flow", "item", "bytes", "packets_sent", "packets_received", "ok"):
+            columns[name] = columns[name].astype(np.int64)
+        for name in ("start_s", "duration_s", "owd_ms"):
+            columns[name] = columns[name].astype(np.float64)
+        return columns
+
+
+def summarize(columns: dict) -> None:
+    for cls in sorted(set(columns["class"].tolist())):
+        rows = columns["class"] == cls
+        ok = columns["ok"][rows] == 1
+        durations = columns["duration_s"][rows][ok]
+        line = f"[+] {cls}: {rows.sum()} records, {ok.mean():.1%} ok"
+        if len(durations):
+            p50, p99 = np.percentile(durations, [50, 99])
+            line += f", duration p50 {p50 * 1e3:.1f} ms, p99 {p99 * 1e3:.1f} ms"
+        print(line)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Traffic-mix generator (web, video and rpc classes)")
+    sub = p.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("serve", help="answer all traffic classes on --port")
+    s.add_argument("--port", type=int, default=5201)
+    c = sub.add_parser("client", help="generate a mix towards a server")
+    c.add_argument("server", help="server IP")
+    c.add_argument("--port", type=int, default=5201)
+    c.add_argument("--mix", type=str, default="", help="mix file (JSON), default: DEFAULT_MIX")
+    c.add_argument("--duration", type=float, default=60, help="seconds of new arrivals")
+    c.add_argument("--drain", type=float, default=10, help="seconds running flows may take after --duration")
+    c.add_argument("--seed", type=int, default=0)
+    c.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT, help="concurrent web flows at most")
+    c.add_argument("--out", type=str, default="mix_records.csv", help="records file (csv, feather, parquet, npz)")
+    c.add_argument("--flow", type=str, default="", help="flow name stored in the metadata")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    limit = raise_fd_limit()
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.port))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    mix = load_mix(args.mix)
+    client = MixClient(mix, args.server, args.port, args.duration, args.seed, args.drain, args.max_inflight)
+    print(f"[+] Traffic mix to {args.server}:{args.port} for {args.duration} s (fd limit {limit})", flush=True)
+    summary = asyncio.run(client.run())
+    columns = client.columns()
+    path = dataset_io.write_dataset(args.out, columns, metadata={
+        "flow": args.flow, "server": args.server, "port": args.port, "mix": mix, "seed": args.seed,
+        "started": client.started, "duration_s": args.duration, **summary})
+    summarize(columns)
+    for error in summary["errors"]:
+        print(f"[!] {error}")
+    print(f"[+] {summary['records']} records ({summary['skipped']} arrivals skipped, "
+          f"{summary['unfinished']} flows unfinished) written to {path}")
+
+
+if __name__ == "__main__":
+    main()
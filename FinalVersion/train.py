@@ -0,0 +1,293 @@
+#! /usr/bin/env python3
+"""
+Headless training of the RTT predictor (the model of DNN_Colab.ipynb).
+
+The converted datasets (json_to_csv.py / fluid_model.py / packet_sim.py output,
+any dataset_io format) are read shard by shard: every file is one shard and is
+walked in chunks of --chunk-rows, so the full dataset never has to fit into
+memory. Column names come from the file header / schema; npz and feather files
+are memory-mapped, parquet files are decoded row group by row group and CSV files
+are parsed chunk-wise (dataset_io.read_chunks).
+
+Same preprocessing as the notebook:
+- features: every column except rtt and the run/flow/interval keys, target: rtt,
+- StandardScaler statistics and y_min / y_max over all rows (one streaming pass),
+- test split 30 %, validation 20 % of the rest; rows are assigned by a random
+  draw seeded with (seed, shard, chunk), so the split is reproducible.
+
+Batches are built in NumPy and fed through tf.data (prefetched in parallel with
+training). R² is a streaming Keras metric (sums of y, y², squared error), so the
+validation R² comes out of Keras' own validation pass instead of a separate
+predict over the validation set per epoch. R² is computed on the normalized
+target; min-max denormalization is affine and applied to both y and the
+prediction, which leaves R² unchanged.
+
+With --where (filters of run_index.py) the runs of the run index matching every
+filter are converted (json_to_csv.py, incremental) into <out-dir>/dataset.npz,
+which becomes one more shard.
+
+Every epoch writes a weights checkpoint; an interrupted run resumes from the
+last finished epoch (BackupAndRestore). The final model is exported for
+rtt_inference.py.
+
+Usage:
+    python3 train.py dataset.feather --epochs 50 --out-dir train_run
+    python3 train.py sweep_folder/dataset.npz fluid.npz --threads 8 --batch-size 256
+    python3 train.py --where bottleneck_bw=20 --where bottleneck_queue=200 --index run_index.sqlite
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import dataset_io
+import json_to_csv
+import rtt_inference
+import run_index
+
+
+KEY_COLUMNS = ("run", "flow", "interval")
+TARGET = "rtt"
+CHUNK_ROWS = 1 << 16
+SPLITS = ("train", "val", "test")
+
+
+class Shards:
+    """Chunked (X, y) access to a list of dataset files with the same columns."""
+
+    def __init__(self, paths: list, chunk_rows: int = CHUNK_ROWS):
+        self.paths = paths
+        self.chunk_rows = chunk_rows
+        self.features = None
+        for path in paths:
+            # header / schema only, the data is read by chunks()
+            names = dataset_io.read_column_names(path)
+            features = [name for name in names if name not in KEY_COLUMNS and name != TARGET]
+            if TARGET not in names:
+                raise ValueError(f"{path}: no '{TARGET}' column")
+            if self.features is None:
+                self.features = features
+            elif features != self.features:
+                raise ValueError(f"{path}: columns {features} differ from {self.features}")
+
+    def chunks(self):
+        """Yields (shard index, chunk index, X (rows x features), y (rows,)) in file order."""
+        names = self.features + [TARGET]
+        for shard, path in enumerate(self.paths):
+            for index, block in enumerate(dataset_io.read_chunks(path, names, self.chunk_rows)):
+                yield shard, index, block[:, :-1], block[:, -1]
+
+
+def split_of(seed: int, shard: int, chunk: int, n_rows: int, test_size: float, val_size: float) -> np.ndarray:
+    """Split index (0 train, 1 val, 2 test) of every row of a chunk, reproducible from (seed, shard, chunk)."""
+    u = np.random.default_rng([seed, shard, chunk]).random(n_rows)
+    val_limit = test_size + (1 - test_size) * val_size
+    return np.where(u < test_size, 2, np.where(u < val_limit, 1, 0))
+
+
+def fit_normalization(shards: Shards) -> dict:
+    """Streaming StandardScaler (population std) and y_min / y_max over all rows."""
+    n = 0
+    mean = np.zeros(len(shards.features))
+    m2 = np.zeros(len(shards.features))
+    y_min, y_max = np.inf, -np.inf
+    for _, _, x, y in shards.chunks():
+        # Chan et al. pairwise update of count, mean and sum of squared deviations
+        k = len(x)
+        chunk_mean = x.mean(axis=0)
+        chunk_m2 = ((x - chunk_mean) ** 2).sum(axis=0)
+        delta = chunk_mean - mean
+        total = n + k
+        mean = mean + delta * k / total
+        m2 = m2 + chunk_m2 + delta ** 2 * n * k / total
+        n = total
+        y_min = min(y_min, float(y.min()))
+        y_max = max(y_max, float(y.max()))
+    if n == 0:
+        raise ValueError("the datasets are empty")
+    scale = np.sqrt(m2 / n)
+    scale[scale == 0] = 1.0  # like StandardScaler for constant columns
+    return {"rows": n, "mean": mean, "scale": scale, "y_min": y_min, "y_max": y_max}
+
+
+def batches(shards: Shards, norm: dict, split: int, batch_size: int, args, epoch: int = 0):
+    """
+    Yields normalized (X, y) float32 batches of one split. The training split
+    visits chunks and rows in a new order every epoch.
+    """
+    rng = np.random.default_rng([args.seed, epoch]) if split == 0 else None
+    y_range = norm["y_max"] - norm["y_min"]
+    chunks = shards.chunks()
+    if rng is not None:
+        # shuffle within a window of chunks, the full chunk list would have to be held in memory
+        chunks = _shuffled(chunks, args.shuffle_chunks, rng)
+    carry_x, carry_y = [], []
+    carried = 0
+    for shard, index, x, y in chunks:
+        keep = split_of(args.seed, shard, index, len(x), args.test_size, args.val_size) == split
+        x = ((x[keep] - norm["mean"]) / norm["scale"]).astype(np.float32)
+        y = ((y[keep] - norm["y_min"]) / y_range).astype(np.float32)
+        if rng is not None:
+            order = rng.permutation(len(x))
+            x, y = x[order], y[order]
+        carry_x.append(x)
+        carry_y.append(y)
+        carried += len(x)
+        if carried < batch_size:
+            continue
+        x = np.concatenate(carry_x)
+        y = np.concatenate(carry_y)
+        full = len(x) - len(x) % batch_size
+        for start in range(0, full, batch_size):
+            yield x[start:start + batch_size], y[start:start + batch_size]
+        carry_x, carry_y = [x[full:]], [y[full:]]
+        carried = len(x) - full
+    if carried:
+        yield np.concatenate(carry_x), np.concatenate(carry_y)
+
+
+def _shuffled(chunks, window: int, rng):
+    buffer = []
+    for chunk in chunks:
+        buffer.append(chunk)
+        if len(buffer) >= window:
+            yield buffer.pop(int(rng.integers(len(buffer))))
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def build_model(tf, n_features: int):
+    from tensorflow.keras.layers import Dense
+    from tensorflow.keras.models import Sequential
+
+    class StreamingR2(tf.keras.metrics.Metric):
+        """R² accumulated over batches: 1 - SSE / (Σy² - (Σy)² / n)."""
+
+        def __init__(self, name="r2", **kwargs):
+            super().__init__(name=name, **kwargs)
+            self.n = self.add_weight(name="n", shape=(), initializer="zeros", dtype="float64")
+            self.sum_y = self.add_weight(name="sum_y", shape=(), initializer="zeros", dtype="float64")
+            self.sum_y2 = self.add_weight(name="sum_y2", shape=(), initializer="zeros", dtype="float64")
+            self.sse = self.add_weight(name="sse", shape=(), initializer="zeros", dtype="float64")
+
+        def update_state(self, y_true, y_pred, sample_weight=None):
+            y = tf.cast(tf.reshape(y_true, [-1]), tf.float64)
+            p = tf.cast(tf.reshape(y_pred, [-1]), tf.float64)
+            self.n.assign_add(tf.cast(tf.size(y), tf.float64))
+            self.sum_y.assign_add(tf.reduce_sum(y))
+            self.sum_y2.assign_add(tf.reduce_sum(y * y))
+            self.sse.assign_add(tf.reduce_sum(tf.square(y - p)))
+
+        def result(self):
+            total = self.sum_y2 - self.sum_y * self.sum_y / tf.maximum(self.n, 1.0)
+            return 1.0 - self.sse / tf.maximum(total, 1e-300)
+
+        def reset_state(self):
+            for weight in (self.n, self.sum_y, self.sum_y2, self.sse):
+                weight.assign(0.0)
+
+    # architecture of the notebook
+    model = Sequential([tf.keras.Input(shape=(n_features,)), Dense(256, activation='relu'),
+                        Dense(128, activation='relu'), Dense(64, activation='relu'), Dense(64, activation='relu'),
+                        Dense(32, activation='relu'), Dense(1)])
+    model.compile(optimizer='adam', loss='mse', metrics=['mae', StreamingR2()])
+    return model
+
+
+def make_dataset(tf, shards: Shards, norm: dict, split: int, args):
+    n_features = len(shards.features)
+    epochs = iter(range(1 << 30))
+
+    def generator():
+        # called again for every pass over the dataset -> new shuffle order per epoch
+        yield from batches(shards, norm, split, args.batch_size, args, next(epochs))
+
+    signature = (tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+                 tf.TensorSpec(shape=(None,), dtype=tf.float32))
+    return tf.data.Dataset.from_generator(generator, output_signature=signature).prefetch(tf.data.AUTOTUNE)
+
+
+def query_dataset(index_path: str, filters: list, out_path: str) -> str:
+    """Converts the runs of the run index matching the filters into one dataset. Returns its path."""
+    try:
+        root, runs = run_index.query_tree(index_path, filters)
+    except LookupError as e:
+        raise SystemExit(str(e))
+    query = [key + op + value for key, op, value in filters]
+    converted, skipped, _, out_path = json_to_csv.convert_tree(
+        root, out_path, fmt="npz", metadata={"run_id": "query", "query": query}, runs=runs)
+    print(f"[+] {len(runs)} runs match {' '.join(query)}: {converted} logs converted, {skipped} unchanged")
+    return out_path
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Train the RTT predictor on converted datasets without Colab")
+    p.add_argument("datasets", nargs="*", help="dataset files (csv/feather/parquet/npz), one shard each")
+    p.add_argument("--where", type=run_index.parse_filter, action="append", default=[], metavar="KEY=VALUE",
+                   help="also train on the runs of the run index matching this filter (repeatable)")
+    p.add_argument("--index", default=run_index.INDEX, help="run index for --where (see run_index.py)")
+    p.add_argument("--out-dir", default="train_run", help="checkpoints, history, exported model")
+    p.add_argument("--epochs", type=int, default=50)
+    p.add_argument("--batch-size", type=int, default=32)
+    p.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows read from a shard at a time")
+    p.add_argument("--shuffle-chunks", type=int, default=16, help="chunks held back for shuffling the chunk order")
+    p.add_argument("--test-size", type=float, default=0.3)
+    p.add_argument("--val-size", type=float, default=0.2, help="fraction of the non-test rows")
+    p.add_argument("--threads", type=int, default=0, help="CPU threads for TensorFlow ops (0: all cores)")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--deterministic", action="store_true", help="deterministic TensorFlow ops (slower)")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.out_dir, exist_ok=True)
+    if args.where:
+        args.datasets.append(query_dataset(args.index, args.where, os.path.join(args.out_dir, "dataset.npz")))
+    if not args.datasets:
+        raise SystemExit("No datasets given (dataset files or --where)")
+
+    shards = Shards(args.datasets, args.chunk_rows)
+    t0 = time.perf_counter()
+    norm = fit_normalization(shards)
+    print(f"[+] {norm['rows']} rows, features {shards.features}, "
+          f"RTT {norm['y_min']}..{norm['y_max']} ({time.perf_counter() - t0:.1f} s)")
+    with open(os.path.join(args.out_dir, "train_config.json"), "w") as file:
+        json.dump({"args": vars(args), "features": shards.features, "rows": norm["rows"],
+                   "scaler_mean": norm["mean"].tolist(), "scaler_scale": norm["scale"].tolist(),
+                   "y_min": norm["y_min"], "y_max": norm["y_max"]}, file, indent=2)
+
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(args.seed)
+    if args.deterministic:
+        tf.config.experimental.enable_op_determinism()
+    tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+    tf.config.threading.set_inter_op_parallelism_threads(args.threads)
+
+    model = build_model(tf, len(shards.features))
+    train, val, test = (make_dataset(tf, shards, norm, split, args) for split in range(len(SPLITS)))
+    callbacks = [
+        tf.keras.callbacks.BackupAndRestore(os.path.join(args.out_dir, "backup")),
+        tf.keras.callbacks.ModelCheckpoint(os.path.join(args.out_dir, "epoch_{epoch:03d}.weights.h5"),
+                                           save_weights_only=True),
+        tf.keras.callbacks.CSVLogger(os.path.join(args.out_dir, "history.csv"), append=True),
+    ]
+    model.fit(train, validation_data=val, epochs=args.epochs, callbacks=callbacks, verbose=2)
+
+    loss, mae, r2 = model.evaluate(test, verbose=0)
+    print(f"[+] Test loss (MSE): {loss:.4f}, MAE: {mae:.4f}, R²: {r2:.4f}")
+
+    model.save(os.path.join(args.out_dir, "rtt_model.keras"))
+    weights, biases = zip(*(layer.get_weights() for layer in model.layers))
+    export = os.path.join(args.out_dir, "rtt_model.npz")
+    rtt_inference.save_model(export, weights, biases, norm["mean"], norm["scale"], norm["y_min"], norm["y_max"],
+                             shards.features)
+    print(f"[+] Exported {export} (rtt_inference.py)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Units of the Dumbbell.py options: tc/Mininet delays and iperf3 rates.
+
+Shared by the simulators, the sweep tools and the run index; standard library
+only, so importing it pulls in nothing else.
+"""
+
+import re
+
+
+_DELAY_RE = re.compile(r"([\d.]+)\s*(us|ms|s)?")
+_RATE_RE = re.compile(r"([\d.]+)\s*([KMG]?)", re.IGNORECASE)
+
+
+def seconds(delay) -> float:
+    """tc/Mininet delay ("10ms", "100us", "1s", or a number of ms) in seconds."""
+    if isinstance(delay, (int, float)):
+        return delay / 1e3
+    m = _DELAY_RE.fullmatch(delay.strip())
+    if m is None:
+        raise ValueError(f"Unknown delay: {delay!r}")
+    return float(m.group(1)) * {"us": 1e-6, "ms": 1e-3, "s": 1.0, None: 1e-3}[m.group(2)]
+
+
+def bits_per_second(rate) -> float:
+    """iperf3 -b rate ("50M", "0.5G", 0 = unlimited) in bit/s."""
+    if isinstance(rate, (int, float)):
+        return float(rate)
+    m = _RATE_RE.fullmatch(rate.strip())
+    if m is None:
+        raise ValueError(f"Unknown rate: {rate!r}")
+    return float(m.group(1)) * {"": 1, "K": 1e3, "M": 1e6, "G": 1e9}[m.group(2).upper()]
@@ -8,8 +8,13 @@ from mininet.clean import cleanup
 from mininet.cli import CLI
 from datetime import datetime
 import argparse
+import bisect
 import csv
+import os
 import re
+import select
+import subprocess
+import time
 import asyncio
 
 # program arguments
@@ -40,6 +45,7 @@ def parse_args():
 	parser.add_argument("-s", "--size", default=56, help="Size of the packets sent between hosts")
 	parser.add_argument("--scenario", default=1, help="The behavior (scenario) used by the middle bottleneck link (s1 <-> s2).")
 	parser.add_argument("-t", "--timeout", default="5", help="Time to wait for a response from the ping command in the ping test.")
+	parser.add_argument("--all-pairs", default=False, action='store_true', help="Ping every ordered pair of hosts (concurrently) instead of the three dumbbell pairs.")
 	
 	return parser.parse_args()
 
@@ -86,87 +92,146 @@ def create_topo(controller, **kwargs):
 	topo = DumbbellTopo()
 	return Mininet(topo=topo, link=TCLink, controller=controller, **kwargs)
 
+# compiled once, applied to the outputs of all pings of a probe
+PING_LOSS_RE = re.compile(r'(\d+(?:\.\d+)?)% packet loss')
+PING_RTT_RE = re.compile(r'rtt min/avg/max/mdev = (\d+\.\d+)/(\d+\.\d+)/(\d+\.\d+)/(\d+\.\d+) ms')
+PING_UNREACHABLE_RE = re.compile(re.escape('connect: Network is unreachable'))
+PING_SEPARATOR = '\0' # joins the outputs of a probe, none of the patterns matches it
+
 # Custom ping function based on Mininet's Mininet.ping() (net.py) function,
 # supporting a custom count / amount and size of the packets as well as a custom timeout.
+# All pings are started at once (popen) and collected with a poller as they complete,
+# so probing many pairs takes about as long as probing a single one.
 # [Param] hosts: Hosts to send packets between. Every host sends packets to every other host.
 # [Param] count: Amount of packets to send between hosts.
 # [Param] size: Size of the packets sent between hosts.
 # [Param] timeout: How long to wait for a response. Has to be formatted as a string.
-# [Returns] Tuple containing, in order, (1) the packet loss rate, (2) smallest RTT for a ping, (3) average RTT, (4) largest RTT and (5) standard deviation for the RTT.
-def ping(hosts=None, count=1, size=56, timeout=None):
-	# initialize returned data (and packet counters)
+# [Param] pairs: Ordered (source, destination) host pairs to probe instead of all pairs of hosts.
+# [Returns] Dict mapping every (source, destination) pair to a tuple containing, in order, (1) the packet loss rate, (2) smallest RTT for a ping, (3) average RTT, (4) largest RTT and (5) standard deviation for the RTT.
+def ping(hosts=None, count=1, size=56, timeout=None, pairs=None):
+	if pairs is None:
+		pairs = [(node, dest) for node in hosts for dest in hosts if node != dest]
+	pairs = [(node, dest) for node, dest in pairs if dest.intfs]
+	opts = []
+	if timeout:
+		opts = ['-W', str(timeout)]
+	env = dict(os.environ, LANG='C')
+	
+	# start every ping at once
+	procs = {}
+	for node, dest in pairs:
+		proc = node.popen(['ping', '-c', str(count), '-s', str(size)] + opts + [dest.IP()],
+						  stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
+		procs[proc.stdout.fileno()] = (node, dest, proc)
+	
+	# gather the outputs as they arrive
+	outputs = {fd: [] for fd in procs}
+	poller = select.poll()
+	for fd in procs:
+		poller.register(fd, select.POLLIN | select.POLLHUP)
+	# a ping ends after count seconds plus the reply timeout of the last packet
+	deadline = time.monotonic() + count + float(timeout or 10) + 5
+	open_fds = set(procs)
+	while open_fds and time.monotonic() < deadline:
+		for fd, event in poller.poll(1000):
+			data = os.read(fd, 65536)
+			if data:
+				outputs[fd].append(data)
+			else:
+				poller.unregister(fd)
+				open_fds.discard(fd)
+	for fd, (node, dest, proc) in procs.items():
+		if proc.poll() is None:
+			proc.kill()
+		proc.wait()
+		proc.stdout.close()
+	
+	parsed = parsePings([b''.join(outputs[fd]).decode(errors='replace') for fd in procs])
 	ping_result = {}
-	ploss, rtt_min, rtt_avg, rtt_max, rtt_mdev = 0, 0, 0, 0, 0
-	for node in hosts:
-		for dest in hosts:
-			if node != dest:
-				opts = ''
-				if timeout:
-					opts = f'-W {timeout}'
-				if dest.intfs:
-					result = node.cmdPrint(f'LANG=C ping -c {count} -s {size} {opts} {dest.IP()}')
-					print(result)
-					ping_result[node] = parsePing(result)
+	for (node, dest, proc), result in zip(procs.values(), parsed):
+		ping_result[(node, dest)] = result
 	return ping_result
 
+# Parses the results of many ping commands at once and extracts packet and RTT data.
+# The outputs are joined into one text, every pattern runs over it once and its
+# matches are mapped back to their output by position.
+# [Param] ping_outputs: List of outputs of ping commands.
+# [Returns] List with one tuple per output, see ping.
+def parsePings(ping_outputs):
+	starts = []
+	offset = 0
+	for ping_output in ping_outputs:
+		starts.append(offset)
+		offset += len(ping_output) + len(PING_SEPARATOR)
+	text = PING_SEPARATOR.join(ping_outputs)
+	
+	# first match of a pattern in every output (like a search of the output alone)
+	def first_matches(pattern):
+		found = {}
+		for m in pattern.finditer(text):
+			found.setdefault(bisect.bisect_right(starts, m.start()) - 1, m)
+		return found
+	
+	unreachable = first_matches(PING_UNREACHABLE_RE)
+	losses = first_matches(PING_LOSS_RE)
+	rtts = first_matches(PING_RTT_RE)
+	
+	results = []
+	for k, ping_output in enumerate(ping_outputs):
+		# network unreachable, no packets could be received
+		if k in unreachable:
+			results.append((1, 0, 0, 0, 0))
+			continue
+		# packets have been received
+		# amount of transmitted & received packets and the RTT summary
+		m = losses.get(k)
+		rtt_stats = rtts.get(k)
+		if m is None or rtt_stats is None:
+			print(f'*** Error: could not parse ping output: {ping_output}\n')
+			results.append((1, 0, 0, 0, 0))
+			continue
+		ploss = float(m.group(1)) / 100.0
+		# get RTT data
+		rtt_min, rtt_avg, rtt_max, rtt_mdev = map(float, rtt_stats.groups())
+		results.append((ploss, rtt_min, rtt_avg, rtt_max, rtt_mdev))
+	return results
+
 # Parses the result of the ping command and extracts packet and RTT data.
 # [Param] ping_output: Output of a ping command.
 # [Returns] See ping.
 def parsePing(ping_output):
-	# network unreachable, no packets could be received
-	if 'connect: Network is unreachable' in ping_output:
-		return 1, 0, 0, 0, 0
-	# packets have been received
-	# search for amount of transmitted & received packets
-	print(ping_output)
-	regex = r'(\d+)% packet loss'
-	m = re.search( regex, ping_output )
-	if m is None:
-		print( '*** Error: could not parse ping output: %s\n' %
-			   ping_output )
-		return 1, 0, 0, 0, 0
-	ploss = float(m.group(1)) / 100.0
-	# get RTT data
-	rtt_regex = r'rtt min/avg/max/mdev = (\d+\.\d+)/(\d+\.\d+)/(\d+\.\d+)/(\d+\.\d+) ms'
-	rtt_stats = re.search(rtt_regex, ping_output)
-	if rtt_stats is None:
-		print(f'*** Error: could not parse ping output: {ping_output}\n')
-		return (1, 0, 0, 0, 0)
-	rtt_min = float(rtt_stats.group(1))
-	rtt_avg = float(rtt_stats.group(2))
-	rtt_max = float(rtt_stats.group(3))
-	rtt_mdev = float(rtt_stats.group(4))
-	return ploss, rtt_min, rtt_avg, rtt_max, rtt_mdev
+	return parsePings([ping_output])[0]
 
 # Send packets over the bottleneck link and dump everything into a .txt
 # file (containing the raw ping output) and a .csv file (containing
 # various types of data about the ping process).
 def ping_test():
 	global results
-	hosts = net.hosts
 	
-	ping1 = ping(hosts=[net['h1'], net['h4']], count=packets, size=size, timeout=timeout)
-	ping2 = ping(hosts=[net['h2'], net['h5']], count=packets, size=size, timeout=timeout)
-	ping3 = ping(hosts=[net['h3'], net['h6']], count=packets, size=size, timeout=timeout)
+	# h1 <-> h4, h2 <-> h5, h3 <-> h6 in both directions, all probed at the same time
+	pairs = [(net['h1'], net['h4']), (net['h2'], net['h5']), (net['h3'], net['h6'])]
+	start = time.monotonic()
+	ping_result = ping(pairs=pairs + [(dest, node) for node, dest in pairs], count=packets, size=size, timeout=timeout)
+	print(f"Probed {2 * len(pairs)} pairs in {time.monotonic() - start:.1f} s")
 	
-	print("====================================")
-	print("h1 <-> h4: " + str(ping1))
-	print("====================================")
-	print("h2 <-> h5: " + str(ping2))
-	print("====================================")
-	print("h3 <-> h6: " + str(ping3))
+	for node, dest in pairs:
+		print("====================================")
+		print(f"{node.name} <-> {dest.name}: {ping_result[(node, dest)]} / {ping_result[(dest, node)]}")
 	print("====================================")
 	
-	results.append(ping1[0])
-	results.append(ping2[0])
-	results.append(ping3[0])
-	results.append(ping1[1])
-	results.append(ping2[1])
-	results.append(ping3[1])
+	for node, dest in pairs:
+		results.append(ping_result[(node, dest)])
+	for node, dest in pairs:
+		results.append(ping_result[(dest, node)])
 	results.append([size, timeout, packets]) # general data about the ping test: packet size, timeout and amount. All of it will be packed out later
-	
-	for h in hosts:
-		h.cmd('kill %ping')
+
+# Ping every ordered pair of hosts concurrently and print the RTT matrix.
+def ping_all_pairs():
+	start = time.monotonic()
+	ping_result = ping(hosts=net.hosts, count=packets, size=size, timeout=timeout)
+	print(f"Probed {len(ping_result)} pairs in {time.monotonic() - start:.1f} s")
+	for (node, dest), (ploss, rtt_min, rtt_avg, rtt_max, rtt_mdev) in ping_result.items():
+		print(f"{node.name} -> {dest.name}: loss {ploss:.0%}, rtt min/avg/max/mdev = {rtt_min}/{rtt_avg}/{rtt_max}/{rtt_mdev} ms")
 
 # perform an Iperf (UDP) test to measure UDP bandwidth
 # [Returns] Results of the Iperf test
@@ -220,7 +285,10 @@ if __name__ == '__main__':
 	net.start() # start the Mininet instance
 	
 	if packets > 0:
-		ping_test() # ping data from one side of the dumbbell to the other, and dump statistics into their own files
+		if args.all_pairs:
+			ping_all_pairs()
+		else:
+			ping_test() # ping data from one side of the dumbbell to the other, and dump statistics into their own files
 	
 	if iperfTest == True:
 		iperf()
@@ -1,29 +1,81 @@
+import os
 import socket
+import struct
 import time
 import argparse
 
-snd = 0
+import dumbbell_socket
+from dumbbell_socket import HEADER
+
 packet_size = 56
+batch_size = 64
 global sock
 
 def parse_args():
 	parser = argparse.ArgumentParser()
 	parser.add_argument("-i", "--ip", help="IP address to use.")
 	parser.add_argument("-p", "--port", help="Port to use.")
+	parser.add_argument("-u", "--udp", action="store_true", help="Send UDP datagrams (default: TCP stream).")
+	parser.add_argument("-s", "--size", type=int, default=packet_size, help=f"Packet size in bytes (at least {HEADER.size}).")
+	parser.add_argument("-r", "--rate", default="0", help="Payload rate in bit/s, e.g. 100M (0: as fast as possible).")
+	parser.add_argument("-d", "--duration", type=float, default=0, help="Seconds to send (0: until interrupted).")
+	parser.add_argument("-b", "--batch", type=int, default=batch_size, help="Packets per sendmmsg call / TCP write.")
 	return parser.parse_args()
 
-def generate_packet(packet_size):
-	return ("A" * packet_size).encode('UTF-8')
+# Send numbered, timestamped packets from a preallocated batch until the duration is over.
+# UDP: one sendmmsg call per batch (one send per packet without it), TCP: one write of the whole batch.
+# Prints per-second counters instead of a line per packet.
+# [Param] proto: 'udp' or 'tcp'.
+# [Param] rate: payload bit/s, 0 for as fast as possible.
+# [Returns] (packets, bytes) sent.
+def send(proto, size, rate, duration, batch):
+	sender = struct.unpack('!I', os.urandom(4))[0]
+	packets = dumbbell_socket.PacketBatch(batch, size)
+	pps = rate / (size * 8)
+	# paced: batches of about 1 ms worth of packets, so the rate stays smooth at low rates
+	n = max(1, min(batch, round(pps / 1000))) if pps else batch
+	tick = n / pps if pps else 0
+	overhead = dumbbell_socket.L2_OVERHEAD[proto]
+
+	seq = 0
+	total = last = 0
+	start = time.monotonic()
+	due = start
+	next_report = start + 1
+	end = start + duration if duration else float('inf')
+	try:
+		while True:
+			now = time.monotonic()
+			if now >= next_report:
+				count = total - last
+				print(f'[C] {next_report - start:4.0f}s: sent {count} packets, {count * size * 8 / 1e6:.1f} Mbit/s '
+					f'({count * (size + overhead) * 8 / 1e6:.1f} Mbit/s on the wire)', flush=True)
+				last = total
+				next_report += 1
+			if now >= end:
+				break
+			if tick:
+				due += tick
+				if due > now:
+					time.sleep(due - now)
+				elif due < now - 0.1:
+					due = now # too far behind, do not catch up in a burst
+			stamp = time.time_ns()
+			for i in range(n):
+				HEADER.pack_into(packets.buf, i * size, sender, seq + i, stamp)
+			if proto == 'udp':
+				total += packets.send(sock, n)
+			else:
+				sock.sendall(packets.view[:n * size])
+				total += n
+			seq += n
+	except KeyboardInterrupt:
+		pass
+	elapsed = time.monotonic() - start
+	print(f'[C] Sent {total} packets ({seq - total} failed) in {elapsed:.1f} s, '
+		f'{total * size * 8 / 1e6 / max(elapsed, 1e-9):.1f} Mbit/s')
+	return total, total * size
 
-def send():
-	global snd
-	packet = generate_packet(packet_size)
-	while True:
-		sock.send(packet)
-		snd += 1
-		print('[C] Sent packet ' + str(snd))
-		time.sleep(1)
-	
 def close():
 	sock.close()
 
@@ -33,10 +85,19 @@ if __name__ == '__main__':
 	args = parse_args()
 	ip = args.ip
 	port = int(args.port)
+	proto = 'udp' if args.udp else 'tcp'
+	if args.size < HEADER.size or (args.udp and args.size > dumbbell_socket.MAX_PACKET):
+		raise SystemExit(f'[C] Packet size must be between {HEADER.size} and {dumbbell_socket.MAX_PACKET} bytes')
 	
 	print('[C] Starting client...')
-	print(f'[C] IP = {ip}, Port = {port}')
-	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	print(f'[C] IP = {ip}, Port = {port}, {proto.upper()}, {args.size} byte packets, '
+		f'sendmmsg = {dumbbell_socket.libc is not None}')
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if args.udp else socket.SOCK_STREAM)
+	if args.udp:
+		sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 << 20)
 	sock.connect((ip, port))
+	if not args.udp:
+		sock.sendall(dumbbell_socket.TCP_PREAMBLE.pack(args.size))
 	print('[C] Client ready to send data')
-	send()
+	send(proto, args.size, dumbbell_socket.parse_rate(args.rate), args.duration, args.batch)
+	close()
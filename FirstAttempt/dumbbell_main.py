@@ -26,6 +26,7 @@ net = None
 results = [] # results from the ping and iperf tests, for the CSV files
 snd = [0, 0, 0] # send counters
 rcv = [0, 0, 0] # receive counters
+IPERF_DURATION = 10 # iperf3 default test length (-t) in seconds
 
 # parse program arguments (sudo python3 ./dumbbell.py ARGUMENTS)
 # -l: log level for the mininet logger
@@ -84,31 +85,38 @@ def create_topo(controller, **kwargs):
 	return Mininet(topo=topo, link=TCLink, controller=controller, **kwargs)
 
 	
-def send_data(net, packet_size, multiple_flows=False):
-	net['h4'].cmd('iperf3 -s &')
-	net['h5'].cmd('iperf3 -s &')
-	net['h6'].cmd('iperf3 -s &')
-		
+# Poll the listening TCP sockets inside the host's namespace until the iperf3 server is up.
+# [Returns] False if nothing listens on the port after timeout seconds.
+def wait_for_listen(host, port=5201, timeout=5.0):
+	deadline = time.monotonic() + timeout
+	while not host.cmd(f"ss -Hltn 'sport = :{port}'").strip():
+		if time.monotonic() >= deadline:
+			return False
+		time.sleep(0.02)
+	return True
+
+def send_data(net, packet_size, multiple_flows=False, timeout=IPERF_DURATION + 10):
+	pairs = [(net['h1'], net['h4'])]
 	if multiple_flows:
-		iperf_cl_h1 = Process(target=iperf,args=(client:=net['h1'], server:=net['h4']))
-		iperf_cl_h2 = Process(target=iperf,args=(client:=net['h2'], server:=net['h5']))
-		iperf_cl_h3 = Process(target=iperf,args=(client:=net['h3'], server:=net['h6']))
-		iperf_cl_h1.start()
-		iperf_cl_h2.start()
-		iperf_cl_h3.start()
-		
-		time.sleep(15)
-		
-		iperf_cl_h1.join()
-		iperf_cl_h2.join()
-		iperf_cl_h3.join()
-	else:
-		iperf_cl_h1 = Process(target=iperf,args=(client:=net['h1'], server:=net['h4']))
-		iperf_cl_h1.start()
-		
-		time.sleep(15)
-		
-		iperf_cl_h1.join()
+		pairs += [(net['h2'], net['h5']), (net['h3'], net['h6'])]
+	
+	for client, server in pairs:
+		server.cmd('iperf3 -s &')
+	for client, server in pairs:
+		if not wait_for_listen(server):
+			print(f'*** iperf3 server on {server.name} is not listening')
+	
+	# each client process ends with its iperf3 run; wait for exactly that instead of a fixed sleep
+	clients = [Process(target=iperf, args=(client, server)) for client, server in pairs]
+	for cl in clients:
+		cl.start()
+	deadline = time.monotonic() + timeout
+	for cl in clients:
+		cl.join(max(deadline - time.monotonic(), 0))
+		if cl.is_alive():
+			print(f'*** iperf client {cl.pid} still running after {timeout} s, terminating it')
+			cl.terminate()
+			cl.join()
 		
 
 def iperf(client, server):
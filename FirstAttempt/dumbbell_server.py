@@ -1,8 +1,13 @@
+import select
 import socket
+import time
 import argparse
 
-rcv = 0
-packet_size = 56
+import dumbbell_socket
+from dumbbell_socket import HEADER
+
+batch_size = 64
+recv_buffer = 1 << 20
 	
 global sock
 
@@ -10,24 +15,157 @@ def parse_args():
 	parser = argparse.ArgumentParser()
 	parser.add_argument("-i", "--ip", help="IP address to use.")
 	parser.add_argument("-p", "--port", help="Port to use.")
-	parser.add_argument("-t", "--timeout", help="Timeout")
+	parser.add_argument("-t", "--timeout", help="Stop after this many seconds without data (0: never).")
+	parser.add_argument("-u", "--udp", action="store_true", help="Receive UDP datagrams (default: TCP stream).")
+	parser.add_argument("-b", "--batch", type=int, default=batch_size, help="Datagrams per recvmmsg call.")
 	return parser.parse_args()
-	
-def receive():
-	global rcv
+
+# Receive counters of one sender: packets, bytes, loss and reordering from the sequence numbers,
+# one-way delay from the send timestamps. Totals plus the counters of the current second.
+class Flow:
+	def __init__(self, sender):
+		self.sender = sender
+		self.received = self.bytes = self.late = 0
+		self.max_seq = -1
+		self.owd_sum = 0
+		self.interval()
+
+	# Start a new reporting interval.
+	def interval(self):
+		self.mark = (self.received, self.bytes, self.late, self.max_seq, self.owd_sum)
+		self.owd_min = float('inf')
+		self.owd_max = 0
+
+	# Account one packet (owd in ns).
+	def add(self, seq, length, owd):
+		self.received += 1
+		self.bytes += length
+		if seq > self.max_seq:
+			self.max_seq = seq
+		else:
+			self.late += 1
+		self.owd_sum += owd
+		if owd < self.owd_min:
+			self.owd_min = owd
+		if owd > self.owd_max:
+			self.owd_max = owd
+
+	# Print the counters of the current interval and start the next one.
+	def report(self, label):
+		received, size, late, max_seq, owd_sum = self.mark
+		count = self.received - received
+		lost = max(self.max_seq - max_seq - (count - (self.late - late)), 0)
+		if count:
+			print(f'[S] {label} {self.sender:08x}: {count} packets, {(self.bytes - size) * 8 / 1e6:.1f} Mbit/s, '
+				f'lost {lost} ({lost / (count + lost):.2%}), late {self.late - late}, owd avg/min/max '
+				f'{(self.owd_sum - owd_sum) / count / 1e6:.3f}/{self.owd_min / 1e6:.3f}/{self.owd_max / 1e6:.3f} ms',
+				flush=True)
+		self.interval()
+
+	# Print the totals of the flow.
+	def summary(self):
+		expected = self.max_seq + 1
+		lost = max(expected - (self.received - self.late), 0)
+		avg = self.owd_sum / self.received / 1e6 if self.received else 0
+		print(f'[S] Sender {self.sender:08x}: received {self.received} packets ({self.bytes} bytes), '
+			f'lost {lost} of {expected} ({lost / max(expected, 1):.2%}), late {self.late}, owd avg {avg:.3f} ms')
+
+# Account the packets at the given offsets of a buffer, all received at now (ns).
+def account(flows, buf, packets, now):
+	unpack = HEADER.unpack_from
+	for offset, length in packets:
+		sender, seq, stamp = unpack(buf, offset)
+		flow = flows.get(sender)
+		if flow is None:
+			flow = flows[sender] = Flow(sender)
+		flow.add(seq, length, now - stamp)
+
+# Wait for data until the next per-second report is due.
+# [Returns] False if nothing arrived for timeout seconds (0: wait forever).
+def wait(poller, next_report, last_data, timeout):
+	ready = poller.poll(max(next_report - time.monotonic(), 0) * 1000)
+	return ready or not timeout or time.monotonic() - last_data < timeout
+
+# Receive datagrams in batches (recvmmsg, or one recv per datagram without it).
+def receive_udp(batch, timeout):
+	flows = {}
+	packets = dumbbell_socket.PacketBatch(batch, dumbbell_socket.MAX_PACKET)
+	size = dumbbell_socket.MAX_PACKET
+	poller = select.poll()
+	poller.register(sock, select.POLLIN)
+	start = last_data = time.monotonic()
+	next_report = start + 1
+	try:
+		while wait(poller, next_report, last_data, timeout):
+			n = packets.recv(sock)
+			if n:
+				last_data = time.monotonic()
+				account(flows, packets.buf, [(i * size, packets.length(i)) for i in range(n)
+					if packets.length(i) >= HEADER.size], time.time_ns())
+			if time.monotonic() >= next_report:
+				for flow in flows.values():
+					flow.report(f'{next_report - start:4.0f}s')
+				next_report += 1
+	except KeyboardInterrupt:
+		pass
+	for flow in flows.values():
+		flow.summary()
+
+# Receive a TCP stream of fixed-size packets (size from the preamble) with large reads,
+# split into packets at the packet boundaries; a partial packet is kept for the next read.
+def receive_tcp(connection, timeout):
+	flows = {}
+	connection.setblocking(False)
+	buf = bytearray(recv_buffer)
+	view = memoryview(buf)
+	poller = select.poll()
+	poller.register(connection, select.POLLIN)
+	start = last_data = time.monotonic()
+	next_report = start + 1
+	size = None
+	filled = 0
+	while wait(poller, next_report, last_data, timeout):
+		try:
+			n = connection.recv_into(view[filled:])
+		except BlockingIOError:
+			n = None
+		if n == 0:
+			break # stop if client stopped
+		if n:
+			last_data = time.monotonic()
+			filled += n
+			offset = 0
+			if size is None and filled >= dumbbell_socket.TCP_PREAMBLE.size:
+				size = dumbbell_socket.TCP_PREAMBLE.unpack_from(buf)[0]
+				offset = dumbbell_socket.TCP_PREAMBLE.size
+			if size is not None:
+				count = (filled - offset) // size
+				account(flows, buf, [(offset + i * size, size) for i in range(count)], time.time_ns())
+				offset += count * size
+			buf[:filled - offset] = view[offset:filled]
+			filled -= offset
+		if time.monotonic() >= next_report:
+			for flow in flows.values():
+				flow.report(f'{next_report - start:4.0f}s')
+			next_report += 1
+	connection.close()
+	for flow in flows.values():
+		flow.summary()
+
+def receive(udp, batch, timeout):
+	if udp:
+		receive_udp(batch, timeout)
+		return
 	sock.listen(1)
 	while True:
 		try:
 			(connection, address) = sock.accept()
-			while True:
-				data = connection.recv(packet_size + 8)
-				rcv += 1
-				print('[S] Received packet ' + str(rcv))
-				if not data:
-					break # stop if client stopped
-			connection.close()
+			print(f'[S] Connection from {address[0]}:{address[1]}')
+			receive_tcp(connection, timeout)
 		except socket.timeout:
-			pass
+			break
+		except KeyboardInterrupt:
+			break
 
 if __name__ == '__main__':
 	global sock
@@ -35,13 +173,17 @@ if __name__ == '__main__':
 	args = parse_args()
 	ip = args.ip
 	port = int(args.port)
-	timeout = int(args.timeout)
+	timeout = int(args.timeout or 0)
 	
 	print('[S] Starting server...')
-	print(f'[S] IP = {ip}, Port = {port}, Timeout = {timeout}')
-	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	print(f'[S] IP = {ip}, Port = {port}, Timeout = {timeout}, {"UDP" if args.udp else "TCP"}, '
+		f'recvmmsg = {dumbbell_socket.libc is not None}')
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if args.udp else socket.SOCK_STREAM)
 	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
 	sock.bind((ip, port))
-	sock.settimeout(timeout)
+	if timeout and not args.udp:
+		sock.settimeout(timeout)
 	print('[S] Server ready to receive data')
-	receive()
+	receive(args.udp, args.batch, timeout)
+	sock.close()
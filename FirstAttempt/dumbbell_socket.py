@@ -0,0 +1,110 @@
+import ctypes
+import ctypes.util
+import socket
+import struct
+
+# Packet header: sender ID (random per client run), sequence number, send time in ns since the epoch.
+# Both ends of a Mininet host pair share the clock, so receive time - send time is the one-way delay.
+HEADER = struct.Struct('!IQQ')
+TCP_PREAMBLE = struct.Struct('!I') # packet size, sent once per TCP connection before the packets
+MAX_PACKET = 2048 # receive slot size
+L2_OVERHEAD = {'udp': 14 + 20 + 8, 'tcp': 14 + 20 + 32} # Ethernet + IP + UDP / TCP (with timestamps) headers
+
+MSG_DONTWAIT = 0x40
+
+class iovec(ctypes.Structure):
+	_fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+class msghdr(ctypes.Structure):
+	_fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+		('msg_iov', ctypes.POINTER(iovec)), ('msg_iovlen', ctypes.c_size_t),
+		('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t), ('msg_flags', ctypes.c_int)]
+
+class mmsghdr(ctypes.Structure):
+	_fields_ = [('msg_hdr', msghdr), ('msg_len', ctypes.c_uint)]
+
+# Load sendmmsg/recvmmsg from libc.
+# [Returns] libc handle, or None if the calls are not available (non-Linux), then one syscall per packet is used.
+def load_libc():
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+		libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+		libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+	except (OSError, AttributeError):
+		return None
+	libc.sendmmsg.restype = ctypes.c_int
+	libc.recvmmsg.restype = ctypes.c_int
+	return libc
+
+libc = load_libc()
+
+# Parse a rate like 100M, 2.5G or 64000 (bit/s).
+# [Returns] bit/s as float, 0 means unlimited.
+def parse_rate(rate):
+	rate = str(rate).strip().upper()
+	scale = {'K': 1e3, 'M': 1e6, 'G': 1e9}.get(rate[-1:], 1)
+	return float(rate[:-1] if scale != 1 else rate) * scale
+
+# A preallocated batch of equally sized packet slots in one bytearray.
+# The mmsghdr array points into the bytearray, so packets are sent and received without copies:
+# headers are written with HEADER.pack_into and read with HEADER.unpack_from at slot offsets.
+class PacketBatch:
+	def __init__(self, batch, size):
+		self.batch = batch
+		self.size = size
+		self.buf = bytearray(batch * size)
+		self.view = memoryview(self.buf)
+		self.slots = [self.view[i * size:(i + 1) * size] for i in range(batch)]
+		self.msgs = None
+		if libc is not None:
+			self._anchor = (ctypes.c_char * len(self.buf)).from_buffer(self.buf)
+			base = ctypes.addressof(self._anchor)
+			self.iov = (iovec * batch)()
+			self.msgs = (mmsghdr * batch)()
+			for i in range(batch):
+				self.iov[i].iov_base = base + i * size
+				self.iov[i].iov_len = size
+				self.msgs[i].msg_hdr.msg_iov = ctypes.pointer(self.iov[i])
+				self.msgs[i].msg_hdr.msg_iovlen = 1
+
+	# Length of a received packet in slot i (after recv).
+	def length(self, i):
+		return self.msgs[i].msg_len if self.msgs is not None else self.lengths[i]
+
+	# Send the first n slots as datagrams on a connected UDP socket.
+	# [Returns] number of datagrams sent, the rest failed (e.g. ECONNREFUSED while the server is not up yet).
+	def send(self, sock, n):
+		if self.msgs is None:
+			sent = 0
+			for slot in self.slots[:n]:
+				try:
+					sock.send(slot)
+					sent += 1
+				except OSError:
+					pass
+			return sent
+		fd = sock.fileno()
+		offset = sent = 0
+		while offset < n:
+			r = libc.sendmmsg(fd, ctypes.addressof(self.msgs) + offset * ctypes.sizeof(mmsghdr), n - offset, 0)
+			if r < 0:
+				# the datagram at the front of the rest failed, skip it
+				offset += 1
+				continue
+			offset += r
+			sent += r
+		return sent
+
+	# Receive up to batch datagrams that are already queued (non-blocking, wait with poll first).
+	# [Returns] number of datagrams received, their lengths via length(i).
+	def recv(self, sock):
+		if self.msgs is not None:
+			r = libc.recvmmsg(sock.fileno(), ctypes.addressof(self.msgs), self.batch, MSG_DONTWAIT, None)
+			return max(r, 0)
+		self.lengths = []
+		for slot in self.slots:
+			try:
+				self.lengths.append(sock.recv_into(slot, 0, socket.MSG_DONTWAIT))
+			except BlockingIOError:
+				break
+		return len(self.lengths)